@@ -0,0 +1,16 @@
+-- Agent-API: sequence-backed PO id minting for PO-AGENT-xxxx
+-- (replaces SELECT COUNT(*) FROM purchase_orders). Idempotent.
+--
+-- Ids are reserved in blocks: each nextval() hands one agent-api worker the
+-- INCREMENT BY ids ending at the returned value, which it then mints locally.
+
+CREATE SEQUENCE IF NOT EXISTS po_agent_seq INCREMENT BY 50;
+ALTER SEQUENCE po_agent_seq INCREMENT BY 50;
+
+-- Continue past every id the COUNT(*)-based minting may already have issued
+SELECT setval('po_agent_seq', GREATEST(
+  (SELECT COUNT(*) FROM purchase_orders),
+  (SELECT COALESCE(MAX(substring(po_id FROM '^PO-AGENT-([0-9]+)$')::BIGINT), 0) FROM purchase_orders),
+  (SELECT last_value FROM po_agent_seq),
+  1
+));
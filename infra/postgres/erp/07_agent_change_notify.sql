@@ -0,0 +1,23 @@
+-- Agent-API: NOTIFY erp_changes (payload = table name) after any write to the
+-- tables behind the cached sourcing endpoints, so agent-api can drop stale
+-- RFQ / single-source / consolidation results. Idempotent.
+
+CREATE OR REPLACE FUNCTION notify_erp_change() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('erp_changes', TG_TABLE_NAME);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+  t TEXT;
+BEGIN
+  FOREACH t IN ARRAY ARRAY['parts', 'suppliers', 'supplier_parts', 'quotes', 'transport_lanes', 'demand'] LOOP
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_notify_change', t);
+    EXECUTE format(
+      'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+      'FOR EACH STATEMENT EXECUTE FUNCTION notify_erp_change()',
+      t || '_notify_change', t);
+  END LOOP;
+END $$;
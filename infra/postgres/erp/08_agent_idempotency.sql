@@ -0,0 +1,15 @@
+-- Agent-API: Idempotency-Key store for POST /agent/execute. Idempotent.
+--
+-- A key's row is inserted in the same transaction as the action it guards,
+-- with the response written before commit, so a retry either replays the
+-- stored response or (if the original rolled back) runs the action itself.
+
+CREATE TABLE IF NOT EXISTS agent_idempotency (
+  idem_key     TEXT PRIMARY KEY,
+  request_hash TEXT NOT NULL,
+  response     JSONB,
+  created_at   TIMESTAMP NOT NULL DEFAULT now(),
+  expires_at   TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_agent_idempotency_expires ON agent_idempotency (expires_at);
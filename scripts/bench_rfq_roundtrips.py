@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark the RFQ candidate fetch: legacy per-supplier lane lookups (N+1)
+versus the single set-based RFQ_CANDIDATES_SQL used by agent-api.
+
+Runs both against the ERP Postgres for the parts with the most candidate
+suppliers, checks they return the same lane/quote data, and prints round
+trips and latency per part.
+
+Usage:
+  ERP_DSN="host=localhost port=54322 dbname=erp user=demo password=demo" \
+    python3 scripts/bench_rfq_roundtrips.py [--parts 20] [--factory F1] [--repeat 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+from psycopg.rows import dict_row
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "services" / "agent-api"))
+
+from main import DEFAULT_LANE, RFQ_CANDIDATES_SQL  # noqa: E402
+
+DSN = os.getenv("ERP_DSN", "host=localhost port=54322 dbname=erp user=demo password=demo")
+
+
+def legacy_fetch(cur, part_id, factory_id):
+    """The pre-refactor query sequence. Returns (data, round_trips)."""
+    trips = 0
+    cur.execute("""
+        SELECT sp.supplier_id, s.name AS supplier_name, s.approved,
+               sp.lead_time_days, sp.moq, sp.capacity_per_week,
+               sp.last_price, sp.qualification_level, sp.priority
+        FROM supplier_parts sp
+        JOIN suppliers s ON s.supplier_id = sp.supplier_id
+        WHERE sp.part_id = %s
+        ORDER BY sp.priority, sp.last_price
+    """, (part_id,))
+    trips += 1
+    suppliers = cur.fetchall()
+    lanes = {}
+    for sp in suppliers:
+        cur.execute("""
+            SELECT mode, time_days, cost, reliability
+            FROM transport_lanes
+            WHERE supplier_id = %s AND factory_id = %s
+            ORDER BY time_days
+            LIMIT 1
+        """, (sp["supplier_id"], factory_id))
+        trips += 1
+        lane = cur.fetchone()
+        lanes[sp["supplier_id"]] = dict(lane) if lane else dict(DEFAULT_LANE)
+    cur.execute("""
+        SELECT supplier_id, price
+        FROM quotes
+        WHERE part_id = %s AND valid_to >= CURRENT_DATE
+        ORDER BY price
+    """, (part_id,))
+    trips += 1
+    quotes = {}
+    for q in cur.fetchall():
+        quotes.setdefault(q["supplier_id"], q["price"])
+    data = {
+        sp["supplier_id"]: (lanes[sp["supplier_id"]]["time_days"],
+                            quotes.get(sp["supplier_id"]))
+        for sp in suppliers
+    }
+    return data, trips
+
+
+def set_based_fetch(cur, part_id, factory_id):
+    cur.execute(RFQ_CANDIDATES_SQL, (factory_id, part_id))
+    data = {
+        r["supplier_id"]: (r["lane_time_days"] if r["lane_mode"] is not None
+                           else DEFAULT_LANE["time_days"], r["quote_price"])
+        for r in cur.fetchall()
+    }
+    return data, 1
+
+
+def timed(fn, cur, part_id, factory_id, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        data, trips = fn(cur, part_id, factory_id)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return data, trips, statistics.median(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--parts", type=int, default=20)
+    ap.add_argument("--factory", default="F1")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    conn = psycopg.connect(DSN)
+    cur = conn.cursor(row_factory=dict_row)
+    cur.execute("""
+        SELECT part_id, COUNT(*) AS n FROM supplier_parts
+        GROUP BY part_id ORDER BY n DESC, part_id LIMIT %s
+    """, (args.parts,))
+    parts = [r["part_id"] for r in cur.fetchall()]
+
+    print(f"{'part':<10} {'suppliers':>9} {'trips old':>9} {'trips new':>9} "
+          f"{'ms old':>8} {'ms new':>8}")
+    tot_old = tot_new = trips_old = trips_new = 0
+    for pid in parts:
+        old, t_old, ms_old = timed(legacy_fetch, cur, pid, args.factory, args.repeat)
+        new, t_new, ms_new = timed(set_based_fetch, cur, pid, args.factory, args.repeat)
+        if old != new:
+            print(f"MISMATCH for {pid}: {old} != {new}", file=sys.stderr)
+            sys.exit(1)
+        print(f"{pid:<10} {len(old):>9} {t_old:>9} {t_new:>9} {ms_old:>8.2f} {ms_new:>8.2f}")
+        tot_old += ms_old
+        tot_new += ms_new
+        trips_old += t_old
+        trips_new += t_new
+
+    print(f"\nTotal: {trips_old} → {trips_new} round trips, "
+          f"{tot_old:.1f} ms → {tot_new:.1f} ms (median per part, summed)")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
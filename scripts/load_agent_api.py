@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Closed-loop load test for agent-api's ERP-backed endpoints.
+
+Each of --clients concurrent clients sends requests back to back for
+--duration seconds; latencies are reported per endpoint as p50/p95/p99
+together with throughput and error counts. Run it against a build before
+and after a change (same stack, same data) to compare tail latency.
+
+Usage:
+  python3 scripts/load_agent_api.py [--url http://localhost:7200] \
+    [--clients 500] [--duration 30] [--endpoints rfq,single-source,consolidate,execute]
+
+Start agent-api with SOURCING_CACHE_TTL=0 to measure the data layer rather
+than the result cache. The execute mix only sends EXPEDITE_SHIPMENT for a
+PO without a shipment, so it exercises the full read + audited-rejection
+path without creating purchase orders.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+PARTS = ["P1A", "P1B", "MCU-001", "CAP-001", "DSP-001", "DSP-002"]
+FACTORIES = ["F1", "F2"]
+
+
+def make_request(endpoint: str) -> tuple[str, dict]:
+    if endpoint == "rfq":
+        return "/agent/rfq-candidates", {
+            "partId": random.choice(PARTS),
+            "factoryId": random.choice(FACTORIES),
+            "qty": random.choice([500, 1000, 5000]),
+            "objective": random.choice(["balanced", "delivery-first", "cost-first"]),
+        }
+    if endpoint == "single-source":
+        return "/agent/single-source-parts", {"threshold": 1}
+    if endpoint == "consolidate":
+        return "/agent/consolidate-po", {"partId": random.choice(PARTS), "horizonDays": 30}
+    if endpoint == "execute":
+        return "/agent/execute", {"action": "EXPEDITE_SHIPMENT", "poId": "PO-LOADTEST-NONE",
+                                  "actor": "load-test"}
+    raise ValueError(endpoint)
+
+
+def pct(samples: list[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+async def client(http: httpx.AsyncClient, endpoints: list[str], deadline: float,
+                 latencies: dict, errors: dict) -> None:
+    while time.monotonic() < deadline:
+        endpoint = random.choice(endpoints)
+        path, body = make_request(endpoint)
+        t0 = time.perf_counter()
+        try:
+            resp = await http.post(path, json=body)
+            ok = resp.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        elapsed = (time.perf_counter() - t0) * 1000
+        if ok:
+            latencies[endpoint].append(elapsed)
+        else:
+            errors[endpoint] += 1
+
+
+async def run(args) -> None:
+    endpoints = args.endpoints.split(",")
+    latencies = {e: [] for e in endpoints}
+    errors = {e: 0 for e in endpoints}
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as http:
+        # Warm-up: open pools and caches before measuring
+        for e in endpoints:
+            path, body = make_request(e)
+            try:
+                await http.post(path, json=body)
+            except httpx.HTTPError:
+                pass
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(client(http, endpoints, deadline, latencies, errors)
+                               for _ in range(args.clients)))
+
+    print(f"{args.clients} clients, {args.duration:.0f}s against {args.url}\n")
+    print(f"{'endpoint':<14} {'requests':>9} {'errors':>7} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for e in endpoints:
+        lat = latencies[e]
+        print(f"{e:<14} {len(lat):>9} {errors[e]:>7} {len(lat) / args.duration:>8.1f} "
+              f"{pct(lat, 50):>8.1f} {pct(lat, 95):>8.1f} {pct(lat, 99):>8.1f} "
+              f"{statistics.fmean(lat) if lat else 0.0:>8.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://localhost:7200")
+    ap.add_argument("--clients", type=int, default=500)
+    ap.add_argument("--duration", type=float, default=30)
+    ap.add_argument("--timeout", type=float, default=30)
+    ap.add_argument("--endpoints", default="rfq,single-source,consolidate,execute")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -69,4 +69,61 @@ br = d['data']['blastRadius']
 print(f'    Orders: {len(br[\"impactedOrders\"])}, Parts: {len(br[\"impactedParts\"])}, Factories: {len(br[\"impactedFactories\"])}')
 "
 
+echo "==> 8. POST /simulate/batch (NDJSON) ..."
+curl -fsS -X POST -H 'Content-Type: application/json' \
+  --data '{"items":[
+    {"kind":"switch-supplier","request":{"orderId":"SO1001","partId":"P1A","toSupplierId":"S2"}},
+    {"kind":"switch-supplier","request":{"orderId":"SO1001","partId":"NO-SUCH-PART","toSupplierId":"S2"}},
+    {"kind":"change-lane","request":{"orderId":"SO1001","partId":"P1A","supplierId":"S1","toLane":"Air"}},
+    {"kind":"transfer-factory","request":{"orderId":"SO1001","toFactoryId":"F3"}}]}' \
+  http://localhost:7100/simulate/batch | python3 -c "
+import sys, json
+lines = [json.loads(l) for l in sys.stdin if l.strip()]
+assert [l['index'] for l in lines] == [0, 1, 2, 3], f'Out of order: {[l[\"index\"] for l in lines]}'
+assert [l['status'] for l in lines] == [200, 404, 200, 200], f'Bad statuses: {[l[\"status\"] for l in lines]}'
+assert lines[1]['error'] and 'result' not in lines[1], 'Failed item should carry error, not result'
+for l in lines:
+    if l['status'] == 200:
+        assert len(l['result']['scenarios']) == 3
+print(f'    {len(lines)} lines in order, statuses {[l[\"status\"] for l in lines]}')
+"
+
+echo "==> 9. POST /simulate/switch-supplier mode=montecarlo ..."
+curl -fsS -X POST -H 'Content-Type: application/json' \
+  --data '{"orderId":"SO1001","partId":"P1A","toSupplierId":"S2","mode":"montecarlo","trials":2000,"seed":7}' \
+  http://localhost:7100/simulate/switch-supplier | python3 -c "
+import sys, json
+d = json.load(sys.stdin)
+assert len(d['scenarios']) == 3
+for s in d['scenarios']:
+    dist = s.get('distribution')
+    assert dist, f'Scenario {s[\"label\"]} has no distribution block'
+    assert dist['trials'] == 2000
+    assert dist['eta_p50_days'] <= dist['eta_p90_days'] <= dist['eta_p99_days']
+    assert 0 <= dist['line_stop_probability'] <= 1
+    print(f'    {s[\"label\"]}: ETA P50/P90/P99 {dist[\"eta_p50_days\"]}/{dist[\"eta_p90_days\"]}/{dist[\"eta_p99_days\"]}d | P(line stop)={dist[\"line_stop_probability\"]}')
+"
+
+echo "==> 10. GET /snapshot ..."
+curl -fsS http://localhost:7100/snapshot | python3 -c "
+import sys, json
+d = json.load(sys.stdin)
+if not d['enabled']:
+    print('    Snapshot disabled (TWIN_SNAPSHOT=0), skipped')
+else:
+    assert d['fresh'], f'Snapshot not fresh: checked {d[\"checkedAgeS\"]}s ago'
+    assert set(d['sections']) == {'supplies', 'lanes', 'inventory', 'risks', 'holds', 'orders'}, d['sections']
+    print(f'    fresh, {d[\"ids\"]} ids, hits={d[\"hits\"]} fallbacks={d[\"fallbacks\"]} mismatches={d[\"mismatches\"]}')
+"
+
+echo "==> 11. GET /workers ..."
+curl -fsS http://localhost:7100/workers | python3 -c "
+import sys, json
+d = json.load(sys.stdin)
+assert d['inFlight'] == 0, f'{d[\"inFlight\"]} jobs still in flight'
+if d['workers']:
+    assert d['completed'] >= 1, 'Monte Carlo run above did not reach the pool'
+print(f'    workers={d[\"workers\"]} completed={d[\"completed\"]} failed={d[\"failed\"]} cancelled={d[\"cancelled\"]}')
+"
+
 echo "=== All Twin-Sim smoke tests passed. ==="
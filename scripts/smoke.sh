@@ -206,6 +206,39 @@ else
   echo "    FAIL: EXPEDITE_SHIPMENT did not succeed!" && exit 1
 fi
 
+echo "==> Agent-API: Idempotency-Key replay ..."
+IDEM_KEY="smoke-$(date +%s)-$$"
+IDEM_BODY='{"action":"CREATE_PO","partId":"P1A","supplierId":"S2","qty":100,"orderId":"SO1001","actor":"smoke-test"}'
+IDEM_HDRS=$(mktemp)
+PO_BEFORE=$(docker compose exec -T postgres_erp psql -U demo -d erp -tAc "SELECT count(*) FROM purchase_orders;")
+IDEM_FIRST=$(curl -fsS -X POST -H 'Content-Type: application/json' -H "Idempotency-Key: $IDEM_KEY" \
+  --data "$IDEM_BODY" http://localhost:7200/agent/execute)
+IDEM_SECOND=$(curl -fsS -D "$IDEM_HDRS" -X POST -H 'Content-Type: application/json' -H "Idempotency-Key: $IDEM_KEY" \
+  --data "$IDEM_BODY" http://localhost:7200/agent/execute)
+if ! grep -qi '^Idempotent-Replayed: true' "$IDEM_HDRS"; then
+  rm -f "$IDEM_HDRS"
+  echo "    FAIL: second request with the same Idempotency-Key was not replayed" && exit 1
+fi
+rm -f "$IDEM_HDRS"
+FIRST_EVENT=$(echo "$IDEM_FIRST" | python3 -c "import sys,json; print(json.load(sys.stdin).get('auditEventId') or '')")
+SECOND_EVENT=$(echo "$IDEM_SECOND" | python3 -c "import sys,json; print(json.load(sys.stdin).get('auditEventId') or '')")
+if [ -z "$FIRST_EVENT" ] || [ "$FIRST_EVENT" != "$SECOND_EVENT" ]; then
+  echo "    FAIL: replay returned auditEventId '$SECOND_EVENT', expected '$FIRST_EVENT'" && exit 1
+fi
+PO_AFTER=$(docker compose exec -T postgres_erp psql -U demo -d erp -tAc "SELECT count(*) FROM purchase_orders;")
+if [ "$PO_AFTER" -ne $((PO_BEFORE + 1)) ]; then
+  echo "    FAIL: expected one new purchase order, got $PO_BEFORE → $PO_AFTER" && exit 1
+fi
+IDEM_CODE=$(curl -sS -o /dev/null -w '%{http_code}' -X POST -H 'Content-Type: application/json' \
+  -H "Idempotency-Key: $IDEM_KEY" \
+  --data '{"action":"CREATE_PO","partId":"P1A","supplierId":"S2","qty":200,"orderId":"SO1001","actor":"smoke-test"}' \
+  http://localhost:7200/agent/execute)
+if [ "$IDEM_CODE" = "422" ]; then
+  echo "    Replayed $FIRST_EVENT with Idempotent-Replayed: true; changed body → HTTP 422"
+else
+  echo "    FAIL: changed body with a used Idempotency-Key returned HTTP $IDEM_CODE (expected 422)" && exit 1
+fi
+
 echo "==> Sprint 4: GraphQL rfqCandidates ..."
 RFQ_RESP=$(curl -fsS -X POST -H 'Content-Type: application/json' \
   --data '{"query":"{ rfqCandidates(partId:\"P1A\", qty:1000, objective:\"balanced\") { partId candidates { rank supplierId totalScore explanations } } }"}' \
@@ -2,16 +2,29 @@
 
 from __future__ import annotations
 
-import math
+import asyncio
+import concurrent.futures
+import hashlib
+import io
+import json
 import os
+import socket
+import threading
+import time
 import uuid
-from datetime import date, datetime, timezone
-from typing import Optional
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, suppress
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Optional
 
 import httpx
-import psycopg2
-import psycopg2.extras
-from fastapi import FastAPI, HTTPException
+import numpy as np
+import psycopg
+import psycopg_pool
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 # ────────────────────────────────────────────────────────────────────
@@ -27,25 +40,729 @@ ERP_DSN = os.getenv(
 TWIN_SIM_URL = os.getenv("TWIN_SIM_URL", "http://twin-sim:7100")
 GRAPHQL_URL = os.getenv("GRAPHQL_URL", "http://graphql-api:4000")
 
+ERP_POOL_MIN = int(os.getenv("ERP_POOL_MIN", "2"))
+ERP_POOL_MAX = int(os.getenv("ERP_POOL_MAX", "20"))
+ERP_POOL_TIMEOUT = float(os.getenv("ERP_POOL_TIMEOUT", "5"))          # checkout wait (s)
+ERP_POOL_IDLE_CHECK = float(os.getenv("ERP_POOL_IDLE_CHECK", "30"))   # ping idle conns older than this (s)
+ERP_REPLICA_DSN = os.getenv("ERP_REPLICA_DSN", "")                    # optional read replica
+ERP_REPLICA_POOL_MAX = int(os.getenv("ERP_REPLICA_POOL_MAX", "40"))
+ERP_REPLICA_MAX_LAG = float(os.getenv("ERP_REPLICA_MAX_LAG", "5"))       # route reads to primary beyond this (s)
+ERP_REPLICA_CHECK_INTERVAL = float(os.getenv("ERP_REPLICA_CHECK_INTERVAL", "2"))
+ERP_PREPARE = os.getenv("ERP_PREPARE", "1") == "1"                    # 0 behind transaction-pooling PgBouncer
+
+GRAPHQL_MAX_CONNECTIONS = int(os.getenv("GRAPHQL_MAX_CONNECTIONS", "20"))
+TWIN_SIM_MAX_CONNECTIONS = int(os.getenv("TWIN_SIM_MAX_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))  # idle socket lifetime (s)
+ANALYZE_LOOKUP_TIMEOUT = float(os.getenv("ANALYZE_LOOKUP_TIMEOUT", "3"))  # per-lookup budget in /agent/analyze (s)
+EXECUTE_BATCH_MAX = int(os.getenv("EXECUTE_BATCH_MAX", "1000"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))        # how long an Idempotency-Key replays (s)
+PLAN_BATCH_MAX = int(os.getenv("PLAN_BATCH_MAX", "10000"))
+
+AUDIT_MODE = os.getenv("AUDIT_MODE", "sync")                           # sync | async
+AUDIT_QUEUE_MAX = int(os.getenv("AUDIT_QUEUE_MAX", "10000"))           # rows buffered in memory
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))           # flush when this many rows queued
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))   # ... or when the oldest is this old (s)
+AUDIT_SPILL_PATH = os.getenv("AUDIT_SPILL_PATH", "")                   # required for async; {hostname}/{pid} expanded
+
+
+# ────────────────────────────────────────────────────────────────────
+# ERP connection pool
+# ────────────────────────────────────────────────────────────────────
+
+class _WriteTrackingCursor(psycopg.AsyncCursor):
+    """Cursor that flags its connection's transaction once a statement
+    changes data, judged by the command tag the server returns."""
+
+    WRITE_TAGS = ("INSERT", "UPDATE", "DELETE", "MERGE", "COPY")
+
+    async def execute(self, *args, **kwargs):
+        await super().execute(*args, **kwargs)
+        self._track()
+        return self
+
+    async def executemany(self, *args, **kwargs) -> None:
+        await super().executemany(*args, **kwargs)
+        self._track()
+
+    def _track(self) -> None:
+        if (self.statusmessage or "").startswith(self.WRITE_TAGS):
+            self.connection.tx_wrote = True
+
+
+class _AuditedConnection(psycopg.AsyncConnection):
+    """ERP connection that holds async-mode audit rows until its transaction
+    commits, so nothing is queued for writes that were rolled back."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = _WriteTrackingCursor
+        self.deferred_audit: list[tuple[str, tuple]] = []
+        self.tx_wrote = False
+        self.idle_since = time.monotonic()
+
+    @property
+    def has_written(self) -> bool:
+        """Whether a rollback would lose work: rows written or audit rows deferred."""
+        return self.tx_wrote or bool(self.deferred_audit)
+
+    async def commit(self) -> None:
+        await super().commit()
+        self.tx_wrote = False
+        rows, self.deferred_audit = self.deferred_audit, []
+        _audit_writer.submit(rows)
+
+    async def rollback(self) -> None:
+        self.deferred_audit = []
+        self.tx_wrote = False
+        await super().rollback()
+
+
+async def _mark_idle(conn: _AuditedConnection) -> None:
+    conn.idle_since = time.monotonic()
+
+
+async def _check_idle(conn: _AuditedConnection) -> None:
+    """Ping a connection that sat idle longer than ERP_POOL_IDLE_CHECK before
+    reuse; the pool replaces it if the ping fails."""
+    if time.monotonic() - conn.idle_since >= ERP_POOL_IDLE_CHECK:
+        await psycopg_pool.AsyncConnectionPool.check_connection(conn)
+
+
+# Every ERP path – handlers, batch execute, the RFQ batch stream, the audit
+# writer and health checks – shares this one pool, so ERP_POOL_MAX is the
+# whole connection budget (plus the change listener's LISTEN connection).
+_erp_pool = psycopg_pool.AsyncConnectionPool(
+    ERP_DSN,
+    min_size=max(0, min(ERP_POOL_MIN, ERP_POOL_MAX)),
+    max_size=max(1, ERP_POOL_MAX),
+    timeout=ERP_POOL_TIMEOUT,
+    connection_class=_AuditedConnection,
+    check=_check_idle,
+    reset=_mark_idle,
+    name="erp",
+    open=False,
+)
+
 
 def _erp_conn():
-    return psycopg2.connect(ERP_DSN)
+    """Check out a pooled ERP connection: ``async with _erp_conn() as conn: ...``."""
+    return _erp_pool.connection()
+
+
+class ReplicaRouter:
+    """Routes read-only work to the ERP_REPLICA_DSN pool.
+
+    Reads go to the replica while its last health check succeeded and its
+    replay lag is within ``max_lag``; otherwise, or when the caller needs
+    to read its own writes, they go to the primary. A replica that fails a
+    checkout or a query is marked down until the next successful check.
+    """
+
+    # Replay lag in seconds; 0 when the replica has replayed all it received
+    # (an idle primary would otherwise look like ever-growing lag).
+    LAG_SQL = """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """
+
+    def __init__(self, dsn: str, max_size: int, max_lag: float, check_interval: float) -> None:
+        self.pool = psycopg_pool.AsyncConnectionPool(
+            dsn, min_size=1, max_size=max(1, max_size), timeout=ERP_POOL_TIMEOUT,
+            name="erp-replica", open=False,
+        ) if dsn else None
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.up = False
+        self.lag: float | None = None
+        self._task: asyncio.Task | None = None
+        self._replica_reads = 0
+        self._primary_reads = 0
+        self._fallbacks = 0
+
+    async def start(self) -> None:
+        if self.pool is not None and self._task is None:
+            await self.pool.open()
+            self._task = asyncio.create_task(self._monitor())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.pool is not None:
+            await self.pool.close()
+
+    async def _monitor(self) -> None:
+        while True:
+            try:
+                async with self.pool.connection(timeout=self.check_interval) as conn:
+                    cur = await conn.execute(self.LAG_SQL)
+                    self.lag = float((await cur.fetchone())[0])
+                self.up = True
+            except Exception:
+                self.up = False
+            await asyncio.sleep(self.check_interval)
+
+    def _use_replica(self, fresh: bool) -> bool:
+        return (self.pool is not None and not fresh and self.up
+                and self.lag is not None and self.lag <= self.max_lag)
+
+    def _mark_down(self) -> None:
+        self.up = False
+        self._fallbacks += 1
+
+    @asynccontextmanager
+    async def connection(self, fresh: bool = False) -> AsyncIterator:
+        """A connection for read-only work; ``fresh`` forces the primary."""
+        if self._use_replica(fresh):
+            try:
+                conn = await self.pool.getconn()
+            except (psycopg_pool.PoolTimeout, psycopg.OperationalError):
+                self._mark_down()
+            else:
+                self._replica_reads += 1
+                try:
+                    async with conn:
+                        yield conn
+                except psycopg.OperationalError:
+                    self._mark_down()
+                    raise
+                finally:
+                    await self.pool.putconn(conn)
+                return
+        self._primary_reads += 1
+        async with _erp_pool.connection() as conn:
+            yield conn
+
+    def stats(self) -> dict:
+        return {
+            "configured": self.pool is not None,
+            "up": self.up,
+            "lagS": round(self.lag, 3) if self.lag is not None else None,
+            "maxLagS": self.max_lag,
+            "replicaReads": self._replica_reads,
+            "primaryReads": self._primary_reads,
+            "fallbacks": self._fallbacks,
+            "pool": self.pool.get_stats() if self.pool is not None else None,
+        }
+
+
+_erp_replica = ReplicaRouter(ERP_REPLICA_DSN, ERP_REPLICA_POOL_MAX,
+                             ERP_REPLICA_MAX_LAG, ERP_REPLICA_CHECK_INTERVAL)
+
+
+def _erp_read_conn(fresh: bool = False):
+    """Connection for read-only queries: the replica when usable, else the primary."""
+    return _erp_replica.connection(fresh)
+
+
+class StatementRegistry:
+    """Named hot-path statements, prepared once per pooled connection.
+
+    psycopg 3 keeps a prepared-statement cache per connection: a registered
+    statement is parsed and planned on its first execution on a connection
+    and run by name from then on. A recycled or replaced connection starts
+    with an empty cache and simply prepares again on first use.
+    ERP_PREPARE=0 executes everything unprepared.
+    """
+
+    def __init__(self, prepare: bool) -> None:
+        self.prepare = prepare
+        self._sql: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stats: dict[str, list[float]] = {}  # name -> [executions, total s, max s]
+        self._fallbacks = 0
+
+    def register(self, name: str, sql: str) -> str:
+        self._sql[name] = sql
+        self._stats[name] = [0, 0.0, 0.0]
+        return name
+
+    async def execute(self, cur, name: str, params=None):
+        conn = cur.connection
+        t0 = time.monotonic()
+        try:
+            try:
+                # prepare=False also opts out of psycopg's own auto-prepare threshold
+                await cur.execute(self._sql[name], params, prepare=self.prepare)
+            except psycopg.errors.InvalidSqlStatementName:
+                # The server lost a statement behind our back (e.g. a pooler in
+                # front of Postgres); stop preparing rather than fail every call.
+                self.prepare = False
+                self._fallbacks += 1
+                if getattr(conn, "has_written", False):
+                    # Writes earlier in this transaction are gone with the abort
+                    raise HTTPException(503, "ERP prepared statement lost mid-transaction; retry",
+                                        headers={"Retry-After": "1"})
+                # Nothing but reads so far, and under READ COMMITTED each of
+                # those already ran on its own snapshot: retrying this
+                # statement in a fresh transaction is the same as re-running
+                # the whole read.
+                await conn.rollback()
+                await cur.execute(self._sql[name], params, prepare=False)
+        finally:
+            elapsed = time.monotonic() - t0
+            with self._lock:
+                st = self._stats[name]
+                st[0] += 1
+                st[1] += elapsed
+                st[2] = max(st[2], elapsed)
+        return cur
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "prepare": self.prepare,
+                "fallbacks": self._fallbacks,
+                "statements": {
+                    name: {
+                        "executions": int(n),
+                        "meanMs": round(total / n * 1000, 3) if n else 0.0,
+                        "maxMs": round(worst * 1000, 3),
+                    }
+                    for name, (n, total, worst) in self._stats.items()
+                },
+            }
+
+
+_stmts = StatementRegistry(ERP_PREPARE)
+
+
+@app.on_event("startup")
+async def _start_replica() -> None:
+    await _erp_replica.start()
+
+
+@app.on_event("shutdown")
+async def _stop_replica() -> None:
+    await _erp_replica.stop()
+
+
+@app.on_event("startup")
+async def _open_pool() -> None:
+    await _erp_pool.open()
+    if AUDIT_MODE == "async":
+        _audit_writer.start()
+
+
+@app.on_event("shutdown")
+async def _close_pool() -> None:
+    # Drain buffered audit rows while connections are still available
+    await _audit_writer.stop()
+    await _erp_pool.close()
+
+
+# ────────────────────────────────────────────────────────────────────
+# Audit writer (AUDIT_MODE=async)
+# ────────────────────────────────────────────────────────────────────
+
+AUDIT_TABLES = {
+    "audit_events": ("event_id", "ts", "actor", "action", "input", "output", "status"),
+    "action_requests": ("request_id", "type", "payload", "approval_status", "created_at"),
+}
+AUDIT_JSON_COLUMNS = {"input", "output", "payload"}
+
+
+def _copy_field(value) -> str:
+    """Encode one value for COPY ... FROM STDIN (text format)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str)
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class AuditWriter:
+    """Bounded in-process queue of audit rows, flushed in batches via COPY.
+
+    A background task flushes when ``batch_size`` rows are queued or the
+    oldest has waited ``flush_interval`` seconds. Rows that cannot be queued
+    (queue full) or written (Postgres slow or down) are appended to an
+    fsync'd NDJSON spill file and replayed ahead of the next flush. Flushes
+    go through a temp staging table with ON CONFLICT DO NOTHING, so a replay
+    that overlaps an earlier partial write is harmless.
+    """
+
+    _STOP = object()
+
+    def __init__(self, pool: psycopg_pool.AsyncConnectionPool, max_queue: int, batch_size: int,
+                 flush_interval: float, spill_path: str) -> None:
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_queue))
+        self._task: asyncio.Task | None = None
+        self._spill_lock = threading.Lock()
+        # counters
+        self._submitted = 0
+        self._written = 0
+        self._batches = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._errors = 0
+        self._last_flush_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        if self._task is None:
+            if not self.spill_path:
+                # A relative default would land in the container's writable
+                # layer, shared by every worker and lost with the container
+                raise RuntimeError(
+                    "AUDIT_MODE=async needs AUDIT_SPILL_PATH: a file on a persistent volume, "
+                    "one per process ({hostname} and {pid} are expanded)"
+                )
+            self.spill_path = self.spill_path.format(hostname=socket.gethostname(), pid=os.getpid())
+            self._task = asyncio.create_task(self._run(), name="audit-writer")
+
+    async def stop(self) -> None:
+        """Flush everything queued (spilling what cannot be written) and stop."""
+        task, self._task = self._task, None
+        if task is not None:
+            # The sentinel must get in even when the queue is full
+            while True:
+                try:
+                    self._queue.put_nowait(self._STOP)
+                    break
+                except asyncio.QueueFull:
+                    await asyncio.sleep(0.01)
+            await task
+
+    def submit(self, rows: list[tuple[str, tuple]]) -> None:
+        """Queue ``(table, row)`` pairs; never waits on the database."""
+        if not rows:
+            return
+        self._submitted += len(rows)
+        if self._task is None:
+            self._spill(rows)
+            return
+        for i, row in enumerate(rows):
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                self._spill(rows[i:])
+                return
+
+    async def _run(self) -> None:
+        batch: list[tuple[str, tuple]] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else self.flush_interval
+            try:
+                row = await asyncio.wait_for(self._queue.get(), timeout)
+            except TimeoutError:
+                row = None
+            if row is self._STOP:
+                break
+            if row is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(row)
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                await self._flush(batch)
+                batch = []
+            elif not batch and self._spill_files():
+                await self._flush([])
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row is not self._STOP:
+                batch.append(row)
+        await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[str, tuple]]) -> None:
+        t0 = time.monotonic()
+        try:
+            await self._replay_spill()
+            if batch:
+                await self._copy(batch)
+                self._written += len(batch)
+        except Exception:
+            self._errors += 1
+            try:
+                await asyncio.to_thread(self._spill, batch)
+            except OSError:
+                pass
+        self._last_flush_ms = (time.monotonic() - t0) * 1000
+
+    async def _copy(self, rows: list[tuple[str, tuple]]) -> None:
+        by_table: dict[str, list[tuple]] = {}
+        for table, row in rows:
+            by_table.setdefault(table, []).append(row)
+        async with self.pool.connection() as conn:
+            async with conn.cursor() as cur:
+                for table, table_rows in by_table.items():
+                    cols = ", ".join(AUDIT_TABLES[table])
+                    stage = f"_stage_{table}"
+                    buf = io.StringIO()
+                    for row in table_rows:
+                        buf.write("\t".join(_copy_field(v) for v in row))
+                        buf.write("\n")
+                    await cur.execute(
+                        f"CREATE TEMP TABLE IF NOT EXISTS {stage} "
+                        f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+                    )
+                    async with cur.copy(f"COPY {stage} ({cols}) FROM STDIN") as copy:
+                        await copy.write(buf.getvalue())
+                    await cur.execute(
+                        f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {stage} "
+                        f"ON CONFLICT DO NOTHING"
+                    )
+            await conn.commit()
+        self._batches += 1
+
+    def _spill(self, rows: list[tuple[str, tuple]]) -> None:
+        if not rows:
+            return
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for table, row in rows:
+                    f.write(json.dumps({"table": table, "row": list(row)}, default=str))
+                    f.write("\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._spilled += len(rows)
+
+    def _spill_files(self) -> list[str]:
+        if not self.spill_path:
+            return []
+        return [p for p in (self.spill_path + ".replay", self.spill_path) if os.path.exists(p)]
+
+    def _take_spill(self) -> list[tuple[str, tuple]] | None:
+        """Move the spill file aside for replay and read it back."""
+        replay = self.spill_path + ".replay"
+        with self._spill_lock:
+            if not os.path.exists(replay):
+                if not os.path.exists(self.spill_path):
+                    return None
+                os.replace(self.spill_path, replay)
+        with open(replay, encoding="utf-8") as f:
+            return [(rec["table"], tuple(rec["row"]))
+                    for rec in map(json.loads, filter(str.strip, f))]
+
+    async def _replay_spill(self) -> None:
+        """Write back a previous spill; on failure the file stays for next time."""
+        rows = await asyncio.to_thread(self._take_spill)
+        if rows is None:
+            return
+        if rows:
+            await self._copy(rows)
+        os.remove(self.spill_path + ".replay")
+        self._replayed += len(rows)
+        self._written += len(rows)
+
+    def stats(self) -> dict:
+        pending = 0
+        for path in self._spill_files():
+            try:
+                with open(path, "rb") as f:
+                    pending += sum(1 for _ in f)
+            except OSError:
+                pass
+        return {
+            "mode": "async" if self.enabled else "sync",
+            "spillPath": self.spill_path or None,
+            "queued": self._queue.qsize(),
+            "queueMax": self._queue.maxsize,
+            "batchSize": self.batch_size,
+            "flushIntervalS": self.flush_interval,
+            "submitted": self._submitted,
+            "written": self._written,
+            "batches": self._batches,
+            "spilled": self._spilled,
+            "replayed": self._replayed,
+            "spillPending": pending,
+            "flushErrors": self._errors,
+            "lastFlushMs": round(self._last_flush_ms, 3),
+        }
+
+
+_audit_writer = AuditWriter(_erp_pool, AUDIT_QUEUE_MAX, AUDIT_BATCH_SIZE,
+                            AUDIT_FLUSH_INTERVAL, AUDIT_SPILL_PATH)
+
+
+# ────────────────────────────────────────────────────────────────────
+# Outbound HTTP clients (graphql-api, twin-sim)
+# ────────────────────────────────────────────────────────────────────
+
+class Upstream:
+    """Application-scoped keep-alive client for one outbound service."""
+
+    def __init__(self, name: str, base_url: str, timeout: float, max_connections: int) -> None:
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        )
+        self._client: httpx.AsyncClient | None = None
+        self._requests = 0
+        self._errors = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def start(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, timeout=self.timeout, limits=self.limits,
+            )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        self.start()
+        self._in_flight += 1
+        self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        t0 = time.monotonic()
+        try:
+            return await self._client.post(path, **kwargs)
+        except httpx.HTTPError:
+            self._errors += 1
+            raise
+        finally:
+            elapsed = time.monotonic() - t0
+            self._in_flight -= 1
+            self._requests += 1
+            self._latency_total += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "baseUrl": self.base_url,
+            "maxConnections": self.limits.max_connections,
+            "keepaliveExpiry": self.limits.keepalive_expiry,
+            "inFlight": self._in_flight,
+            "maxInFlight": self._max_in_flight,
+            "requests": self._requests,
+            "errors": self._errors,
+            "avgLatencyMs": round(self._latency_total / self._requests * 1000, 3) if self._requests else 0.0,
+            "maxLatencyMs": round(self._latency_max * 1000, 3),
+        }
+
+
+_graphql = Upstream("graphql", GRAPHQL_URL, timeout=10, max_connections=GRAPHQL_MAX_CONNECTIONS)
+_twin_sim = Upstream("twin-sim", TWIN_SIM_URL, timeout=15, max_connections=TWIN_SIM_MAX_CONNECTIONS)
+
+
+@app.on_event("startup")
+def _open_http_clients() -> None:
+    _graphql.start()
+    _twin_sim.start()
+
+
+@app.on_event("shutdown")
+async def _close_http_clients() -> None:
+    await _graphql.aclose()
+    await _twin_sim.aclose()
+
+
+# ────────────────────────────────────────────────────────────────────
+# Request coalescing (single-flight)
+# ────────────────────────────────────────────────────────────────────
+
+class SingleFlight:
+    """Share one execution among concurrent calls with the same key.
+
+    Each flight runs as its own task and every caller awaits its shared
+    Future, so a leader whose client goes away does not cancel the work
+    the other callers are waiting on.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[tuple, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self._executions: dict[str, int] = {}
+        self._coalesced: dict[str, int] = {}
+
+    def _join(self, key: tuple) -> tuple[concurrent.futures.Future, bool]:
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                self._coalesced[key[0]] = self._coalesced.get(key[0], 0) + 1
+                return fut, False
+            fut = concurrent.futures.Future()
+            self._calls[key] = fut
+            self._executions[key[0]] = self._executions.get(key[0], 0) + 1
+            return fut, True
+
+    def _land(self, key: tuple) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+
+    async def ado(self, key: tuple, fn):
+        """Await ``fn()`` once for all concurrent callers of ``key``."""
+        fut, leader = self._join(key)
+        if leader:
+            def _settle(task: asyncio.Task) -> None:
+                self._land(key)
+                if task.cancelled():
+                    fut.set_exception(asyncio.CancelledError())
+                elif task.exception() is not None:
+                    fut.set_exception(task.exception())
+                else:
+                    fut.set_result(task.result())
+
+            asyncio.ensure_future(fn()).add_done_callback(_settle)
+        return await asyncio.shield(asyncio.wrap_future(fut))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "inFlight": len(self._calls),
+                "executions": dict(self._executions),
+                "coalesced": dict(self._coalesced),
+            }
+
+
+_flights = SingleFlight()
+
+
+@app.exception_handler(psycopg_pool.PoolTimeout)
+async def _pool_timeout_handler(request: Request, exc: Exception) -> JSONResponse:
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
 
 
 @app.get("/healthz")
-def healthz() -> dict:
+async def healthz() -> dict:
     """Basic liveness check – also verifies Postgres connectivity."""
     try:
-        conn = _erp_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT 1")
-        cur.close()
-        conn.close()
+        async with _erp_conn() as conn:
+            await conn.execute("SELECT 1")
         return {"status": "ok", "erp": "connected"}
     except Exception as exc:
         raise HTTPException(503, f"ERP unreachable: {exc}")
 
 
+@app.get("/metrics")
+def runtime_metrics() -> dict:
+    """Runtime pool statistics for capacity sizing."""
+    return {
+        "erpPool": _erp_pool.get_stats(),
+        "erpStatements": _stmts.stats(),
+        "erpReplica": _erp_replica.stats(),
+        "idempotency": _idempotency.stats(),
+        "upstreams": {u.name: u.stats() for u in (_graphql, _twin_sim)},
+        "poIds": _po_ids.stats(),
+        "audit": _audit_writer.stats(),
+        "sourcingCache": _erp_changes.stats(),
+        "singleFlight": _flights.stats(),
+    }
+
+
 # ────────────────────────────────────────────────────────────────────
 # Pydantic models
 # ────────────────────────────────────────────────────────────────────
@@ -69,6 +786,16 @@ class PlanResponse(BaseModel):
     steps: list[PlanStep]
 
 
+class PlanBatchRequest(BaseModel):
+    questions: list[str]
+    lang: str = "en"
+
+
+class PlanBatchResponse(BaseModel):
+    results: list[PlanResponse]  # same order as questions
+    intents: dict[str, int]      # count per intent
+
+
 # --- Analyst (analyze) ---
 
 class AnalyzeRequest(BaseModel):
@@ -110,6 +837,7 @@ class ExecuteRequest(BaseModel):
     poId: Optional[str] = None
     newMode: Optional[str] = None
     actor: str = "agent-system"
+    strictAudit: bool = False  # write the audit row in the action's transaction even when AUDIT_MODE=async
 
 
 class ExecuteResponse(BaseModel):
@@ -120,6 +848,23 @@ class ExecuteResponse(BaseModel):
     details: Optional[dict] = None
 
 
+class ExecuteBatchRequest(BaseModel):
+    actions: list[ExecuteRequest]
+    savepoints: bool = False  # isolate each item's writes instead of all-or-nothing
+
+
+class ExecuteBatchItem(ExecuteResponse):
+    index: int  # position in ExecuteBatchRequest.actions
+    action: str
+
+
+class ExecuteBatchResponse(BaseModel):
+    succeeded: int
+    rejected: int
+    failed: int
+    results: list[ExecuteBatchItem]
+
+
 # ────────────────────────────────────────────────────────────────────
 # Role 1: Integrator – POST /agent/plan
 # Rule-based intent classification → step list
@@ -156,15 +901,87 @@ INTENT_KEYWORDS = {
 }
 
 
+class IntentMatcher:
+    """Aho-Corasick automaton over all intent keywords.
+
+    Each keyword is tagged with its intent's position in the table; a node's
+    output is the best (lowest) position reachable through its suffix links,
+    so one pass over the question yields the same intent as checking the
+    intents in table order.
+    """
+
+    def __init__(self, table: dict[str, list[str]]) -> None:
+        self.intents = list(table)
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[int] = [len(self.intents)]
+        for prio, keywords in enumerate(table.values()):
+            for kw in keywords:
+                node = 0
+                for ch in kw.lower():
+                    nxt = self._goto[node].get(ch)
+                    if nxt is None:
+                        nxt = len(self._goto)
+                        self._goto[node][ch] = nxt
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._out.append(len(self.intents))
+                    node = nxt
+                self._out[node] = min(self._out[node], prio)
+        # BFS for failure links; inherit the suffix's output
+        frontier = deque(self._goto[0].values())
+        while frontier:
+            node = frontier.popleft()
+            for ch, nxt in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = min(self._out[nxt], self._out[self._fail[nxt]])
+                frontier.append(nxt)
+
+    def classify(self, text: str) -> str:
+        goto, fail, out = self._goto, self._fail, self._out
+        best = len(self.intents)
+        node = 0
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node] < best:
+                best = out[node]
+                if best == 0:
+                    break
+        return self.intents[best] if best < len(self.intents) else "UNKNOWN"
+
+
+_intent_matcher = IntentMatcher(INTENT_KEYWORDS)
+
+
 @app.post("/agent/plan", response_model=PlanResponse)
 def plan(req: PlanRequest) -> PlanResponse:
-    q = req.question.lower()
-    intent = "UNKNOWN"
-    for key, keywords in INTENT_KEYWORDS.items():
-        if any(kw in q for kw in keywords):
-            intent = key
-            break
-
+    intent = _intent_matcher.classify(req.question)
+    return PlanResponse(intent=intent, steps=_plan_steps(intent))
+
+
+@app.post("/agent/plan/batch", response_model=PlanBatchResponse)
+def plan_batch(req: PlanBatchRequest) -> PlanBatchResponse:
+    """Classify many questions in one call; steps are built once per intent."""
+    if len(req.questions) > PLAN_BATCH_MAX:
+        raise HTTPException(400, f"Batch too large: {len(req.questions)} questions (max {PLAN_BATCH_MAX})")
+    steps: dict[str, list[PlanStep]] = {}
+    counts: dict[str, int] = {}
+    results: list[PlanResponse] = []
+    for question in req.questions:
+        intent = _intent_matcher.classify(question)
+        if intent not in steps:
+            steps[intent] = _plan_steps(intent)
+        counts[intent] = counts.get(intent, 0) + 1
+        results.append(PlanResponse(intent=intent, steps=steps[intent]))
+    return PlanBatchResponse(results=results, intents=counts)
+
+
+def _plan_steps(intent: str) -> list[PlanStep]:
     steps: list[PlanStep] = []
     step_num = 1
 
@@ -215,7 +1032,7 @@ def plan(req: PlanRequest) -> PlanResponse:
         steps.append(PlanStep(step=step_num, role="analyst", action="analyze",
                               description="Gather general context for the question"))
 
-    return PlanResponse(intent=intent, steps=steps)
+    return steps
 
 
 # ────────────────────────────────────────────────────────────────────
@@ -223,80 +1040,110 @@ def plan(req: PlanRequest) -> PlanResponse:
 # Gathers context from graphql-api + ERP, composes explanation
 # ────────────────────────────────────────────────────────────────────
 
-@app.post("/agent/analyze", response_model=AnalyzeResponse)
-async def analyze(req: AnalyzeRequest) -> AnalyzeResponse:
+async def _lookup_order(order_id: str) -> tuple[dict, list[str]]:
+    """Order status + single-source parts from GraphQL."""
     metrics: dict = {}
     root_parts: list[str] = []
-
-    # Fetch order context from GraphQL
-    if req.orderId:
-        gql = (
-            '{ orders(where: { id: "%s" }) { id status requires { id name '
-            "suppliedBy { id name } } } }" % req.orderId
-        )
-        try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                resp = await client.post(
-                    f"{GRAPHQL_URL}/graphql",
-                    json={"query": gql},
+    gql = (
+        '{ orders(where: { id: "%s" }) { id status requires { id name '
+        "suppliedBy { id name } } } }" % order_id
+    )
+    try:
+        resp = await _graphql.post("/graphql", json={"query": gql})
+        data = resp.json().get("data", {})
+        orders = data.get("orders", [])
+        if orders:
+            order = orders[0]
+            metrics["orderStatus"] = order.get("status", "unknown")
+            parts = order.get("requires", [])
+            metrics["requiredParts"] = len(parts)
+            for p in parts:
+                suppliers = p.get("suppliedBy", [])
+                if len(suppliers) <= 1:
+                    root_parts.append(p.get("id", "?"))
+    except Exception:
+        pass
+    return metrics, root_parts
+
+
+async def _lookup_supplier_risk(supplier_id: str) -> tuple[dict, list[str]]:
+    """Active risk events for a supplier from GraphQL."""
+    metrics: dict = {}
+    gql = (
+        '{ suppliers(where: { id: "%s" }) { id name affectedBy { id type severity } } }'
+        % supplier_id
+    )
+    try:
+        resp = await _graphql.post("/graphql", json={"query": gql})
+        data = resp.json().get("data", {})
+        suppliers = data.get("suppliers", [])
+        if suppliers:
+            risks = suppliers[0].get("affectedBy", [])
+            metrics["activeRisks"] = len(risks)
+            if risks:
+                metrics["maxSeverity"] = max(
+                    r.get("severity", 0) for r in risks
                 )
-                data = resp.json().get("data", {})
-                orders = data.get("orders", [])
-                if orders:
-                    order = orders[0]
-                    metrics["orderStatus"] = order.get("status", "unknown")
-                    parts = order.get("requires", [])
-                    metrics["requiredParts"] = len(parts)
-                    for p in parts:
-                        suppliers = p.get("suppliedBy", [])
-                        if len(suppliers) <= 1:
-                            root_parts.append(p.get("id", "?"))
-        except Exception:
-            pass
+    except Exception:
+        pass
+    return metrics, []
 
-    # Fetch risk events from GraphQL
-    if req.supplierId:
-        gql = (
-            '{ suppliers(where: { id: "%s" }) { id name affectedBy { id type severity } } }'
-            % req.supplierId
-        )
-        try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                resp = await client.post(
-                    f"{GRAPHQL_URL}/graphql",
-                    json={"query": gql},
-                )
-                data = resp.json().get("data", {})
-                suppliers = data.get("suppliers", [])
-                if suppliers:
-                    risks = suppliers[0].get("affectedBy", [])
-                    metrics["activeRisks"] = len(risks)
-                    if risks:
-                        metrics["maxSeverity"] = max(
-                            r.get("severity", 0) for r in risks
-                        )
-        except Exception:
-            pass
 
-    # Fetch ERP inventory for the part
-    if req.partId:
-        try:
-            conn = _erp_conn()
-            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            cur.execute(
-                "SELECT SUM(on_hand) AS on_hand, SUM(reserved) AS reserved "
-                "FROM inventory_lots WHERE part_id = %s",
-                (req.partId,),
-            )
-            row = cur.fetchone()
+_stmts.register(
+    "inventory_totals",
+    "SELECT SUM(on_hand) AS on_hand, SUM(reserved) AS reserved "
+    "FROM inventory_lots WHERE part_id = %s",
+)
+
+
+async def _lookup_inventory(part_id: str, fresh: bool) -> tuple[dict, list[str]]:
+    """ERP inventory totals for a part."""
+    metrics: dict = {}
+    try:
+        async with _erp_read_conn(fresh) as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await _stmts.execute(cur, "inventory_totals", (part_id,))
+                row = await cur.fetchone()
             if row and row["on_hand"] is not None:
                 metrics["onHand"] = int(row["on_hand"])
                 metrics["reserved"] = int(row["reserved"])
                 metrics["available"] = int(row["on_hand"]) - int(row["reserved"])
-            cur.close()
-            conn.close()
-        except Exception:
-            pass
+    except Exception:
+        pass
+    return metrics, []
+
+
+@app.post("/agent/analyze", response_model=AnalyzeResponse)
+async def analyze(
+    req: AnalyzeRequest,
+    read_your_writes: bool = Header(False, alias="X-Read-Your-Writes"),
+) -> AnalyzeResponse:
+    metrics: dict = {}
+    root_parts: list[str] = []
+
+    # Independent lookups run concurrently; each gets its own time budget so
+    # one slow backend yields a partial result instead of stalling the call.
+    lookups: dict[str, Awaitable] = {}
+    if req.orderId:
+        lookups["order"] = _lookup_order(req.orderId)
+    if req.supplierId:
+        lookups["supplierRisk"] = _lookup_supplier_risk(req.supplierId)
+    if req.partId:
+        lookups["inventory"] = _lookup_inventory(req.partId, read_your_writes)
+
+    results = await asyncio.gather(
+        *(asyncio.wait_for(aw, ANALYZE_LOOKUP_TIMEOUT) for aw in lookups.values()),
+        return_exceptions=True,
+    )
+    timed_out: list[str] = []
+    for name, res in zip(lookups, results):
+        if isinstance(res, asyncio.TimeoutError):
+            timed_out.append(name)
+        elif not isinstance(res, BaseException):
+            metrics.update(res[0])
+            root_parts.extend(res[1])
+    if timed_out:
+        metrics["partial"] = timed_out
 
     # Compose root-cause explanation
     causes: list[str] = []
@@ -327,6 +1174,12 @@ async def analyze(req: AnalyzeRequest) -> AnalyzeResponse:
 
 @app.post("/agent/simulate", response_model=SimulateResponse)
 async def simulate(req: SimulateRequest) -> SimulateResponse:
+    # Identical what-ifs in flight at the same time share one twin-sim call
+    key = ("simulate", req.orderId, req.partId, req.toSupplierId, req.objective)
+    return await _flights.ado(key, lambda: _simulate(req))
+
+
+async def _simulate(req: SimulateRequest) -> SimulateResponse:
     body = {
         "orderId": req.orderId,
         "partId": req.partId,
@@ -334,14 +1187,10 @@ async def simulate(req: SimulateRequest) -> SimulateResponse:
         "objective": req.objective,
     }
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.post(
-                f"{TWIN_SIM_URL}/simulate/switch-supplier",
-                json=body,
-            )
-            if resp.status_code != 200:
-                raise HTTPException(resp.status_code, resp.text)
-            data = resp.json()
+        resp = await _twin_sim.post("/simulate/switch-supplier", json=body)
+        if resp.status_code != 200:
+            raise HTTPException(resp.status_code, resp.text)
+        data = resp.json()
     except httpx.HTTPStatusError as exc:
         raise HTTPException(502, f"twin-sim error: {exc}")
     except httpx.RequestError as exc:
@@ -378,53 +1227,271 @@ async def simulate(req: SimulateRequest) -> SimulateResponse:
 # Writeback to ERP + audit trail
 # ────────────────────────────────────────────────────────────────────
 
-def _write_audit(conn, event_id: str, actor: str, action: str,
-                 input_data: dict, output_data: dict, status: str) -> None:
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO audit_events (event_id, ts, actor, action, input, output, status)
-           VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-        (
-            event_id,
-            datetime.now(timezone.utc),
-            actor,
-            action,
-            psycopg2.extras.Json(input_data),
-            psycopg2.extras.Json(output_data),
-            status,
-        ),
-    )
-    cur.close()
-
-
-def _write_action_request(conn, request_id: str, action_type: str,
-                          payload: dict, approval: str = "auto-approved") -> None:
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO action_requests (request_id, type, payload, approval_status, created_at)
-           VALUES (%s, %s, %s, %s, %s)""",
-        (
-            request_id,
-            action_type,
-            psycopg2.extras.Json(payload),
-            approval,
-            datetime.now(timezone.utc),
-        ),
-    )
-    cur.close()
+def _audit_row(event_id: str, actor: str, action: str,
+               input_data: dict, output_data: dict, status: str) -> tuple:
+    return (event_id, datetime.now(timezone.utc), actor, action, input_data, output_data, status)
+
+
+def _action_request_row(request_id: str, action_type: str,
+                        payload: dict, approval: str = "auto-approved") -> tuple:
+    return (request_id, action_type, payload, approval, datetime.now(timezone.utc))
+
+
+async def _write_audit_rows(conn, table: str, rows: list[tuple], strict: bool) -> None:
+    """Write audit rows in ``conn``'s transaction, or – in async mode and
+    unless ``strict`` – hand them to the audit writer once it commits."""
+    if not rows:
+        return
+    if _audit_writer.enabled and not strict:
+        conn.deferred_audit.extend((table, row) for row in rows)
+        return
+    cols = AUDIT_TABLES[table]
+    async with conn.cursor() as cur:
+        await cur.executemany(
+            f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join(['%s'] * len(cols))})",
+            [tuple(Jsonb(v) if c in AUDIT_JSON_COLUMNS else v
+                   for c, v in zip(cols, row)) for row in rows],
+        )
+
+
+async def _write_audits(conn, rows: list[tuple], strict: bool = False) -> None:
+    """Multi-row write of _audit_row() tuples."""
+    await _write_audit_rows(conn, "audit_events", rows, strict)
+
+
+async def _write_action_requests(conn, rows: list[tuple], strict: bool = False) -> None:
+    """Multi-row write of _action_request_row() tuples."""
+    await _write_audit_rows(conn, "action_requests", rows, strict)
+
+
+async def _write_audit(conn, event_id: str, actor: str, action: str,
+                       input_data: dict, output_data: dict, status: str,
+                       strict: bool = False) -> None:
+    await _write_audits(conn, [_audit_row(event_id, actor, action, input_data, output_data, status)], strict)
+
+
+async def _write_action_request(conn, request_id: str, action_type: str,
+                                payload: dict, approval: str = "auto-approved",
+                                strict: bool = False) -> None:
+    await _write_action_requests(conn, [_action_request_row(request_id, action_type, payload, approval)], strict)
+
+
+class IdAllocator:
+    """Mints ids from blocks reserved on a Postgres sequence (hi/lo).
+
+    The sequence's INCREMENT BY is the block size: each nextval() reserves
+    the ids ``(value - increment, value]`` for this process, which are then
+    handed out locally without touching the database.
+    """
+
+    def __init__(self, sequence: str, prefix: str) -> None:
+        self.sequence = sequence
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._block_size: int | None = None
+        self._ranges: deque[list[int]] = deque()  # [next, last] inclusive
+        self._blocks = 0
+        self._minted = 0
+
+    BLOCK_SIZE_SQL = ("SELECT increment_by FROM pg_sequences "
+                      "WHERE schemaname = current_schema() AND sequencename = %s")
+    RESERVE_SQL = "SELECT nextval(%s) FROM generate_series(1, %s)"
+
+    async def allocate(self, conn, n: int = 1) -> list[str]:
+        """Mint ``n`` ids, reserving blocks through ``conn`` if needed."""
+        while True:
+            ids, need = self._take(n)
+            if ids is not None:
+                return ids
+            async with conn.cursor() as cur:
+                if self._block_size is None:
+                    await cur.execute(self.BLOCK_SIZE_SQL, (self.sequence,))
+                    self._set_block_size(await cur.fetchone())
+                await cur.execute(self.RESERVE_SQL, (self.sequence, self._blocks_for(need)))
+                self._add(await cur.fetchall())
+
+    def _take(self, n: int) -> tuple[list[str] | None, int]:
+        """Hand out ``n`` ids from reserved blocks, or report the shortfall.
+
+        Reservation happens outside the lock; concurrent callers that both
+        run short may reserve a block too many, which only leaves a gap.
+        """
+        if n <= 0:
+            return [], 0
+        with self._lock:
+            available = self._available()
+            if available < n:
+                return None, n - available
+            out: list[int] = []
+            while len(out) < n:
+                rng = self._ranges[0]
+                take = min(n - len(out), rng[1] - rng[0] + 1)
+                out.extend(range(rng[0], rng[0] + take))
+                rng[0] += take
+                if rng[0] > rng[1]:
+                    self._ranges.popleft()
+            self._minted += n
+        return [f"{self.prefix}{v:04d}" for v in out], 0
+
+    def _available(self) -> int:
+        return sum(hi - lo + 1 for lo, hi in self._ranges)
+
+    def _set_block_size(self, row) -> None:
+        self._block_size = int(row[0]) if row else 1
+
+    def _blocks_for(self, need: int) -> int:
+        return -(-need // self._block_size)
+
+    def _add(self, rows: list[tuple]) -> None:
+        with self._lock:
+            for (hi,) in sorted(rows):
+                self._ranges.append([hi - self._block_size + 1, hi])
+            self._blocks += len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sequence": self.sequence,
+                "blockSize": self._block_size,
+                "blocksReserved": self._blocks,
+                "minted": self._minted,
+                "remainingInBlock": self._available(),
+            }
+
+
+_po_ids = IdAllocator("po_agent_seq", "PO-AGENT-")
+
+_stmts.register("supplier_approval", "SELECT approved FROM suppliers WHERE supplier_id = %s")
+_stmts.register("supplier_supplies_part",
+                "SELECT 1 FROM supplier_parts WHERE supplier_id = %s AND part_id = %s")
+_stmts.register("insert_po", """
+    INSERT INTO purchase_orders (po_id, part_id, supplier_id, qty, status, eta, updated_at)
+    VALUES (%s, %s, %s, %s, 'Open', CURRENT_DATE + INTERVAL '14 days', now())
+""")
+_stmts.register("shipment_for_po", "SELECT shipment_id, mode, status, eta FROM shipments WHERE po_id = %s")
+_stmts.register("expedite_shipment", """
+    UPDATE shipments
+    SET mode = %s,
+        eta = CURRENT_DATE + INTERVAL '3 days',
+        updated_at = now()
+    WHERE po_id = %s
+    RETURNING eta
+""")
+
+
+class IdempotencyStore:
+    """Idempotency-Key bookkeeping in the ERP ``agent_idempotency`` table.
+
+    A key is claimed by inserting its row in the action's own transaction,
+    and the response is stored in that row before commit. A concurrent
+    duplicate blocks on the uncommitted row and, once the original commits,
+    finds the stored response and replays it; if the original rolls back,
+    the duplicate's claim goes through and it executes instead.
+    """
+
+    PURGE_EVERY = 100  # stores between sweeps of expired keys
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._claims = 0
+        self._replays = 0
+        self._mismatches = 0
+        self._stores = 0
+        self._purged = 0
+
+    async def claim(self, conn, idem: dict) -> Optional[ExecuteResponse]:
+        """Claim ``idem["key"]``, or return the response it already has."""
+        self._claims += 1
+        cur = conn.cursor()
+        await _stmts.execute(cur, "idempotency_claim", (idem["key"], idem["hash"], self.ttl))
+        if await cur.fetchone():
+            return None
+        await _stmts.execute(cur, "idempotency_lookup", (idem["key"],))
+        request_hash, response = await cur.fetchone()
+        if request_hash != idem["hash"]:
+            self._mismatches += 1
+            raise HTTPException(422, f"Idempotency-Key {idem['key']!r} was used with a different request")
+        self._replays += 1
+        idem["replayed"] = True
+        return ExecuteResponse(**response)
+
+    async def store(self, conn, idem: dict, resp: ExecuteResponse) -> None:
+        cur = conn.cursor()
+        await _stmts.execute(cur, "idempotency_store", (Jsonb(resp.model_dump()), idem["key"]))
+        self._stores += 1
+        if self._stores % self.PURGE_EVERY == 0:
+            await _stmts.execute(cur, "idempotency_purge")
+            self._purged += cur.rowcount
+
+    def stats(self) -> dict:
+        return {
+            "ttlS": self.ttl,
+            "claims": self._claims,
+            "replays": self._replays,
+            "mismatches": self._mismatches,
+            "stored": self._stores,
+            "purged": self._purged,
+        }
+
+
+_idempotency = IdempotencyStore(IDEMPOTENCY_TTL)
+
+_stmts.register("idempotency_claim", """
+    INSERT INTO agent_idempotency (idem_key, request_hash, expires_at)
+    VALUES (%s, %s, now() + %s * INTERVAL '1 second')
+    ON CONFLICT (idem_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash, response = NULL,
+            created_at = now(), expires_at = EXCLUDED.expires_at
+        WHERE agent_idempotency.expires_at <= now()
+    RETURNING idem_key
+""")
+_stmts.register("idempotency_lookup",
+                "SELECT request_hash, response FROM agent_idempotency WHERE idem_key = %s")
+_stmts.register("idempotency_store",
+                "UPDATE agent_idempotency SET response = %s WHERE idem_key = %s")
+_stmts.register("idempotency_purge", """
+    DELETE FROM agent_idempotency
+    WHERE idem_key IN (SELECT idem_key FROM agent_idempotency WHERE expires_at <= now() LIMIT 500)
+""")
+
+
+async def _commit_execute(conn, idem: Optional[dict], resp: ExecuteResponse) -> ExecuteResponse:
+    """Record ``resp`` against the Idempotency-Key (if any) and commit."""
+    if idem is not None:
+        await _idempotency.store(conn, idem, resp)
+    await conn.commit()
+    return resp
 
 
 @app.post("/agent/execute", response_model=ExecuteResponse)
-def execute(req: ExecuteRequest) -> ExecuteResponse:
+async def execute(
+    req: ExecuteRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+) -> ExecuteResponse:
+    idem = None
+    if idempotency_key is not None:
+        if not idempotency_key or len(idempotency_key) > 255:
+            raise HTTPException(400, "Idempotency-Key must be 1-255 characters")
+        idem = {
+            "key": idempotency_key,
+            "hash": hashlib.sha256(req.model_dump_json().encode()).hexdigest(),
+            "replayed": False,
+        }
+
     if req.action == "CREATE_PO":
-        return _execute_create_po(req)
+        resp = await _execute_create_po(req, idem)
     elif req.action == "EXPEDITE_SHIPMENT":
-        return _execute_expedite_shipment(req)
+        resp = await _execute_expedite_shipment(req, idem)
     else:
         raise HTTPException(400, f"Unknown action: {req.action}")
 
+    if idem is not None and idem["replayed"]:
+        response.headers["Idempotent-Replayed"] = "true"
+    return resp
 
-def _execute_create_po(req: ExecuteRequest) -> ExecuteResponse:
+
+async def _execute_create_po(req: ExecuteRequest, idem: Optional[dict] = None) -> ExecuteResponse:
     if not req.partId or not req.supplierId or not req.qty:
         raise HTTPException(
             400, "CREATE_PO requires partId, supplierId, and qty",
@@ -440,99 +1507,95 @@ def _execute_create_po(req: ExecuteRequest) -> ExecuteResponse:
         "orderId": req.orderId,
     }
 
-    conn = _erp_conn()
-    try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    async with _erp_conn() as conn:
+        try:
+            replay = idem and await _idempotency.claim(conn, idem)
+            if replay:
+                await conn.commit()
+                return replay
+
+            cur = conn.cursor(row_factory=dict_row)
+
+            # Qualification check: supplier must be approved
+            await _stmts.execute(cur, "supplier_approval", (req.supplierId,))
+            supplier_row = await cur.fetchone()
+            if not supplier_row:
+                await _write_audit(
+                    conn, event_id, req.actor, "CREATE_PO",
+                    input_data, {"reason": "Supplier not found"}, "rejected",
+                    strict=req.strictAudit,
+                )
+                return await _commit_execute(conn, idem, ExecuteResponse(
+                    success=False,
+                    message=f"Rejected: supplier {req.supplierId} not found in ERP",
+                    auditEventId=event_id,
+                ))
+            if not supplier_row["approved"]:
+                await _write_audit(
+                    conn, event_id, req.actor, "CREATE_PO",
+                    input_data, {"reason": "Supplier not approved"}, "rejected",
+                    strict=req.strictAudit,
+                )
+                return await _commit_execute(conn, idem, ExecuteResponse(
+                    success=False,
+                    message=f"Rejected: supplier {req.supplierId} is not approved",
+                    auditEventId=event_id,
+                ))
+
+            # Qualification check: supplier must supply the part
+            await _stmts.execute(cur, "supplier_supplies_part", (req.supplierId, req.partId))
+            if not await cur.fetchone():
+                await _write_audit(
+                    conn, event_id, req.actor, "CREATE_PO",
+                    input_data,
+                    {"reason": f"Supplier {req.supplierId} does not supply part {req.partId}"},
+                    "rejected",
+                    strict=req.strictAudit,
+                )
+                return await _commit_execute(conn, idem, ExecuteResponse(
+                    success=False,
+                    message=f"Rejected: supplier {req.supplierId} does not supply part {req.partId}",
+                    auditEventId=event_id,
+                ))
 
-        # Qualification check: supplier must be approved
-        cur.execute(
-            "SELECT approved FROM suppliers WHERE supplier_id = %s",
-            (req.supplierId,),
-        )
-        supplier_row = cur.fetchone()
-        if not supplier_row:
-            _write_audit(
-                conn, event_id, req.actor, "CREATE_PO",
-                input_data, {"reason": "Supplier not found"}, "rejected",
-            )
-            conn.commit()
-            return ExecuteResponse(
-                success=False,
-                message=f"Rejected: supplier {req.supplierId} not found in ERP",
-                auditEventId=event_id,
-            )
-        if not supplier_row["approved"]:
-            _write_audit(
-                conn, event_id, req.actor, "CREATE_PO",
-                input_data, {"reason": "Supplier not approved"}, "rejected",
-            )
-            conn.commit()
-            return ExecuteResponse(
-                success=False,
-                message=f"Rejected: supplier {req.supplierId} is not approved",
-                auditEventId=event_id,
-            )
+            # Generate PO ID
+            po_id = (await _po_ids.allocate(conn))[0]
 
-        # Qualification check: supplier must supply the part
-        cur.execute(
-            "SELECT 1 FROM supplier_parts WHERE supplier_id = %s AND part_id = %s",
-            (req.supplierId, req.partId),
-        )
-        if not cur.fetchone():
-            _write_audit(
+            # Insert purchase order
+            await _stmts.execute(cur, "insert_po", (po_id, req.partId, req.supplierId, req.qty))
+
+            output_data = {"poId": po_id, "status": "Open"}
+
+            await _write_audit(
                 conn, event_id, req.actor, "CREATE_PO",
-                input_data,
-                {"reason": f"Supplier {req.supplierId} does not supply part {req.partId}"},
-                "rejected",
+                input_data, output_data, "success",
+                strict=req.strictAudit,
             )
-            conn.commit()
-            return ExecuteResponse(
-                success=False,
-                message=f"Rejected: supplier {req.supplierId} does not supply part {req.partId}",
-                auditEventId=event_id,
+            await _write_action_request(
+                conn, request_id, "CREATE_PO",
+                {**input_data, "poId": po_id},
+                strict=req.strictAudit,
             )
 
-        # Generate PO ID
-        cur.execute("SELECT COUNT(*) AS cnt FROM purchase_orders")
-        count = cur.fetchone()["cnt"]
-        po_id = f"PO-AGENT-{count + 1:04d}"
-
-        # Insert purchase order
-        cur.execute(
-            """INSERT INTO purchase_orders (po_id, part_id, supplier_id, qty, status, eta, updated_at)
-               VALUES (%s, %s, %s, %s, 'Open', CURRENT_DATE + INTERVAL '14 days', now())""",
-            (po_id, req.partId, req.supplierId, req.qty),
-        )
-
-        output_data = {"poId": po_id, "status": "Open"}
-
-        _write_audit(
-            conn, event_id, req.actor, "CREATE_PO",
-            input_data, output_data, "success",
-        )
-        _write_action_request(
-            conn, request_id, "CREATE_PO",
-            {**input_data, "poId": po_id},
-        )
-
-        conn.commit()
-        cur.close()
-
-        return ExecuteResponse(
-            success=True,
-            message=f"Purchase order {po_id} created for {req.qty}x {req.partId} from {req.supplierId}",
-            auditEventId=event_id,
-            actionRequestId=request_id,
-            details=output_data,
-        )
-    except Exception as exc:
-        conn.rollback()
-        raise HTTPException(500, f"CREATE_PO failed: {exc}")
-    finally:
-        conn.close()
-
-
-def _execute_expedite_shipment(req: ExecuteRequest) -> ExecuteResponse:
+            resp = await _commit_execute(conn, idem, ExecuteResponse(
+                success=True,
+                message=f"Purchase order {po_id} created for {req.qty}x {req.partId} from {req.supplierId}",
+                auditEventId=event_id,
+                actionRequestId=request_id,
+                details=output_data,
+            ))
+            await cur.close()
+            _erp_changes.invalidate(None)
+            return resp
+        except HTTPException:
+            await conn.rollback()
+            raise
+        except Exception as exc:
+            await conn.rollback()
+            raise HTTPException(500, f"CREATE_PO failed: {exc}")
+
+
+async def _execute_expedite_shipment(req: ExecuteRequest, idem: Optional[dict] = None) -> ExecuteResponse:
     if not req.poId:
         raise HTTPException(400, "EXPEDITE_SHIPMENT requires poId")
 
@@ -545,83 +1608,351 @@ def _execute_expedite_shipment(req: ExecuteRequest) -> ExecuteResponse:
         "newMode": new_mode,
     }
 
-    conn = _erp_conn()
-    try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        # Find shipment for the PO
-        cur.execute(
-            "SELECT shipment_id, mode, status, eta FROM shipments WHERE po_id = %s",
-            (req.poId,),
-        )
-        shipment = cur.fetchone()
-        if not shipment:
-            _write_audit(
+    async with _erp_conn() as conn:
+        try:
+            replay = idem and await _idempotency.claim(conn, idem)
+            if replay:
+                await conn.commit()
+                return replay
+
+            cur = conn.cursor(row_factory=dict_row)
+
+            # Find shipment for the PO
+            await _stmts.execute(cur, "shipment_for_po", (req.poId,))
+            shipment = await cur.fetchone()
+            if not shipment:
+                await _write_audit(
+                    conn, event_id, req.actor, "EXPEDITE_SHIPMENT",
+                    input_data, {"reason": "No shipment found for PO"}, "rejected",
+                    strict=req.strictAudit,
+                )
+                return await _commit_execute(conn, idem, ExecuteResponse(
+                    success=False,
+                    message=f"Rejected: no shipment found for PO {req.poId}",
+                    auditEventId=event_id,
+                ))
+
+            old_mode = shipment["mode"]
+            old_eta = str(shipment["eta"]) if shipment["eta"] else None
+
+            # Update shipment mode and adjust ETA
+            await _stmts.execute(cur, "expedite_shipment", (new_mode, req.poId))
+            new_eta_row = await cur.fetchone()
+            new_eta = str(new_eta_row["eta"]) if new_eta_row and new_eta_row["eta"] else None
+
+            output_data = {
+                "shipmentId": shipment["shipment_id"],
+                "oldMode": old_mode,
+                "newMode": new_mode,
+                "oldEta": old_eta,
+                "newEta": new_eta,
+            }
+
+            await _write_audit(
                 conn, event_id, req.actor, "EXPEDITE_SHIPMENT",
-                input_data, {"reason": "No shipment found for PO"}, "rejected",
+                input_data, output_data, "success",
+                strict=req.strictAudit,
             )
-            conn.commit()
-            return ExecuteResponse(
-                success=False,
-                message=f"Rejected: no shipment found for PO {req.poId}",
-                auditEventId=event_id,
+            await _write_action_request(
+                conn, request_id, "EXPEDITE_SHIPMENT",
+                {**input_data, "shipmentId": shipment["shipment_id"]},
+                strict=req.strictAudit,
             )
 
-        old_mode = shipment["mode"]
-        old_eta = str(shipment["eta"]) if shipment["eta"] else None
-
-        # Update shipment mode and adjust ETA
-        cur.execute(
-            """UPDATE shipments
-               SET mode = %s,
-                   eta = CURRENT_DATE + INTERVAL '3 days',
-                   updated_at = now()
-               WHERE po_id = %s""",
-            (new_mode, req.poId),
-        )
+            resp = await _commit_execute(conn, idem, ExecuteResponse(
+                success=True,
+                message=(
+                    f"Shipment {shipment['shipment_id']} expedited: "
+                    f"{old_mode} → {new_mode}, ETA {old_eta} → {new_eta}"
+                ),
+                auditEventId=event_id,
+                actionRequestId=request_id,
+                details=output_data,
+            ))
+            await cur.close()
+            return resp
+        except HTTPException:
+            await conn.rollback()
+            raise
+        except Exception as exc:
+            await conn.rollback()
+            raise HTTPException(500, f"EXPEDITE_SHIPMENT failed: {exc}")
+
+
+# ── POST /agent/execute/batch ──
+#
+# Each item is tracked as a plain dict: the request, its audit/action ids,
+# the input payload, and once validated a ``status`` of success | rejected
+# (audited, like the single endpoint) | invalid (bad request, not audited) |
+# failed (write error under savepoints).
+
+@app.post("/agent/execute/batch", response_model=ExecuteBatchResponse)
+async def execute_batch(req: ExecuteBatchRequest) -> ExecuteBatchResponse:
+    """Validate and execute many actions in one transaction.
+
+    Qualification checks run as bulk lookups and all writes are multi-row.
+    By default any write error rolls the whole batch back; with
+    ``savepoints`` each item's writes are isolated and failures reported
+    per item.
+    """
+    if len(req.actions) > EXECUTE_BATCH_MAX:
+        raise HTTPException(400, f"Batch too large: {len(req.actions)} actions (max {EXECUTE_BATCH_MAX})")
+
+    items = [_batch_item(i, a) for i, a in enumerate(req.actions)]
+
+    async with _erp_conn() as conn:
+        try:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await _validate_batch(cur, items)
+
+            creates = [it for it in items if it["status"] == "success" and it["action"] == "CREATE_PO"]
+            for it, po_id in zip(creates, await _po_ids.allocate(conn, len(creates))):
+                it["poId"] = po_id
 
-        # Fetch updated ETA
-        cur.execute(
-            "SELECT eta FROM shipments WHERE po_id = %s", (req.poId,),
+            if req.savepoints:
+                await _write_batch_isolated(conn, items)
+            else:
+                await _write_batch(conn, items)
+            await conn.commit()
+            if creates:
+                _erp_changes.invalidate(None)
+        except Exception as exc:
+            await conn.rollback()
+            raise HTTPException(500, f"Batch execute failed: {exc}")
+
+    results = [
+        ExecuteBatchItem(
+            index=it["index"],
+            action=it["action"],
+            success=it["status"] == "success",
+            message=it["message"],
+            auditEventId=it["eventId"] if it["status"] in ("success", "rejected") else None,
+            actionRequestId=it["requestId"] if it["status"] == "success" else None,
+            details=it["output"] if it["status"] == "success" else None,
         )
-        new_eta_row = cur.fetchone()
-        new_eta = str(new_eta_row["eta"]) if new_eta_row and new_eta_row["eta"] else None
-
-        output_data = {
-            "shipmentId": shipment["shipment_id"],
-            "oldMode": old_mode,
-            "newMode": new_mode,
-            "oldEta": old_eta,
-            "newEta": new_eta,
+        for it in items
+    ]
+    return ExecuteBatchResponse(
+        succeeded=sum(r.success for r in results),
+        rejected=sum(it["status"] == "rejected" for it in items),
+        failed=sum(it["status"] in ("invalid", "failed") for it in items),
+        results=results,
+    )
+
+
+def _batch_item(index: int, req: ExecuteRequest) -> dict:
+    if req.action == "CREATE_PO":
+        input_data = {
+            "action": "CREATE_PO",
+            "partId": req.partId,
+            "supplierId": req.supplierId,
+            "qty": req.qty,
+            "orderId": req.orderId,
+        }
+    else:
+        input_data = {
+            "action": req.action,
+            "poId": req.poId,
+            "newMode": req.newMode or "Air",
         }
+    return {
+        "index": index,
+        "req": req,
+        "action": req.action,
+        "eventId": f"AE-{uuid.uuid4().hex[:8]}",
+        "requestId": f"AR-{uuid.uuid4().hex[:8]}",
+        "input": input_data,
+        "status": None,
+        "message": "",
+        "output": {},
+    }
+
 
-        _write_audit(
-            conn, event_id, req.actor, "EXPEDITE_SHIPMENT",
-            input_data, output_data, "success",
+def _reject(it: dict, reason: str, message: str) -> None:
+    it["status"] = "rejected"
+    it["output"] = {"reason": reason}
+    it["message"] = message
+
+
+async def _validate_batch(cur, items: list[dict]) -> None:
+    """Request checks, then bulk qualification / shipment lookups."""
+    for it in items:
+        r = it["req"]
+        if it["action"] == "CREATE_PO":
+            if not r.partId or not r.supplierId or not r.qty:
+                it["status"], it["message"] = "invalid", "CREATE_PO requires partId, supplierId, and qty"
+        elif it["action"] == "EXPEDITE_SHIPMENT":
+            if not r.poId:
+                it["status"], it["message"] = "invalid", "EXPEDITE_SHIPMENT requires poId"
+        else:
+            it["status"], it["message"] = "invalid", f"Unknown action: {it['action']}"
+
+    creates = [it for it in items if it["status"] is None and it["action"] == "CREATE_PO"]
+    if creates:
+        await cur.execute(
+            "SELECT supplier_id, approved FROM suppliers WHERE supplier_id = ANY(%s)",
+            (list({it["req"].supplierId for it in creates}),),
         )
-        _write_action_request(
-            conn, request_id, "EXPEDITE_SHIPMENT",
-            {**input_data, "shipmentId": shipment["shipment_id"]},
+        approved = {r["supplier_id"]: r["approved"] for r in await cur.fetchall()}
+        pairs = list({(it["req"].supplierId, it["req"].partId) for it in creates})
+        await cur.execute(
+            """SELECT sp.supplier_id, sp.part_id
+               FROM supplier_parts sp
+               JOIN unnest(%s::text[], %s::text[]) AS r(supplier_id, part_id)
+                 USING (supplier_id, part_id)""",
+            ([s for s, _ in pairs], [p for _, p in pairs]),
         )
-
-        conn.commit()
-        cur.close()
-
-        return ExecuteResponse(
-            success=True,
-            message=(
-                f"Shipment {shipment['shipment_id']} expedited: "
-                f"{old_mode} → {new_mode}, ETA {old_eta} → {new_eta}"
-            ),
-            auditEventId=event_id,
-            actionRequestId=request_id,
-            details=output_data,
+        supplies = {(r["supplier_id"], r["part_id"]) for r in await cur.fetchall()}
+
+        for it in creates:
+            r = it["req"]
+            if r.supplierId not in approved:
+                _reject(it, "Supplier not found",
+                        f"Rejected: supplier {r.supplierId} not found in ERP")
+            elif not approved[r.supplierId]:
+                _reject(it, "Supplier not approved",
+                        f"Rejected: supplier {r.supplierId} is not approved")
+            elif (r.supplierId, r.partId) not in supplies:
+                _reject(it, f"Supplier {r.supplierId} does not supply part {r.partId}",
+                        f"Rejected: supplier {r.supplierId} does not supply part {r.partId}")
+            else:
+                it["status"] = "success"
+
+    expedites = [it for it in items if it["status"] is None and it["action"] == "EXPEDITE_SHIPMENT"]
+    if expedites:
+        await cur.execute(
+            """SELECT DISTINCT ON (po_id) po_id, shipment_id, mode, status, eta
+               FROM shipments WHERE po_id = ANY(%s) ORDER BY po_id""",
+            (list({it["req"].poId for it in expedites}),),
         )
-    except Exception as exc:
-        conn.rollback()
-        raise HTTPException(500, f"EXPEDITE_SHIPMENT failed: {exc}")
-    finally:
-        conn.close()
+        shipments = {r["po_id"]: r for r in await cur.fetchall()}
+        for it in expedites:
+            shipment = shipments.get(it["req"].poId)
+            if not shipment:
+                _reject(it, "No shipment found for PO",
+                        f"Rejected: no shipment found for PO {it['req'].poId}")
+            else:
+                it["shipment"] = shipment
+                it["status"] = "success"
+
+
+def _finish_create(it: dict) -> None:
+    r = it["req"]
+    it["output"] = {"poId": it["poId"], "status": "Open"}
+    it["message"] = f"Purchase order {it['poId']} created for {r.qty}x {r.partId} from {r.supplierId}"
+
+
+def _finish_expedite(it: dict, new_eta) -> None:
+    shipment = it["shipment"]
+    old_mode = shipment["mode"]
+    old_eta = str(shipment["eta"]) if shipment["eta"] else None
+    new_eta = str(new_eta) if new_eta else None
+    new_mode = it["input"]["newMode"]
+    it["output"] = {
+        "shipmentId": shipment["shipment_id"],
+        "oldMode": old_mode,
+        "newMode": new_mode,
+        "oldEta": old_eta,
+        "newEta": new_eta,
+    }
+    it["message"] = (
+        f"Shipment {shipment['shipment_id']} expedited: "
+        f"{old_mode} → {new_mode}, ETA {old_eta} → {new_eta}"
+    )
+
+
+def _action_payload(it: dict) -> dict:
+    if it["action"] == "CREATE_PO":
+        return {**it["input"], "poId": it["poId"]}
+    return {**it["input"], "shipmentId": it["shipment"]["shipment_id"]}
+
+
+async def _write_batch(conn, items: list[dict]) -> None:
+    """All writes as multi-row statements – a handful of round trips in total."""
+    async with conn.cursor() as cur:
+        creates = [it for it in items if it["status"] == "success" and it["action"] == "CREATE_PO"]
+        if creates:
+            await cur.execute(
+                """INSERT INTO purchase_orders (po_id, part_id, supplier_id, qty, status, eta, updated_at)
+                   SELECT v.po_id, v.part_id, v.supplier_id, v.qty,
+                          'Open', CURRENT_DATE + INTERVAL '14 days', now()
+                   FROM unnest(%s::text[], %s::text[], %s::text[], %s::int[])
+                        AS v(po_id, part_id, supplier_id, qty)""",
+                ([it["poId"] for it in creates], [it["req"].partId for it in creates],
+                 [it["req"].supplierId for it in creates], [it["req"].qty for it in creates]),
+            )
+            for it in creates:
+                _finish_create(it)
+
+        expedites = [it for it in items if it["status"] == "success" and it["action"] == "EXPEDITE_SHIPMENT"]
+        if expedites:
+            await cur.execute(
+                """UPDATE shipments AS sh
+                   SET mode = v.mode,
+                       eta = CURRENT_DATE + INTERVAL '3 days',
+                       updated_at = now()
+                   FROM unnest(%s::text[], %s::text[]) AS v(po_id, mode)
+                   WHERE sh.po_id = v.po_id
+                   RETURNING sh.po_id, sh.eta""",
+                ([it["req"].poId for it in expedites], [it["input"]["newMode"] for it in expedites]),
+            )
+            new_etas = dict(await cur.fetchall())
+            for it in expedites:
+                _finish_expedite(it, new_etas.get(it["req"].poId))
+
+    for strict in (True, False):
+        await _write_audits(conn, [
+            _audit_row(it["eventId"], it["req"].actor, it["action"],
+                       it["input"], it["output"], it["status"])
+            for it in items
+            if it["status"] in ("success", "rejected") and it["req"].strictAudit is strict
+        ], strict)
+        await _write_action_requests(conn, [
+            _action_request_row(it["requestId"], it["action"], _action_payload(it))
+            for it in items if it["status"] == "success" and it["req"].strictAudit is strict
+        ], strict)
+
+
+async def _write_batch_isolated(conn, items: list[dict]) -> None:
+    """Per-item writes, each under its own savepoint."""
+    async with conn.cursor() as cur:
+        for it in items:
+            if it["status"] not in ("success", "rejected"):
+                continue
+            r = it["req"]
+            deferred = len(conn.deferred_audit)
+            await cur.execute("SAVEPOINT batch_item")
+            try:
+                if it["status"] == "success" and it["action"] == "CREATE_PO":
+                    await cur.execute(
+                        """INSERT INTO purchase_orders (po_id, part_id, supplier_id, qty, status, eta, updated_at)
+                           VALUES (%s, %s, %s, %s, 'Open', CURRENT_DATE + INTERVAL '14 days', now())""",
+                        (it["poId"], r.partId, r.supplierId, r.qty),
+                    )
+                    _finish_create(it)
+                elif it["status"] == "success":
+                    await cur.execute(
+                        """UPDATE shipments
+                           SET mode = %s,
+                               eta = CURRENT_DATE + INTERVAL '3 days',
+                               updated_at = now()
+                           WHERE po_id = %s
+                           RETURNING eta""",
+                        (it["input"]["newMode"], r.poId),
+                    )
+                    row = await cur.fetchone()
+                    _finish_expedite(it, row[0] if row else None)
+                await _write_audit(conn, it["eventId"], r.actor, it["action"],
+                                   it["input"], it["output"], it["status"], strict=r.strictAudit)
+                if it["status"] == "success":
+                    await _write_action_request(conn, it["requestId"], it["action"], _action_payload(it),
+                                                strict=r.strictAudit)
+                await cur.execute("RELEASE SAVEPOINT batch_item")
+            except psycopg.Error as exc:
+                await cur.execute("ROLLBACK TO SAVEPOINT batch_item")
+                del conn.deferred_audit[deferred:]
+                it["status"] = "failed"
+                it["message"] = f"{it['action']} failed: {exc}"
 
 
 # ════════════════════════════════════════════════════════════════════
@@ -639,6 +1970,145 @@ OBJECTIVE_WEIGHTS = {
 
 QUAL_SCORE_MAP = {"Full": 90, "Conditional": 55, "Pending": 25, "Disqualified": 0}
 
+# Used when a supplier has no lane to the requested factory
+DEFAULT_LANE = {"mode": "Ocean", "time_days": 21, "cost": 1.00, "reliability": 0.85}
+
+# One row per supplier of the part, with its fastest lane to the factory and
+# cheapest still-valid quote joined in laterally (NULL when absent).
+RFQ_CANDIDATES_SQL = """
+    SELECT sp.supplier_id, s.name AS supplier_name, s.approved,
+           sp.lead_time_days, sp.moq, sp.capacity_per_week,
+           sp.last_price, sp.qualification_level, sp.priority,
+           tl.mode AS lane_mode, tl.time_days AS lane_time_days,
+           tl.cost AS lane_cost, tl.reliability AS lane_reliability,
+           q.price AS quote_price
+    FROM supplier_parts sp
+    JOIN suppliers s ON s.supplier_id = sp.supplier_id
+    LEFT JOIN LATERAL (
+        SELECT mode, time_days, cost, reliability
+        FROM transport_lanes
+        WHERE supplier_id = sp.supplier_id AND factory_id = %s
+        ORDER BY time_days
+        LIMIT 1
+    ) tl ON true
+    LEFT JOIN LATERAL (
+        SELECT price
+        FROM quotes
+        WHERE part_id = sp.part_id AND supplier_id = sp.supplier_id
+          AND valid_to >= CURRENT_DATE
+        ORDER BY price
+        LIMIT 1
+    ) q ON true
+    WHERE sp.part_id = %s
+    ORDER BY sp.priority, sp.last_price
+"""
+
+# Bulk variant for many (part, factory) pairs. Rows of one pair arrive
+# contiguously, pairs in order of first appearance in the request.
+RFQ_CANDIDATES_BATCH_SQL = """
+    WITH req AS (
+        SELECT part_id, factory_id, MIN(ord) AS ord
+        FROM unnest(%s::text[], %s::text[]) WITH ORDINALITY AS r(part_id, factory_id, ord)
+        GROUP BY part_id, factory_id
+    )
+    SELECT req.part_id AS req_part_id, req.factory_id AS req_factory_id,
+           sp.supplier_id, s.name AS supplier_name, s.approved,
+           sp.lead_time_days, sp.moq, sp.capacity_per_week,
+           sp.last_price, sp.qualification_level, sp.priority,
+           tl.mode AS lane_mode, tl.time_days AS lane_time_days,
+           tl.cost AS lane_cost, tl.reliability AS lane_reliability,
+           q.price AS quote_price
+    FROM req
+    JOIN supplier_parts sp ON sp.part_id = req.part_id
+    JOIN suppliers s ON s.supplier_id = sp.supplier_id
+    LEFT JOIN LATERAL (
+        SELECT mode, time_days, cost, reliability
+        FROM transport_lanes
+        WHERE supplier_id = sp.supplier_id AND factory_id = req.factory_id
+        ORDER BY time_days
+        LIMIT 1
+    ) tl ON true
+    LEFT JOIN LATERAL (
+        SELECT price
+        FROM quotes
+        WHERE part_id = sp.part_id AND supplier_id = sp.supplier_id
+          AND valid_to >= CURRENT_DATE
+        ORDER BY price
+        LIMIT 1
+    ) q ON true
+    ORDER BY req.ord, sp.priority, sp.last_price
+"""
+
+# Parts at or under the qualified-source threshold, with their supplier list
+# and demand order count folded in. ORDER BY is filled from SINGLE_SOURCE_ORDER.
+SINGLE_SOURCE_SQL = """
+    WITH candidates AS (
+        SELECT p.part_id, p.name AS part_name,
+               COUNT(DISTINCT CASE WHEN s.approved AND sp.qualification_level IN ('Full','Conditional')
+                     THEN sp.supplier_id END) AS qualified_count,
+               json_agg(json_build_object(
+                   'supplier_id', sp.supplier_id,
+                   'name', s.name,
+                   'qualification_level', sp.qualification_level,
+                   'approved', s.approved
+               ) ORDER BY sp.priority) AS suppliers
+        FROM parts p
+        JOIN supplier_parts sp ON sp.part_id = p.part_id
+        JOIN suppliers s ON s.supplier_id = sp.supplier_id
+        WHERE (%(after)s::text IS NULL OR p.part_id > %(after)s)
+        GROUP BY p.part_id, p.name
+        HAVING COUNT(DISTINCT CASE WHEN s.approved AND sp.qualification_level IN ('Full','Conditional')
+                     THEN sp.supplier_id END) <= %(threshold)s
+    )
+    SELECT c.part_id, c.part_name, c.qualified_count, c.suppliers,
+           COALESCE(d.order_count, 0) AS order_count
+    FROM candidates c
+    LEFT JOIN LATERAL (
+        SELECT COUNT(DISTINCT order_id) AS order_count
+        FROM demand
+        WHERE part_id = c.part_id
+    ) d ON true
+    ORDER BY {order}
+    LIMIT %(limit)s
+"""
+
+SINGLE_SOURCE_ORDER = {
+    "risk": "c.qualified_count, c.part_id",  # full listing: most exposed first
+    "keyset": "c.part_id",                   # paged / streamed
+}
+
+# Horizon demand for all parts (or the %(parts)s subset) in one pass
+CONSOLIDATE_DEMAND_SQL = """
+    SELECT part_id, order_id, qty, need_by_date, priority, factory_id
+    FROM demand
+    WHERE need_by_date <= CURRENT_DATE + (%(horizon)s || ' days')::INTERVAL
+      AND (%(parts)s::text[] IS NULL OR part_id = ANY(%(parts)s))
+    ORDER BY part_id, priority, need_by_date
+"""
+
+# Best approved, qualified supplier per part
+CONSOLIDATE_SUPPLIER_SQL = """
+    SELECT DISTINCT ON (sp.part_id)
+           sp.part_id, sp.supplier_id, s.name, sp.moq, sp.last_price,
+           sp.capacity_per_week, sp.qualification_level
+    FROM supplier_parts sp
+    JOIN suppliers s ON s.supplier_id = sp.supplier_id
+    WHERE sp.part_id = ANY(%(parts)s) AND s.approved = true
+          AND sp.qualification_level IN ('Full', 'Conditional')
+    ORDER BY sp.part_id, sp.priority, sp.last_price
+"""
+
+_stmts.register("rfq_candidates", RFQ_CANDIDATES_SQL)
+_stmts.register("single_source_risk", SINGLE_SOURCE_SQL.format(order=SINGLE_SOURCE_ORDER["risk"]))
+_stmts.register("single_source_keyset", SINGLE_SOURCE_SQL.format(order=SINGLE_SOURCE_ORDER["keyset"]))
+_stmts.register("demand_horizon", CONSOLIDATE_DEMAND_SQL)
+_stmts.register("best_supplier", CONSOLIDATE_SUPPLIER_SQL)
+
+RFQ_BATCH_MAX = int(os.getenv("RFQ_BATCH_MAX", "2000"))
+SOURCING_CACHE_TTL = float(os.getenv("SOURCING_CACHE_TTL", "300"))   # result lifetime (s); 0 disables
+SOURCING_CACHE_MAX = int(os.getenv("SOURCING_CACHE_MAX", "1024"))    # entries per endpoint
+ERP_CHANGES_CHANNEL = "erp_changes"  # see infra/postgres/erp/07_agent_change_notify.sql
+
 
 # ── Pydantic models ──
 
@@ -648,6 +2118,7 @@ class RfqRequest(BaseModel):
     qty: int = 1000
     needByDate: Optional[str] = None  # ISO date string; defaults to +30 days
     objective: str = "balanced"
+    topK: Optional[int] = None  # return only the best K candidates
 
 
 class CandidateBreakdown(BaseModel):
@@ -677,8 +2148,47 @@ class RfqResponse(BaseModel):
     candidates: list[RfqCandidate]
 
 
+class RfqBatchRequest(BaseModel):
+    items: list[RfqRequest]
+
+
+class RfqBatchResult(RfqResponse):
+    index: int  # position in RfqBatchRequest.items
+    factoryId: str
+
+
+class RfqCompareRequest(BaseModel):
+    partId: str
+    factoryId: str = "F1"
+    qty: int = 1000
+    needByDate: Optional[str] = None
+    objectives: Optional[list[str]] = None      # OBJECTIVE_WEIGHTS profiles; default all
+    weights: dict[str, dict[str, float]] = {}   # extra named profiles, e.g. {"mine": {"lead": 2, "cost": 1}}
+    topK: Optional[int] = None
+
+
+class RfqParetoSupplier(BaseModel):
+    supplierId: str
+    supplierName: str
+    lead: float  # unweighted 0-100 component scores
+    cost: float
+    risk: float
+    lane: float
+
+
+class RfqCompareResponse(BaseModel):
+    partId: str
+    factoryId: str
+    qty: int
+    rankings: dict[str, list[RfqCandidate]]  # per profile, in request order
+    pareto: list[RfqParetoSupplier]          # non-hard-fail suppliers no other candidate dominates
+
+
 class SingleSourceRequest(BaseModel):
     threshold: int = 1
+    limit: Optional[int] = None   # page size; pages are keyed by partId
+    after: Optional[str] = None   # keyset cursor: nextCursor of the previous page
+    stream: bool = False          # NDJSON, one SingleSourcePart per line
 
 
 class SingleSourcePart(BaseModel):
@@ -692,6 +2202,7 @@ class SingleSourcePart(BaseModel):
 
 class SingleSourceResponse(BaseModel):
     parts: list[SingleSourcePart]
+    nextCursor: Optional[str] = None
 
 
 class ConsolidateRequest(BaseModel):
@@ -719,432 +2230,1068 @@ class ConsolidateResponse(BaseModel):
     explanation: str
 
 
+class ConsolidateBatchRequest(BaseModel):
+    partIds: Optional[list[str]] = None  # None = every part with demand in the horizon
+    horizonDays: int = 30
+    policy: str = "priority"
+
+
+class ConsolidateBatchResponse(BaseModel):
+    horizonDays: int
+    policy: str
+    results: list[ConsolidateResponse]
+    unsourcedParts: list[str]  # demand in horizon but no qualified supplier
+
+
+# ── Result cache ──
+#
+# Sourcing responses are cached per normalized request. Keys carry today's
+# date wherever the result depends on CURRENT_DATE / date.today(). Entries
+# are dropped when a NOTIFY on ERP_CHANGES_CHANNEL names one of the cache's
+# tables, and after agent-api's own PO writes; while the listener is down
+# the caches are bypassed.
+
+class ResultCache:
+    """Bounded LRU of endpoint results with a TTL.
+
+    Invalidation bumps a generation counter, so a result computed from data
+    read before the invalidation is never stored after it.
+    """
+
+    def __init__(self, name: str, tables: set[str], max_entries: int, ttl: float,
+                 settle: float = 0.0) -> None:
+        self.name = name
+        self.tables = tables
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.settle = settle
+        self._invalidated_at = 0.0
+        self._entries: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # counters
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+        self._invalidations = 0
+
+    async def aget_or_compute(self, key: tuple, compute):
+        """The cached value for ``key``, or await ``compute()`` and cache it."""
+        hit, value, generation = self._lookup(key)
+        if hit:
+            return value
+        value = await compute()
+        self._store(key, value, generation)
+        return value
+
+    def _lookup(self, key: tuple) -> tuple[bool, object, int | None]:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return False, None, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return True, entry[1], None
+                del self._entries[key]
+                self._expired += 1
+            self._misses += 1
+            return False, None, self._generation
+
+    def _store(self, key: tuple, value, generation: int | None) -> None:
+        with self._lock:
+            # Within ``settle`` of an invalidation a replica may still serve
+            # the old rows: return the result but don't keep it.
+            if (generation is not None and generation == self._generation
+                    and time.monotonic() - self._invalidated_at >= self.settle):
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._invalidated_at = time.monotonic()
+            self._invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlS": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expired": self._expired,
+                "invalidations": self._invalidations,
+            }
+
+
+class ErpChangeListener:
+    """LISTEN on a dedicated autocommit connection and invalidate the caches
+    whose tables a notification names (payload = table name)."""
+
+    def __init__(self, dsn: str, channel: str, caches: list[ResultCache]) -> None:
+        self.dsn = dsn
+        self.channel = channel
+        self.caches = caches
+        self.live = False
+        self._task: asyncio.Task | None = None
+        self._notifications = 0
+        self._reconnects = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="erp-change-listener")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.dsn, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {self.channel}")
+                    # Anything may have changed while we were not listening
+                    self.invalidate(None)
+                    self.live = True
+                    backoff = 1.0
+                    async for notify in conn.notifies():
+                        self._notifications += 1
+                        self.invalidate(notify.payload)
+            except psycopg.Error:
+                self._reconnects += 1
+            finally:
+                self.live = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def invalidate(self, table: str | None) -> None:
+        """Drop the caches reading ``table`` (all of them for None)."""
+        for cache in self.caches:
+            if table is None or table in cache.tables:
+                cache.invalidate()
+
+    def stats(self) -> dict:
+        return {
+            "channel": self.channel,
+            "live": self.live,
+            "notifications": self._notifications,
+            "reconnects": self._reconnects,
+            "caches": {c.name: c.stats() for c in self.caches},
+        }
+
+
+# Replica reads may trail a NOTIFY by up to the tolerated lag
+_SOURCING_CACHE_SETTLE = ERP_REPLICA_MAX_LAG if ERP_REPLICA_DSN else 0.0
+
+_rfq_cache = ResultCache(
+    "rfqCandidates", {"supplier_parts", "suppliers", "transport_lanes", "quotes"},
+    SOURCING_CACHE_MAX, SOURCING_CACHE_TTL, _SOURCING_CACHE_SETTLE,
+)
+_single_source_cache = ResultCache(
+    "singleSourceParts", {"parts", "supplier_parts", "suppliers", "demand"},
+    SOURCING_CACHE_MAX, SOURCING_CACHE_TTL, _SOURCING_CACHE_SETTLE,
+)
+_consolidate_cache = ResultCache(
+    "consolidatePo", {"demand", "supplier_parts", "suppliers"},
+    SOURCING_CACHE_MAX, SOURCING_CACHE_TTL, _SOURCING_CACHE_SETTLE,
+)
+_erp_changes = ErpChangeListener(
+    ERP_DSN, ERP_CHANGES_CHANNEL, [_rfq_cache, _single_source_cache, _consolidate_cache],
+)
+
+
+async def _cached(cache: ResultCache, key: tuple, compute):
+    if not _erp_changes.live:
+        return await compute()
+    return await cache.aget_or_compute(key, compute)
+
+
+@app.on_event("startup")
+async def _start_erp_listener() -> None:
+    if SOURCING_CACHE_TTL > 0:
+        _erp_changes.start()
+
+
+@app.on_event("shutdown")
+async def _stop_erp_listener() -> None:
+    await _erp_changes.stop()
+
+
 # ── POST /agent/rfq-candidates ──
 
 @app.post("/agent/rfq-candidates", response_model=RfqResponse)
-def rfq_candidates(req: RfqRequest) -> RfqResponse:
+async def rfq_candidates(
+    req: RfqRequest,
+    read_your_writes: bool = Header(False, alias="X-Read-Your-Writes"),
+) -> RfqResponse:
+    if read_your_writes:
+        return await _fetch_rfq(req, fresh=True)
+    today = date.today()
+    need_by = date.fromisoformat(req.needByDate) if req.needByDate else today + timedelta(days=30)
+    key = (req.partId, req.factoryId, req.qty, req.objective, need_by, req.topK, today)
+    return await _cached(_rfq_cache, key, lambda: _flights.ado(("rfq", *key), lambda: _fetch_rfq(req)))
+
+
+async def _fetch_rfq(req: RfqRequest, fresh: bool = False) -> RfqResponse:
+    return _score_rfq(req, await _fetch_rfq_rows(req.partId, req.factoryId, fresh))
+
+
+async def _fetch_rfq_rows(part_id: str, factory_id: str, fresh: bool = False) -> list[dict]:
+    # Candidates + fastest lane + cheapest valid quote in one round trip
+    async with _erp_read_conn(fresh) as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await _stmts.execute(cur, "rfq_candidates", (factory_id, part_id))
+            return await cur.fetchall()
+
+
+def _score_rfq(req: RfqRequest, suppliers: list[dict]) -> RfqResponse:
+    """Score and rank the RFQ_CANDIDATES_SQL rows of one part/factory."""
     weights = OBJECTIVE_WEIGHTS.get(req.objective, OBJECTIVE_WEIGHTS["balanced"])
 
     if req.needByDate:
         need_by = date.fromisoformat(req.needByDate)
     else:
-        need_by = date.today() + __import__("datetime").timedelta(days=30)
+        need_by = date.today() + timedelta(days=30)
 
     days_available = max((need_by - date.today()).days, 1)
 
-    conn = _erp_conn()
-    try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        # Get all suppliers for this part
-        cur.execute("""
-            SELECT sp.supplier_id, s.name AS supplier_name, s.approved,
-                   sp.lead_time_days, sp.moq, sp.capacity_per_week,
-                   sp.last_price, sp.qualification_level, sp.priority
-            FROM supplier_parts sp
-            JOIN suppliers s ON s.supplier_id = sp.supplier_id
-            WHERE sp.part_id = %s
-            ORDER BY sp.priority, sp.last_price
-        """, (req.partId,))
-        suppliers = cur.fetchall()
-
-        if not suppliers:
-            return RfqResponse(partId=req.partId, qty=req.qty,
-                               objective=req.objective, candidates=[])
-
-        # Get transport lanes for each supplier → factory
-        lane_map: dict[str, dict] = {}
-        for sp in suppliers:
-            cur.execute("""
-                SELECT mode, time_days, cost, reliability
-                FROM transport_lanes
-                WHERE supplier_id = %s AND factory_id = %s
-                ORDER BY time_days
-                LIMIT 1
-            """, (sp["supplier_id"], req.factoryId))
-            lane = cur.fetchone()
-            if lane:
-                lane_map[sp["supplier_id"]] = dict(lane)
-            else:
-                lane_map[sp["supplier_id"]] = {
-                    "mode": "Ocean", "time_days": 21, "cost": 1.00, "reliability": 0.85,
-                }
-
-        # Get existing quotes
-        cur.execute("""
-            SELECT supplier_id, price, valid_to, incoterms
-            FROM quotes
-            WHERE part_id = %s AND valid_to >= CURRENT_DATE
-            ORDER BY price
-        """, (req.partId,))
-        quote_map: dict[str, dict] = {}
-        for q in cur.fetchall():
-            if q["supplier_id"] not in quote_map:
-                quote_map[q["supplier_id"]] = dict(q)
-
-        # Count total qualified suppliers for this part (for risk calc)
-        total_suppliers = sum(1 for sp in suppliers
-                              if sp["qualification_level"] != "Disqualified"
-                              and sp["approved"])
-
-        cur.close()
-    finally:
-        conn.close()
-
-    # Find min cost for normalization
-    costs = []
-    for sp in suppliers:
-        lane = lane_map[sp["supplier_id"]]
-        quote = quote_map.get(sp["supplier_id"])
-        unit_price = float(quote["price"]) if quote else float(sp["last_price"])
-        total_cost = unit_price + float(lane["cost"])
-        costs.append(total_cost)
-    min_cost = min(costs) if costs else 1.0
-
-    # Score each candidate
-    raw_candidates: list[RfqCandidate] = []
-    for idx, sp in enumerate(suppliers):
-        sid = sp["supplier_id"]
-        sname = sp["supplier_name"]
-        lane = lane_map[sid]
-        quote = quote_map.get(sid)
-        explanations: list[str] = []
-        actions: list[str] = []
-        penalties = 0.0
-        hard_fail = False
-        hard_fail_reason = None
-
-        lead_days = int(sp["lead_time_days"])
-        transit_days = int(lane["time_days"])
-        total_delivery = lead_days + transit_days
-        unit_price = float(quote["price"]) if quote else float(sp["last_price"])
-        total_cost = unit_price + float(lane["cost"])
-        qual = sp["qualification_level"] or "Pending"
-        moq = int(sp["moq"]) if sp["moq"] else 100
-        capacity = int(sp["capacity_per_week"]) if sp["capacity_per_week"] else 5000
-        reliability = float(lane["reliability"])
-
-        # -- Lead time score (0-100) --
-        if total_delivery <= days_available:
-            margin = days_available - total_delivery
-            lead_score = min(100, 60 + margin * 2)
-        else:
-            overshoot = total_delivery - days_available
-            lead_score = max(0, 50 - overshoot * 5)
-        explanations.append(
-            f"Lead: {lead_days}d production + {transit_days}d {lane['mode']} "
-            f"= {total_delivery}d (need by {need_by}, {days_available - total_delivery}d margin)"
-        )
+    if not suppliers:
+        return RfqResponse(partId=req.partId, qty=req.qty,
+                           objective=req.objective, candidates=[])
+
+    cols = _rfq_columns(suppliers)
+    group = np.zeros(len(suppliers), dtype=np.intp)
+    m = _rfq_score_matrix(
+        cols, group, 1,
+        qty=np.array([req.qty]),
+        days_available=np.array([days_available]),
+        weights=np.array([[weights[k] for k in WEIGHT_KEYS]]),
+    )
+    order = _rfq_rank(group, m["hardFail"], m["total"])
+    if req.topK is not None:
+        order = order[:req.topK]
+
+    # Explanations are only rendered for the candidates actually returned
+    candidates = [
+        _render_candidate(req, suppliers[i], cols, m, int(i), rank, need_by, days_available)
+        for rank, i in enumerate(order, start=1)
+    ]
+    return RfqResponse(
+        partId=req.partId, qty=req.qty,
+        objective=req.objective, candidates=candidates,
+    )
 
-        # Hard constraint: delivery impossible
-        if total_delivery > days_available * 1.5:
-            hard_fail = True
-            hard_fail_reason = (
-                f"Cannot deliver in time: {total_delivery}d vs {days_available}d available"
-            )
 
-        # -- Cost score (0-100) --
-        cost_score = round(100 * (min_cost / total_cost), 1) if total_cost > 0 else 0
-        price_src = "quoted" if quote else "catalog"
-        explanations.append(
-            f"Cost: ${unit_price:.2f}/unit ({price_src}) + "
-            f"${float(lane['cost']):.2f} shipping = ${total_cost:.2f}/unit "
-            f"({'+' if total_cost > min_cost else ''}{((total_cost - min_cost) / min_cost * 100):.0f}% vs cheapest)"
+# ── Vectorized scoring engine ──
+#
+# Candidates are scored as flat columns; ``group`` maps each row to the
+# part/factory request it belongs to, so one call can score the whole
+# parts × suppliers × factories matrix.
+
+WEIGHT_KEYS = ("lead", "cost", "risk", "lane")
+
+
+def _round(x: np.ndarray, ndigits: int) -> np.ndarray:
+    """Vectorized round() that agrees with Python's decimal-correct rounding.
+
+    np.round scales by 10**ndigits first, which can flip values sitting on a
+    rounding boundary; those few are re-rounded with the builtin.
+    """
+    scale = 10.0 ** ndigits
+    y = np.asarray(x, dtype=np.float64) * scale
+    out = np.rint(y) / scale
+    for i in np.flatnonzero(np.abs(y - np.floor(y) - 0.5) < 1e-6):
+        out.flat[i] = round(float(np.asarray(x).flat[i]), ndigits)
+    return out
+
+
+def _rfq_columns(rows: list[dict]) -> dict[str, np.ndarray]:
+    """Columnar view of RFQ_CANDIDATES_SQL rows, with catalog defaults applied."""
+    has_lane = [r["lane_mode"] is not None for r in rows]
+    qual = [r["qualification_level"] or "Pending" for r in rows]
+    approved = np.array([bool(r["approved"]) for r in rows])
+    return {
+        "leadDays": np.array([int(r["lead_time_days"]) for r in rows], dtype=np.int64),
+        "transitDays": np.array(
+            [int(r["lane_time_days"]) if ok else DEFAULT_LANE["time_days"]
+             for r, ok in zip(rows, has_lane)], dtype=np.int64),
+        "laneCost": np.array(
+            [float(r["lane_cost"]) if ok else DEFAULT_LANE["cost"]
+             for r, ok in zip(rows, has_lane)], dtype=np.float64),
+        "reliability": np.array(
+            [float(r["lane_reliability"]) if ok else DEFAULT_LANE["reliability"]
+             for r, ok in zip(rows, has_lane)], dtype=np.float64),
+        "laneMode": np.array(
+            [r["lane_mode"] if ok else DEFAULT_LANE["mode"]
+             for r, ok in zip(rows, has_lane)], dtype=object),
+        "quoted": np.array([r["quote_price"] is not None for r in rows]),
+        "unitPrice": np.array(
+            [float(r["quote_price"]) if r["quote_price"] is not None else float(r["last_price"])
+             for r in rows], dtype=np.float64),
+        "moq": np.array([int(r["moq"]) if r["moq"] else 100 for r in rows], dtype=np.int64),
+        "capacity": np.array(
+            [int(r["capacity_per_week"]) if r["capacity_per_week"] else 5000 for r in rows],
+            dtype=np.int64),
+        "qual": np.array(qual, dtype=object),
+        "riskBase": np.array([QUAL_SCORE_MAP.get(q, 30) for q in qual], dtype=np.int64),
+        "pending": np.array([q == "Pending" for q in qual]),
+        "disqualified": np.array([q == "Disqualified" for q in qual]),
+        "approved": approved,
+        # counts toward the "qualified sources" total (raw level, not defaulted)
+        "countable": np.array([r["qualification_level"] != "Disqualified" for r in rows]) & approved,
+    }
+
+
+def _rfq_score_matrix(cols: dict[str, np.ndarray], group: np.ndarray, n_groups: int,
+                      qty: np.ndarray, days_available: np.ndarray,
+                      weights: np.ndarray) -> dict[str, np.ndarray]:
+    """Score every candidate row at once.
+
+    ``qty`` and ``days_available`` are per group; ``weights`` is an
+    (n_groups, 4) array in WEIGHT_KEYS order.
+    """
+    row_qty = qty[group]
+    row_days = days_available[group]
+    w = weights[group]
+
+    # Lead time score (0-100)
+    total_delivery = cols["leadDays"] + cols["transitDays"]
+    margin = row_days - total_delivery
+    lead_score = np.where(margin >= 0, np.minimum(100, 60 + margin * 2),
+                          np.maximum(0, 50 + margin * 5))
+
+    # Cost score (0-100) against the cheapest landed cost in the group
+    total_cost = cols["unitPrice"] + cols["laneCost"]
+    group_min = np.full(n_groups, np.inf)
+    np.minimum.at(group_min, group, total_cost)
+    min_cost = group_min[group]
+    safe_cost = np.where(total_cost > 0, total_cost, 1.0)
+    cost_score = np.where(total_cost > 0, _round(100 * (min_cost / safe_cost), 1), 0.0)
+
+    # Risk score (0-100)
+    qualified = np.bincount(group, weights=cols["countable"], minlength=n_groups)[group].astype(np.int64)
+    risk_score = np.minimum(100, cols["riskBase"] + np.where(qualified >= 2, 5, 0))
+
+    # Lane score (0-100)
+    lane_score = _round(cols["reliability"] * 100, 1)
+
+    # Penalties
+    moq_short = row_qty < cols["moq"]
+    over_capacity = row_qty > cols["capacity"] * 2
+    # Negate the sum, then add 0.0 so unpenalized rows are 0.0 rather than -0.0
+    penalties = -(10.0 * moq_short + 15.0 * over_capacity + 8.0 * cols["pending"]) + 0.0
+
+    b_lead = lead_score * w[:, 0]
+    b_cost = cost_score * w[:, 1]
+    b_risk = risk_score * w[:, 2]
+    b_lane = lane_score * w[:, 3]
+
+    late = total_delivery > row_days * 1.5
+    return {
+        "totalDelivery": total_delivery,
+        "totalCost": total_cost,
+        "minCost": min_cost,
+        "qualified": qualified,
+        "moqShort": moq_short,
+        "overCapacity": over_capacity,
+        "late": late,
+        "hardFail": late | cols["disqualified"] | ~cols["approved"],
+        "penalties": penalties,
+        "leadScore": lead_score,
+        "costScore": cost_score,
+        "riskScore": risk_score,
+        "laneScore": lane_score,
+        "lead": _round(b_lead, 2),
+        "cost": _round(b_cost, 2),
+        "risk": _round(b_risk, 2),
+        "lane": _round(b_lane, 2),
+        "total": _round(b_lead + b_cost + b_risk + b_lane + penalties, 2),
+    }
+
+
+def _rfq_rank(group: np.ndarray, hard_fail: np.ndarray, total: np.ndarray) -> np.ndarray:
+    """Row order per group: non-hard-fail first, then score desc (stable)."""
+    return np.lexsort((np.arange(len(group)), -total, hard_fail, group))
+
+
+def _render_candidate(req: RfqRequest, sp: dict, cols: dict[str, np.ndarray],
+                      m: dict[str, np.ndarray], i: int, rank: int,
+                      need_by: date, days_available: int) -> RfqCandidate:
+    sid = sp["supplier_id"]
+    lead_days = int(cols["leadDays"][i])
+    transit_days = int(cols["transitDays"][i])
+    total_delivery = int(m["totalDelivery"][i])
+    mode = cols["laneMode"][i]
+    lane_cost = float(cols["laneCost"][i])
+    unit_price = float(cols["unitPrice"][i])
+    total_cost = float(m["totalCost"][i])
+    min_cost = float(m["minCost"][i])
+    qual = cols["qual"][i]
+    risk_base = int(cols["riskBase"][i])
+    reliability = float(cols["reliability"][i])
+    moq = int(cols["moq"][i])
+    capacity = int(cols["capacity"][i])
+    total_suppliers = int(m["qualified"][i])
+
+    price_src = "quoted" if cols["quoted"][i] else "catalog"
+    explanations = [
+        f"Lead: {lead_days}d production + {transit_days}d {mode} "
+        f"= {total_delivery}d (need by {need_by}, {days_available - total_delivery}d margin)",
+        f"Cost: ${unit_price:.2f}/unit ({price_src}) + "
+        f"${lane_cost:.2f} shipping = ${total_cost:.2f}/unit "
+        f"({'+' if total_cost > min_cost else ''}{((total_cost - min_cost) / min_cost * 100):.0f}% vs cheapest)",
+        f"Risk: qualification={qual} (base {risk_base}), "
+        f"{total_suppliers} qualified source(s)",
+        f"Lane: {mode} to {req.factoryId}, "
+        f"reliability {reliability:.0%}, {transit_days}d",
+    ]
+    actions: list[str] = []
+
+    hard_fail_reason = None
+    if m["late"][i]:
+        hard_fail_reason = (
+            f"Cannot deliver in time: {total_delivery}d vs {days_available}d available"
         )
+    if cols["disqualified"][i]:
+        hard_fail_reason = "Supplier is disqualified"
+    if not cols["approved"][i]:
+        hard_fail_reason = f"Supplier {sid} is not approved"
 
-        # -- Risk score (0-100) --
-        risk_base = QUAL_SCORE_MAP.get(qual, 30)
-        multi_source_bonus = 5 if total_suppliers >= 2 else 0
-        risk_score = min(100, risk_base + multi_source_bonus)
+    if m["moqShort"][i]:
         explanations.append(
-            f"Risk: qualification={qual} (base {risk_base}), "
-            f"{total_suppliers} qualified source(s)"
+            f"PENALTY: MOQ={moq}, requested {req.qty}. "
+            f"Gap of {moq - req.qty} units."
         )
-
-        # Hard constraint: disqualified or not approved
-        if qual == "Disqualified":
-            hard_fail = True
-            hard_fail_reason = "Supplier is disqualified"
-        if not sp["approved"]:
-            hard_fail = True
-            hard_fail_reason = f"Supplier {sid} is not approved"
-
-        # -- Lane score (0-100) --
-        lane_score = round(reliability * 100, 1)
+        actions.append(
+            f"Consider consolidating with other orders to meet MOQ of {moq}. "
+            f"Use /consolidate-po for allocation plan."
+        )
+    if m["overCapacity"][i]:
         explanations.append(
-            f"Lane: {lane['mode']} to {req.factoryId}, "
-            f"reliability {reliability:.0%}, {transit_days}d"
+            f"PENALTY: weekly capacity={capacity}, "
+            f"order qty={req.qty} exceeds 2-week capacity"
         )
-
-        # -- Penalties --
-        if req.qty < moq:
-            penalties -= 10
-            explanations.append(
-                f"PENALTY: MOQ={moq}, requested {req.qty}. "
-                f"Gap of {moq - req.qty} units."
-            )
-            actions.append(
-                f"Consider consolidating with other orders to meet MOQ of {moq}. "
-                f"Use /consolidate-po for allocation plan."
-            )
-
-        if req.qty > capacity * 2:
-            penalties -= 15
-            explanations.append(
-                f"PENALTY: weekly capacity={capacity}, "
-                f"order qty={req.qty} exceeds 2-week capacity"
-            )
-            actions.append("Consider splitting order across multiple suppliers")
-
-        if qual == "Conditional":
-            actions.append(f"Accelerate full qualification for {sid}")
-        elif qual == "Pending":
-            penalties -= 8
-            actions.append(
-                f"Supplier {sid} needs qualification — "
-                f"estimated 4-6 weeks to complete"
-            )
-
-        # -- Total weighted score --
-        total_score = round(
-            lead_score * weights["lead"]
-            + cost_score * weights["cost"]
-            + risk_score * weights["risk"]
-            + lane_score * weights["lane"]
-            + penalties,
-            2,
+        actions.append("Consider splitting order across multiple suppliers")
+    if qual == "Conditional":
+        actions.append(f"Accelerate full qualification for {sid}")
+    elif qual == "Pending":
+        actions.append(
+            f"Supplier {sid} needs qualification — "
+            f"estimated 4-6 weeks to complete"
         )
 
-        raw_candidates.append(RfqCandidate(
-            rank=0,
-            supplierId=sid,
-            supplierName=sname,
-            totalScore=total_score,
-            breakdown=CandidateBreakdown(
-                lead=round(lead_score * weights["lead"], 2),
-                cost=round(cost_score * weights["cost"], 2),
-                risk=round(risk_score * weights["risk"], 2),
-                lane=round(lane_score * weights["lane"], 2),
-                penalties=penalties,
-            ),
-            explanations=explanations,
-            recommendedActions=actions,
-            hardFail=hard_fail,
-            hardFailReason=hard_fail_reason,
-        ))
+    return RfqCandidate(
+        rank=rank,
+        supplierId=sid,
+        supplierName=sp["supplier_name"],
+        totalScore=float(m["total"][i]),
+        breakdown=CandidateBreakdown(
+            lead=float(m["lead"][i]),
+            cost=float(m["cost"][i]),
+            risk=float(m["risk"][i]),
+            lane=float(m["lane"][i]),
+            penalties=float(m["penalties"][i]),
+        ),
+        explanations=explanations,
+        recommendedActions=actions,
+        hardFail=bool(m["hardFail"][i]),
+        hardFailReason=hard_fail_reason,
+    )
 
-    # Sort: non-hard-fail first, then by score desc
-    raw_candidates.sort(key=lambda c: (c.hardFail, -c.totalScore))
-    for i, c in enumerate(raw_candidates):
-        c.rank = i + 1
 
-    return RfqResponse(
-        partId=req.partId, qty=req.qty,
-        objective=req.objective, candidates=raw_candidates,
+# ── POST /agent/rfq-candidates/batch ──
+
+@app.post("/agent/rfq-candidates/batch")
+async def rfq_candidates_batch(req: RfqBatchRequest) -> StreamingResponse:
+    """Score many parts in one call; one RfqBatchResult per NDJSON line."""
+    if len(req.items) > RFQ_BATCH_MAX:
+        raise HTTPException(400, f"Batch too large: {len(req.items)} items (max {RFQ_BATCH_MAX})")
+    return StreamingResponse(_rfq_batch_lines(req.items), media_type="application/x-ndjson")
+
+
+async def _rfq_batch_lines(items: list[RfqRequest]) -> AsyncIterator[str]:
+    # Items sharing a (part, factory) pair share one group of candidate rows
+    pairs: dict[tuple[str, str], list[int]] = {}
+    for i, item in enumerate(items):
+        pairs.setdefault((item.partId, item.factoryId), []).append(i)
+    if not pairs:
+        return
+
+    async with _erp_conn() as conn:
+        # Server-side cursor: score and emit each part while later rows are still in flight
+        async with conn.cursor(name=f"rfq_batch_{uuid.uuid4().hex[:8]}", row_factory=dict_row) as cur:
+            cur.itersize = 500
+            await cur.execute(RFQ_CANDIDATES_BATCH_SQL,
+                              ([p for p, _ in pairs], [f for _, f in pairs]))
+            rows = aiter(cur)
+            pending = await anext(rows, None)
+            for key, indexes in pairs.items():
+                group: list[dict] = []
+                while pending is not None and (pending["req_part_id"], pending["req_factory_id"]) == key:
+                    group.append(pending)
+                    pending = await anext(rows, None)
+                for i in indexes:
+                    res = _score_rfq(items[i], group)
+                    line = RfqBatchResult(index=i, factoryId=items[i].factoryId, **res.model_dump())
+                    yield line.model_dump_json() + "\n"
+
+
+# ── POST /agent/rfq-candidates/compare ──
+
+def _compare_profiles(req: RfqCompareRequest) -> dict[str, dict[str, float]]:
+    """Named weight profiles to score under, in response order."""
+    names = req.objectives if req.objectives is not None else list(OBJECTIVE_WEIGHTS)
+    unknown = [n for n in names if n not in OBJECTIVE_WEIGHTS]
+    if unknown:
+        raise HTTPException(400, f"Unknown objective(s): {', '.join(unknown)}")
+    profiles = {n: OBJECTIVE_WEIGHTS[n] for n in names}
+    for name, w in req.weights.items():
+        bad = set(w) - set(WEIGHT_KEYS)
+        if bad:
+            raise HTTPException(400, f"Weights {name!r}: unknown key(s) {', '.join(sorted(bad))}")
+        if any(v < 0 for v in w.values()) or sum(w.values()) <= 0:
+            raise HTTPException(400, f"Weights {name!r} must be non-negative and not all zero")
+        # Normalised so totals stay on the same 0-100 scale as the built-in profiles
+        total = sum(w.values())
+        profiles[name] = {k: w.get(k, 0.0) / total for k in WEIGHT_KEYS}
+    if not profiles:
+        raise HTTPException(400, "No objectives to score")
+    return profiles
+
+
+def _pareto_front(points: np.ndarray) -> np.ndarray:
+    """Mask of rows of ``points`` (higher is better) that no other row dominates."""
+    ge = (points[:, None, :] >= points[None, :, :]).all(axis=2)
+    gt = (points[:, None, :] > points[None, :, :]).any(axis=2)
+    dominated = (ge & gt).any(axis=0)  # [j, i] true: j dominates i
+    return ~dominated
+
+
+@app.post("/agent/rfq-candidates/compare", response_model=RfqCompareResponse)
+async def rfq_candidates_compare(
+    req: RfqCompareRequest,
+    read_your_writes: bool = Header(False, alias="X-Read-Your-Writes"),
+) -> RfqCompareResponse:
+    """Rank one part's candidates under several weight profiles at once.
+
+    Candidate rows are fetched once and scored for every profile in a
+    single vectorized pass, one scoring group per profile; ``pareto`` lists
+    the suppliers that are best on some trade-off of lead/cost/risk/lane.
+    """
+    profiles = _compare_profiles(req)
+    rows = await _fetch_rfq_rows(req.partId, req.factoryId, read_your_writes)
+    if not rows:
+        return RfqCompareResponse(partId=req.partId, factoryId=req.factoryId, qty=req.qty,
+                                  rankings={name: [] for name in profiles}, pareto=[])
+
+    need_by = date.fromisoformat(req.needByDate) if req.needByDate else date.today() + timedelta(days=30)
+    days_available = max((need_by - date.today()).days, 1)
+
+    n, k = len(rows), len(profiles)
+    base = _rfq_columns(rows)
+    cols = {name: np.tile(col, k) for name, col in base.items()}
+    group = np.repeat(np.arange(k), n)
+    m = _rfq_score_matrix(
+        cols, group, k,
+        qty=np.full(k, req.qty),
+        days_available=np.full(k, days_available),
+        weights=np.array([[w[key] for key in WEIGHT_KEYS] for w in profiles.values()]),
     )
+    order = _rfq_rank(group, m["hardFail"], m["total"])
+
+    rankings: dict[str, list[RfqCandidate]] = {}
+    for g, name in enumerate(profiles):
+        ranked = order[g * n:(g + 1) * n]  # lexsort orders by group first
+        if req.topK is not None:
+            ranked = ranked[:req.topK]
+        rreq = RfqRequest(partId=req.partId, factoryId=req.factoryId, qty=req.qty,
+                          needByDate=req.needByDate, objective=name)
+        rankings[name] = [
+            _render_candidate(rreq, rows[i % n], cols, m, int(i), rank, need_by, days_available)
+            for rank, i in enumerate(ranked, start=1)
+        ]
+
+    # Component scores don't depend on the weights: use the first group's rows
+    points = np.column_stack([m[f"{key}Score"][:n] for key in WEIGHT_KEYS]).astype(np.float64)
+    viable = np.flatnonzero(~m["hardFail"][:n])
+    front = viable[_pareto_front(points[viable])] if len(viable) else viable
+    pareto = [
+        RfqParetoSupplier(supplierId=rows[i]["supplier_id"], supplierName=rows[i]["supplier_name"],
+                          **{key: float(points[i, j]) for j, key in enumerate(WEIGHT_KEYS)})
+        for i in front
+    ]
+    return RfqCompareResponse(partId=req.partId, factoryId=req.factoryId, qty=req.qty,
+                              rankings=rankings, pareto=pareto)
 
 
 # ── POST /agent/single-source-parts ──
 
 @app.post("/agent/single-source-parts", response_model=SingleSourceResponse)
-def single_source_parts(req: SingleSourceRequest) -> SingleSourceResponse:
-    conn = _erp_conn()
-    try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        cur.execute("""
-            SELECT p.part_id, p.name AS part_name,
-                   COUNT(DISTINCT CASE WHEN s.approved AND sp.qualification_level IN ('Full','Conditional')
-                         THEN sp.supplier_id END) AS qualified_count,
-                   COUNT(DISTINCT sp.supplier_id) AS total_count
-            FROM parts p
-            JOIN supplier_parts sp ON sp.part_id = p.part_id
-            JOIN suppliers s ON s.supplier_id = sp.supplier_id
-            GROUP BY p.part_id, p.name
-            HAVING COUNT(DISTINCT CASE WHEN s.approved AND sp.qualification_level IN ('Full','Conditional')
-                         THEN sp.supplier_id END) <= %s
-            ORDER BY COUNT(DISTINCT CASE WHEN s.approved AND sp.qualification_level IN ('Full','Conditional')
-                         THEN sp.supplier_id END),
-                     p.part_id
-        """, (req.threshold,))
-        parts_rows = cur.fetchall()
-
-        result: list[SingleSourcePart] = []
-        for row in parts_rows:
-            pid = row["part_id"]
-            # Get supplier details
-            cur.execute("""
-                SELECT sp.supplier_id, s.name, sp.qualification_level, s.approved,
-                       sp.lead_time_days, sp.last_price, sp.capacity_per_week
-                FROM supplier_parts sp
-                JOIN suppliers s ON s.supplier_id = sp.supplier_id
-                WHERE sp.part_id = %s
-                ORDER BY sp.priority
-            """, (pid,))
-            suppliers = [dict(r) for r in cur.fetchall()]
-
-            # Count demand orders for this part
-            cur.execute(
-                "SELECT COUNT(DISTINCT order_id) AS order_count FROM demand WHERE part_id = %s",
-                (pid,),
-            )
-            demand_row = cur.fetchone()
-            order_count = int(demand_row["order_count"]) if demand_row else 0
-
-            qualified = [s for s in suppliers
-                         if s["approved"] and s["qualification_level"] in ("Full", "Conditional")]
-            q_count = int(row["qualified_count"])
-
-            # Risk explanation
-            if q_count == 0:
-                risk = (f"CRITICAL: No qualified supplier for {pid}. "
-                        f"{len(suppliers)} supplier(s) exist but none are fully qualified/approved.")
-            elif q_count == 1:
-                sole = qualified[0]
-                risk = (f"HIGH: Single qualified source {sole['supplier_id']} ({sole['name']}), "
-                        f"qual={sole['qualification_level']}. "
-                        f"Used by {order_count} order(s). Any disruption = line stop.")
-            else:
-                risk = (f"MODERATE: Only {q_count} qualified sources. "
-                        f"Used by {order_count} order(s).")
-
-            # Recommendation
-            pending = [s for s in suppliers if s["qualification_level"] == "Pending"]
-            if pending:
-                rec = (f"Accelerate qualification of {', '.join(s['supplier_id'] for s in pending)} "
-                       f"to develop second source. "
-                       f"Estimated 4-6 weeks for full qualification.")
-            elif q_count <= 1:
-                rec = (f"Initiate RFQ with alternative suppliers. "
-                       f"Consider regional diversification to reduce logistics risk.")
-            else:
-                rec = "Monitor existing supply base; consider qualifying a third source."
-
-            result.append(SingleSourcePart(
-                partId=pid,
-                partName=row["part_name"],
-                supplierCount=q_count,
-                suppliers=[{
-                    "supplierId": s["supplier_id"],
-                    "name": s["name"],
-                    "qualification": s["qualification_level"],
-                    "approved": s["approved"],
-                } for s in suppliers],
-                riskExplanation=risk,
-                recommendation=rec,
-            ))
-
-        cur.close()
-    finally:
-        conn.close()
-
-    return SingleSourceResponse(parts=result)
+async def single_source_parts(
+    req: SingleSourceRequest,
+    read_your_writes: bool = Header(False, alias="X-Read-Your-Writes"),
+):
+    """Single-source parts, most exposed first.
+
+    With ``limit``/``after`` or ``stream`` the listing is keyed by partId
+    instead, so pages are stable and can be fetched or rendered incrementally.
+    """
+    params = {"threshold": req.threshold, "after": req.after, "limit": req.limit}
+    if req.stream:
+        return StreamingResponse(_single_source_lines(params, read_your_writes),
+                                 media_type="application/x-ndjson")
+    if read_your_writes:
+        return await _fetch_single_source(req, params, fresh=True)
+    key = (req.threshold, req.limit, req.after)
+    return await _cached(_single_source_cache, key, lambda: _fetch_single_source(req, params))
+
+
+async def _fetch_single_source(req: SingleSourceRequest, params: dict,
+                               fresh: bool = False) -> SingleSourceResponse:
+    paged = req.limit is not None or req.after is not None
+    async with _erp_read_conn(fresh) as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await _stmts.execute(cur, "single_source_keyset" if paged else "single_source_risk", params)
+            rows = await cur.fetchall()
+
+    next_cursor = rows[-1]["part_id"] if req.limit and len(rows) == req.limit else None
+    return SingleSourceResponse(parts=[_single_source_part(r) for r in rows], nextCursor=next_cursor)
+
+
+async def _single_source_lines(params: dict, fresh: bool) -> AsyncIterator[str]:
+    async with _erp_read_conn(fresh) as conn:
+        async with conn.cursor(name=f"single_source_{uuid.uuid4().hex[:8]}",
+                               row_factory=dict_row) as cur:
+            cur.itersize = 100
+            await cur.execute(SINGLE_SOURCE_SQL.format(order=SINGLE_SOURCE_ORDER["keyset"]), params)
+            async for row in cur:
+                yield _single_source_part(row).model_dump_json() + "\n"
+
+
+def _single_source_part(row: dict) -> SingleSourcePart:
+    pid = row["part_id"]
+    suppliers = row["suppliers"]
+    order_count = int(row["order_count"])
+
+    qualified = [s for s in suppliers
+                 if s["approved"] and s["qualification_level"] in ("Full", "Conditional")]
+    q_count = int(row["qualified_count"])
+
+    # Risk explanation
+    if q_count == 0:
+        risk = (f"CRITICAL: No qualified supplier for {pid}. "
+                f"{len(suppliers)} supplier(s) exist but none are fully qualified/approved.")
+    elif q_count == 1:
+        sole = qualified[0]
+        risk = (f"HIGH: Single qualified source {sole['supplier_id']} ({sole['name']}), "
+                f"qual={sole['qualification_level']}. "
+                f"Used by {order_count} order(s). Any disruption = line stop.")
+    else:
+        risk = (f"MODERATE: Only {q_count} qualified sources. "
+                f"Used by {order_count} order(s).")
+
+    # Recommendation
+    pending = [s for s in suppliers if s["qualification_level"] == "Pending"]
+    if pending:
+        rec = (f"Accelerate qualification of {', '.join(s['supplier_id'] for s in pending)} "
+               f"to develop second source. "
+               f"Estimated 4-6 weeks for full qualification.")
+    elif q_count <= 1:
+        rec = (f"Initiate RFQ with alternative suppliers. "
+               f"Consider regional diversification to reduce logistics risk.")
+    else:
+        rec = "Monitor existing supply base; consider qualifying a third source."
+
+    return SingleSourcePart(
+        partId=pid,
+        partName=row["part_name"],
+        supplierCount=q_count,
+        suppliers=[{
+            "supplierId": s["supplier_id"],
+            "name": s["name"],
+            "qualification": s["qualification_level"],
+            "approved": s["approved"],
+        } for s in suppliers],
+        riskExplanation=risk,
+        recommendation=rec,
+    )
 
 
 # ── POST /agent/consolidate-po ──
 
 @app.post("/agent/consolidate-po", response_model=ConsolidateResponse)
-def consolidate_po(req: ConsolidateRequest) -> ConsolidateResponse:
-    conn = _erp_conn()
-    try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        # Get demand within horizon
-        cur.execute("""
-            SELECT order_id, qty, need_by_date, priority, factory_id
-            FROM demand
-            WHERE part_id = %s
-              AND need_by_date <= CURRENT_DATE + (%s || ' days')::INTERVAL
-            ORDER BY priority, need_by_date
-        """, (req.partId, str(req.horizonDays)))
-        demands = cur.fetchall()
-
-        if not demands:
-            raise HTTPException(404, f"No demand found for {req.partId} within {req.horizonDays} days")
-
-        total_demand = sum(int(d["qty"]) for d in demands)
-
-        # Get best supplier (priority 1, Full qualification, approved)
-        cur.execute("""
-            SELECT sp.supplier_id, s.name, sp.moq, sp.last_price,
-                   sp.capacity_per_week, sp.qualification_level
-            FROM supplier_parts sp
-            JOIN suppliers s ON s.supplier_id = sp.supplier_id
-            WHERE sp.part_id = %s AND s.approved = true
-                  AND sp.qualification_level IN ('Full', 'Conditional')
-            ORDER BY sp.priority, sp.last_price
-            LIMIT 1
-        """, (req.partId,))
-        best_supplier = cur.fetchone()
-
-        if not best_supplier:
-            raise HTTPException(404, f"No qualified supplier found for {req.partId}")
-
-        moq = int(best_supplier["moq"])
-        consolidated_qty = max(total_demand, moq)
-        # Round up to MOQ multiple
-        if moq > 0 and consolidated_qty % moq != 0:
-            consolidated_qty = math.ceil(consolidated_qty / moq) * moq
-
-        # Sort demands by policy
-        sorted_demands = list(demands)
-        if req.policy == "earliest_due":
-            sorted_demands.sort(key=lambda d: d["need_by_date"])
-        elif req.policy == "risk_min":
-            sorted_demands.sort(key=lambda d: (d["priority"], d["need_by_date"]))
-        else:  # priority (default)
-            sorted_demands.sort(key=lambda d: (d["priority"], d["need_by_date"]))
-
-        # Build allocation plan
-        remaining = consolidated_qty
-        allocations: list[AllocationItem] = []
-        for d in sorted_demands:
-            alloc_qty = min(int(d["qty"]), remaining)
-            if alloc_qty <= 0:
-                continue
-            allocations.append(AllocationItem(
-                orderId=d["order_id"],
-                qty=alloc_qty,
-                needByDate=str(d["need_by_date"]),
-                priority=int(d["priority"]),
-            ))
-            remaining -= alloc_qty
+async def consolidate_po(
+    req: ConsolidateRequest,
+    read_your_writes: bool = Header(False, alias="X-Read-Your-Writes"),
+) -> ConsolidateResponse:
+    if read_your_writes:
+        return await _fetch_consolidate(req, fresh=True)
+    # The demand horizon is relative to CURRENT_DATE
+    key = (req.partId, req.horizonDays, req.policy, date.today())
+    return await _cached(_consolidate_cache, key, lambda: _fetch_consolidate(req))
+
+
+async def _fetch_consolidate(req: ConsolidateRequest, fresh: bool = False) -> ConsolidateResponse:
+    params = {"horizon": str(req.horizonDays), "parts": [req.partId]}
+    async with _erp_read_conn(fresh) as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            # Get demand within horizon
+            await _stmts.execute(cur, "demand_horizon", params)
+            demands = await cur.fetchall()
+
+            if not demands:
+                raise HTTPException(404, f"No demand found for {req.partId} within {req.horizonDays} days")
+
+            # Get best supplier (priority 1, Full qualification, approved)
+            await _stmts.execute(cur, "best_supplier", params)
+            best_supplier = await cur.fetchone()
+
+            if not best_supplier:
+                raise HTTPException(404, f"No qualified supplier found for {req.partId}")
+
+    results, _ = _consolidate(demands, {req.partId: best_supplier}, req.horizonDays, req.policy)
+    return results[0]
+
+
+# ── POST /agent/consolidate-po/batch ──
+
+@app.post("/agent/consolidate-po/batch", response_model=ConsolidateBatchResponse)
+async def consolidate_po_batch(
+    req: ConsolidateBatchRequest,
+    read_your_writes: bool = Header(False, alias="X-Read-Your-Writes"),
+) -> ConsolidateBatchResponse:
+    """Consolidate every part with demand in the horizon (or just ``partIds``)."""
+    async with _erp_read_conn(read_your_writes) as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await _stmts.execute(cur, "demand_horizon", {"horizon": str(req.horizonDays), "parts": req.partIds})
+            demands = await cur.fetchall()
+            best: dict[str, dict] = {}
+            if demands:
+                part_ids = sorted({d["part_id"] for d in demands})
+                await _stmts.execute(cur, "best_supplier", {"parts": part_ids})
+                best = {r["part_id"]: r for r in await cur.fetchall()}
+
+    results, unsourced = _consolidate(demands, best, req.horizonDays, req.policy)
+    return ConsolidateBatchResponse(
+        horizonDays=req.horizonDays, policy=req.policy,
+        results=results, unsourcedParts=unsourced,
+    )
+
+
+def _consolidate(demands: list[dict], best: dict[str, dict], horizon_days: int,
+                 policy: str) -> tuple[list[ConsolidateResponse], list[str]]:
+    """MOQ-consolidate and allocate demand for many parts in one vectorized pass.
+
+    ``demands`` are CONSOLIDATE_DEMAND_SQL rows and ``best`` the chosen
+    supplier per part. Parts without a supplier are returned as unsourced.
+    """
+    if not demands:
+        return [], []
+
+    part_ids, g = np.unique([d["part_id"] for d in demands], return_inverse=True)
+    n, n_parts = len(demands), len(part_ids)
+    qty = np.array([int(d["qty"]) for d in demands], dtype=np.int64)
+    prio = np.array([int(d["priority"]) for d in demands], dtype=np.int64)
+    due = np.array([d["need_by_date"].toordinal() for d in demands], dtype=np.int64)
+
+    sourced = np.array([p in best for p in part_ids])
+    moq = np.array([int(best[p]["moq"]) if p in best else 0 for p in part_ids], dtype=np.int64)
+
+    total_demand = np.zeros(n_parts, dtype=np.int64)
+    np.add.at(total_demand, g, qty)
+    order_count = np.bincount(g, minlength=n_parts)
+
+    # Raise to MOQ, then round up to an MOQ multiple
+    consolidated = np.maximum(total_demand, moq)
+    safe_moq = np.where(moq > 0, moq, 1)
+    consolidated = np.where((moq > 0) & (consolidated % safe_moq != 0),
+                            -(-consolidated // safe_moq) * safe_moq, consolidated)
+
+    # Sort demands by policy within each part (rows arrive as priority, need-by)
+    seq = np.arange(n)
+    if policy == "earliest_due":
+        order = np.lexsort((seq, due, g))
+    else:  # priority (default) / risk_min
+        order = np.lexsort((seq, due, prio, g))
+
+    # Allocate in order until the consolidated quantity is used up
+    og = g[order]
+    oq = np.maximum(qty[order], 0)
+    starts = np.searchsorted(og, np.arange(n_parts))
+    before = np.cumsum(oq) - oq
+    before -= before[starts][og]
+    alloc = np.minimum(oq, np.maximum(consolidated[og] - before, 0))
+
+    results: list[ConsolidateResponse] = []
+    unsourced: list[str] = []
+    ends = np.append(starts[1:], n)
+    for k, pid in enumerate(part_ids):
+        if not sourced[k]:
+            unsourced.append(str(pid))
+            continue
+        sp = best[pid]
+        allocations = [
+            AllocationItem(
+                orderId=demands[order[j]]["order_id"],
+                qty=int(alloc[j]),
+                needByDate=str(demands[order[j]]["need_by_date"]),
+                priority=int(prio[order[j]]),
+            )
+            for j in range(starts[k], ends[k]) if alloc[j] > 0
+        ]
+        total, cons, m = int(total_demand[k]), int(consolidated[k]), int(moq[k])
 
         # Explanation
-        surplus = consolidated_qty - total_demand
+        surplus = cons - total
         explanation_parts = [
-            f"Total demand: {total_demand} units across {len(demands)} order(s) "
-            f"within {req.horizonDays}-day horizon.",
+            f"Total demand: {total} units across {int(order_count[k])} order(s) "
+            f"within {horizon_days}-day horizon.",
         ]
-        if total_demand < moq:
+        if total < m:
             explanation_parts.append(
-                f"Individual demand ({total_demand}) below MOQ ({moq}). "
-                f"Consolidated order raised to {consolidated_qty} units."
+                f"Individual demand ({total}) below MOQ ({m}). "
+                f"Consolidated order raised to {cons} units."
             )
         if surplus > 0:
             explanation_parts.append(
                 f"Surplus of {surplus} units can buffer safety stock."
             )
         explanation_parts.append(
-            f"Best supplier: {best_supplier['supplier_id']} ({best_supplier['name']}), "
-            f"${float(best_supplier['last_price']):.2f}/unit, "
-            f"qual={best_supplier['qualification_level']}."
+            f"Best supplier: {sp['supplier_id']} ({sp['name']}), "
+            f"${float(sp['last_price']):.2f}/unit, "
+            f"qual={sp['qualification_level']}."
         )
         explanation_parts.append(
-            f"Allocation policy: {req.policy}."
+            f"Allocation policy: {policy}."
         )
 
-        cur.close()
+        results.append(ConsolidateResponse(
+            partId=str(pid),
+            totalDemand=total,
+            consolidatedQty=cons,
+            supplierId=sp["supplier_id"],
+            supplierName=sp["name"],
+            moq=m,
+            unitPrice=float(sp["last_price"]),
+            allocations=allocations,
+            explanation=" ".join(explanation_parts),
+        ))
+    return results, unsourced
+
+
+# ────────────────────────────────────────────────────────────────────
+# Pipeline – POST /agent/run
+# Plans the question and runs its steps in-process, streaming each
+# step's result as a Server-Sent Event as soon as it completes
+# ────────────────────────────────────────────────────────────────────
+
+class RunRequest(BaseModel):
+    question: str
+    lang: str = "en"
+    # Step inputs; a step whose inputs are missing is reported as skipped
+    orderId: Optional[str] = None
+    partId: Optional[str] = None
+    supplierId: Optional[str] = None    # current supplier (analyze) / PO supplier (execute)
+    toSupplierId: Optional[str] = None  # simulate target; also the SWITCH_SUPPLIER PO supplier
+    factoryId: str = "F1"
+    qty: Optional[int] = None
+    objective: Optional[str] = None     # rfq/simulate objective (each has its own default)
+    horizonDays: int = 30
+    poId: Optional[str] = None
+    newMode: Optional[str] = None
+    actor: str = "agent-system"
+    execute: bool = False               # run the execute step; otherwise report the action it would take
+    idempotencyKey: Optional[str] = None
+
+
+# Steps that only read run concurrently; execute waits for all of them
+# (it may act on their results) and verify waits for execute.
+RUN_READ_STEPS = {"analyze", "simulate", "rfq-candidates", "single-source-parts", "consolidate-po"}
+
+
+class _SkipStep(Exception):
+    """A plan step that can't (or shouldn't) run with the inputs given."""
+
+    def __init__(self, reason: str, proposed: Optional[dict] = None) -> None:
+        super().__init__(reason)
+        self.proposed = proposed
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _run_action(intent: str, req: RunRequest, results: dict) -> ExecuteRequest:
+    """The ExecuteRequest the execute step issues for ``intent``."""
+    if intent == "EXPEDITE_SHIPMENT":
+        if not req.poId:
+            raise _SkipStep("poId required")
+        return ExecuteRequest(action="EXPEDITE_SHIPMENT", poId=req.poId,
+                              newMode=req.newMode or "Air", actor=req.actor)
+
+    supplier_id = req.toSupplierId if intent == "SWITCH_SUPPLIER" else req.supplierId
+    rfq = results.get("rfq-candidates")
+    if supplier_id is None and isinstance(rfq, RfqResponse):
+        top = next((c for c in rfq.candidates if not c.hardFail), None)
+        supplier_id = top.supplierId if top else None
+    if not (req.partId and supplier_id and req.qty):
+        raise _SkipStep("partId, supplierId and qty required")
+    return ExecuteRequest(action="CREATE_PO", partId=req.partId, supplierId=supplier_id,
+                          qty=req.qty, orderId=req.orderId, actor=req.actor)
+
+
+_stmts.register("audit_event_status", "SELECT status FROM audit_events WHERE event_id = %s")
+
+
+async def _run_verify(executed: Optional[ExecuteResponse]) -> dict:
+    if executed is None or not executed.auditEventId:
+        raise _SkipStep("nothing executed")
+    async with _erp_conn() as conn:
+        async with conn.cursor() as cur:
+            await _stmts.execute(cur, "audit_event_status", (executed.auditEventId,))
+            row = await cur.fetchone()
+        await conn.rollback()
+    # With AUDIT_MODE=async the row lands on the writer's next flush
+    return {
+        "auditEventId": executed.auditEventId,
+        "recorded": row is not None,
+        "status": row[0] if row else None,
+        "pending": row is None and _audit_writer.enabled,
+    }
+
+
+async def _run_step(step: PlanStep, intent: str, req: RunRequest, results: dict):
+    action = step.action
+    if action == "analyze":
+        if not (req.orderId or req.partId or req.supplierId):
+            raise _SkipStep("orderId, partId or supplierId required")
+        return await analyze(AnalyzeRequest(orderId=req.orderId, partId=req.partId,
+                                            supplierId=req.supplierId), read_your_writes=False)
+    if action == "simulate":
+        if not (req.orderId and req.partId and req.toSupplierId):
+            raise _SkipStep("orderId, partId and toSupplierId required")
+        sim = SimulateRequest(orderId=req.orderId, partId=req.partId, toSupplierId=req.toSupplierId)
+        if req.objective:
+            sim.objective = req.objective
+        return await simulate(sim)
+    if action == "rfq-candidates":
+        if not req.partId:
+            raise _SkipStep("partId required")
+        rfq = RfqRequest(partId=req.partId, factoryId=req.factoryId)
+        if req.qty:
+            rfq.qty = req.qty
+        if req.objective:
+            rfq.objective = req.objective
+        return await rfq_candidates(rfq, read_your_writes=False)
+    if action == "single-source-parts":
+        return await single_source_parts(SingleSourceRequest(), read_your_writes=False)
+    if action == "consolidate-po":
+        if not req.partId:
+            raise _SkipStep("partId required")
+        return await consolidate_po(ConsolidateRequest(partId=req.partId, horizonDays=req.horizonDays),
+                                    read_your_writes=False)
+    if action == "execute":
+        action_req = _run_action(intent, req, results)
+        if not req.execute:
+            raise _SkipStep("execute=false", proposed=action_req.model_dump(exclude_none=True))
+        return await execute(action_req, Response(), idempotency_key=req.idempotencyKey)
+    if action == "verify":
+        return await _run_verify(results.get("execute"))
+    raise _SkipStep(f"unknown step action {action}")
+
+
+async def _run_events(req: RunRequest, request: Request) -> AsyncIterator[str]:
+    intent = _intent_matcher.classify(req.question)
+    steps = _plan_steps(intent)
+    yield _sse("plan", PlanResponse(intent=intent, steps=steps).model_dump())
+
+    t0 = time.perf_counter()
+    results: dict[str, object] = {}
+    counts = {"ok": 0, "skipped": 0, "error": 0}
+    pending: dict[asyncio.Task, PlanStep] = {}
+
+    async def timed(step: PlanStep):
+        start = time.perf_counter()
+        try:
+            return await _run_step(step, intent, req, results), None, start
+        except _SkipStep as exc:
+            return exc.proposed, ("skipped", str(exc)), start
+        except HTTPException as exc:
+            return None, ("error", f"{exc.status_code}: {exc.detail}"), start
+        except Exception as exc:
+            return None, ("error", str(exc)), start
+
+    def launch(batch: list[PlanStep]) -> None:
+        for step in batch:
+            pending[asyncio.ensure_future(timed(step))] = step
+
+    # Stages: all read steps at once, then execute, then verify
+    reads = [s for s in steps if s.action in RUN_READ_STEPS]
+    later = [s for s in steps if s.action not in RUN_READ_STEPS]
+    stages = [reads] + [[s] for s in later]
+    try:
+        for stage in stages:
+            launch(stage)
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    step = pending.pop(task)
+                    result, failure, start = task.result()
+                    event = {
+                        "step": step.step,
+                        "role": step.role,
+                        "action": step.action,
+                        "elapsedMs": round((time.perf_counter() - start) * 1000, 1),
+                    }
+                    if failure is None:
+                        results[step.action] = result
+                        event["status"] = "ok"
+                        event["result"] = result.model_dump() if isinstance(result, BaseModel) else result
+                    else:
+                        event["status"], event["reason"] = failure
+                        if result is not None:
+                            event["proposed"] = result  # the action execute=true would take
+                    counts[event["status"]] += 1
+                    yield _sse("step", event)
+                if await request.is_disconnected():
+                    return
+        yield _sse("done", {
+            "intent": intent,
+            **counts,
+            "elapsedMs": round((time.perf_counter() - t0) * 1000, 1),
+        })
     finally:
-        conn.close()
-
-    return ConsolidateResponse(
-        partId=req.partId,
-        totalDemand=total_demand,
-        consolidatedQty=consolidated_qty,
-        supplierId=best_supplier["supplier_id"],
-        supplierName=best_supplier["name"],
-        moq=moq,
-        unitPrice=float(best_supplier["last_price"]),
-        allocations=allocations,
-        explanation=" ".join(explanation_parts),
+        # Client went away (or the generator was closed): stop outstanding steps
+        for task in pending:
+            task.cancel()
+
+
+@app.post("/agent/run")
+async def run(req: RunRequest, request: Request):
+    """Plan ``req.question`` and run the plan, streaming ``text/event-stream``.
+
+    Events: ``plan`` (the PlanResponse), one ``step`` per plan step in
+    completion order (status ok | skipped | error, with its result or
+    reason), then ``done``. Read-only steps run concurrently; the execute
+    step only acts when ``execute`` is true.
+    """
+    return StreamingResponse(
+        _run_events(req, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -2,12 +2,25 @@
 
 from __future__ import annotations
 
+import asyncio
+import math
+import multiprocessing
 import os
+import random
+import threading
+import time
+from array import array
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from neo4j import GraphDatabase
-from pydantic import BaseModel, Field
+from neo4j.exceptions import ClientError
+from pydantic import BaseModel, Field, ValidationError
 
 # ────────────────────────────────────────────────────────────────────
 # App & Neo4j
@@ -18,6 +31,16 @@ app = FastAPI(title="Twin-Sim", version="0.1.0")
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "demo12345")
+SIM_BATCH_MAX = int(os.getenv("SIM_BATCH_MAX", "20000"))    # items per /simulate/batch call
+SIM_BATCH_CHUNK = int(os.getenv("SIM_BATCH_CHUNK", "500"))  # items fetched + evaluated per read transaction
+TWIN_SNAPSHOT = os.getenv("TWIN_SNAPSHOT", "0") == "1"      # serve simulation inputs from an in-memory graph snapshot
+SNAPSHOT_POLL_INTERVAL = float(os.getenv("SNAPSHOT_POLL_INTERVAL", "5"))    # change check period (s)
+SNAPSHOT_FINGERPRINT_INTERVAL = float(os.getenv("SNAPSHOT_FINGERPRINT_INTERVAL", "300"))  # full fingerprint even without commits (s)
+SNAPSHOT_MAX_STALENESS = float(os.getenv("SNAPSHOT_MAX_STALENESS", "30"))   # older than this -> read Neo4j (s)
+SNAPSHOT_VERIFY_SAMPLE = float(os.getenv("SNAPSHOT_VERIFY_SAMPLE", "0"))     # share of snapshot bundles re-read from Neo4j and compared
+MC_TRIALS = int(os.getenv("MC_TRIALS", "100000"))          # default trials for mode=montecarlo
+MC_MAX_TRIALS = int(os.getenv("MC_MAX_TRIALS", "1000000"))
+SIM_WORKERS = int(os.getenv("SIM_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))  # Monte Carlo processes (0 = in-process)
 
 _driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
@@ -36,6 +59,18 @@ def healthz() -> dict:
 # Pydantic models
 # ────────────────────────────────────────────────────────────────────
 
+class ScenarioDistribution(BaseModel):
+    trials: int
+    eta_p50_days: float
+    eta_p90_days: float
+    eta_p99_days: float
+    line_stop_probability: float
+    cost_p50: float  # landed unit cost
+    cost_p90: float
+    cost_p99: float
+    cost_mean: float
+
+
 class Scenario(BaseModel):
     label: str
     description: str
@@ -44,6 +79,7 @@ class Scenario(BaseModel):
     line_stop_risk: float
     quality_risk: float
     assumptions: list[str]
+    distribution: Optional[ScenarioDistribution] = None  # mode=montecarlo only
 
 
 class BlastRadiusItem(BaseModel):
@@ -74,7 +110,13 @@ class SimulationResult(BaseModel):
 
 # ── Request bodies ──
 
-class SwitchSupplierReq(BaseModel):
+class SimulationModeMixin(BaseModel):
+    mode: str = "deterministic"  # deterministic | montecarlo
+    trials: Optional[int] = None  # montecarlo: sample count (default MC_TRIALS)
+    seed: Optional[int] = None    # montecarlo: RNG seed for reproducible runs
+
+
+class SwitchSupplierReq(SimulationModeMixin):
     orderId: str
     partId: str
     fromSupplierId: Optional[str] = None
@@ -83,7 +125,7 @@ class SwitchSupplierReq(BaseModel):
     constraints: dict = {}
 
 
-class ChangeLaneReq(BaseModel):
+class ChangeLaneReq(SimulationModeMixin):
     orderId: str
     partId: str
     supplierId: str
@@ -92,7 +134,7 @@ class ChangeLaneReq(BaseModel):
     constraints: dict = {}
 
 
-class TransferFactoryReq(BaseModel):
+class TransferFactoryReq(SimulationModeMixin):
     orderId: str
     fromFactoryId: Optional[str] = None
     toFactoryId: str
@@ -100,165 +142,300 @@ class TransferFactoryReq(BaseModel):
     constraints: dict = {}
 
 
+class SimulateBatchItem(BaseModel):
+    kind: str      # switch-supplier | change-lane | transfer-factory
+    request: dict  # the body that endpoint takes
+
+
+class SimulateBatchReq(BaseModel):
+    items: list[SimulateBatchItem]
+
+
+class SimulateBatchResult(BaseModel):
+    index: int  # position in SimulateBatchReq.items
+    kind: str
+    result: Optional[SimulationResult] = None
+    status: int = 200
+    error: Optional[str] = None
+
+
 # ────────────────────────────────────────────────────────────────────
 # Neo4j helpers
 # ────────────────────────────────────────────────────────────────────
 
 def _val(v):
-    """Unwrap neo4j int/float wrappers."""
+    """Unwrap neo4j int/float wrappers, keeping floats as floats."""
     if v is None:
         return None
-    if hasattr(v, "__int__"):
+    if isinstance(v, int):
         return int(v)
     if hasattr(v, "__float__"):
         return float(v)
+    if hasattr(v, "__int__"):
+        return int(v)
     return v
 
 
-def _get_supplier_part(tx, supplier_id: str, part_id: str) -> dict | None:
-    r = tx.run(
-        """
-        MATCH (s:Supplier {id: $sid})-[r:SUPPLIES]->(p:Part {id: $pid})
-        RETURN s.id AS supplierId, s.name AS supplierName,
-               r.leadTimeDays AS leadTimeDays, r.moq AS moq,
-               r.capacity AS capacity, r.lastPrice AS lastPrice,
-               r.qualificationLevel AS qualificationLevel
-        """,
-        sid=supplier_id, pid=part_id,
-    )
-    rec = r.single()
-    return {k: _val(rec[k]) for k in rec.keys()} if rec else None
-
-
-def _get_lanes(tx, supplier_id: str, factory_id: str) -> list[dict]:
-    r = tx.run(
-        """
-        MATCH (tl:TransportLane)
-        WHERE tl.fromNode = $sid AND tl.toNode = $fid
-        RETURN tl.mode AS mode, tl.timeDays AS timeDays,
-               tl.cost AS cost, tl.reliability AS reliability
-        ORDER BY tl.timeDays
-        """,
-        sid=supplier_id, fid=factory_id,
-    )
-    return [{k: _val(rec[k]) for k in rec.keys()} for rec in r]
+def _vals(m: dict | None) -> dict | None:
+    return {k: _val(v) for k, v in m.items()} if m is not None else None
+
+
+# ── Simulation input bundles ──
+#
+# Each simulation gathers all of its inputs with one composed Cypher query
+# in a single read transaction. The query is built from the subqueries
+# below; each takes outer variable names, aggregates so it always yields
+# exactly one row, and returns one column.
+
+def _cy_supplier_part(sid: str, pid: str, alias: str) -> str:
+    return f"""
+    CALL {{
+      WITH {sid}, {pid}
+      OPTIONAL MATCH (s:Supplier {{id: {sid}}})-[r:SUPPLIES]->(:Part {{id: {pid}}})
+      RETURN head(collect(r {{supplierId: s.id, supplierName: s.name, .leadTimeDays, .moq,
+                              .capacity, .lastPrice, .qualificationLevel}})) AS {alias}
+    }}"""
+
+
+def _cy_lanes(sid: str, fid: str, alias: str) -> str:
+    return f"""
+    CALL {{
+      WITH {sid}, {fid}
+      OPTIONAL MATCH (tl:TransportLane)
+      WHERE tl.fromNode = {sid} AND tl.toNode = {fid}
+      WITH tl ORDER BY tl.timeDays
+      RETURN collect(tl {{.mode, .timeDays, .cost, .reliability}}) AS {alias}
+    }}"""
+
+
+def _cy_inventory(pid: str, fid: str, alias: str) -> str:
+    return f"""
+    CALL {{
+      WITH {pid}, {fid}
+      OPTIONAL MATCH (inv:InventoryLot)-[:STORES]->(:Part {{id: {pid}}})
+      WHERE inv.location STARTS WITH {fid}
+      RETURN {{onHand: sum(inv.onHand), reserved: sum(inv.reserved),
+               safetyStock: max(inv.safetyStock)}} AS {alias}
+    }}"""
+
+
+def _cy_risks(sid: str, alias: str) -> str:
+    return f"""
+    CALL {{
+      WITH {sid}
+      OPTIONAL MATCH (re:RiskEvent)-[:AFFECTS]->(:Supplier {{id: {sid}}})
+      RETURN collect(re {{.id, .type, .severity}}) AS {alias}
+    }}"""
+
+
+def _cy_quality_hold(sid: str, pid: str, alias: str) -> str:
+    return f"""
+    CALL {{
+      WITH {sid}, {pid}
+      OPTIONAL MATCH (qh:QualityHold)
+      WHERE qh.supplierId = {sid} AND qh.partId = {pid}
+      RETURN head(collect(qh {{.holdDays, .reason}})) AS {alias}
+    }}"""
+
+
+_CY_ORDER_FACTORY = """
+    CALL {
+      OPTIONAL MATCH (:Order {id: $oid})-[:PRODUCES]->(:Product)<-[:PRODUCES]-(f:Factory)
+      RETURN head(collect(f.id)) AS orderFactoryId
+    }"""
+
+# Blast radius queries (one row of collected lists); $id is the order,
+# supplier or part id.
+def _cy_order_blast(oid: str) -> str:
+    return f"""
+    MATCH (o:Order {{id: {oid}}})-[:REQUIRES]->(p:Part)
+    OPTIONAL MATCH (p)<-[:SUPPLIES]-(s:Supplier)
+    OPTIONAL MATCH (p)<-[:REQUIRES]-(other:Order) WHERE other.id <> {oid}
+    OPTIONAL MATCH (o)-[:PRODUCES]->(pr:Product)<-[:PRODUCES]-(f:Factory)
+    RETURN collect(DISTINCT other {{.id, .status}}) AS otherOrders,
+           collect(DISTINCT p {{.id, .name}})        AS parts,
+           collect(DISTINCT f {{.id, .name}})        AS factories,
+           collect(DISTINCT [o.id, 'REQUIRES', p.id]) +
+           collect(DISTINCT [s.id, 'SUPPLIES', p.id]) AS rawPaths
+"""
+
+
+BLAST_ORDER_CYPHER = _cy_order_blast("$id")
+
+BLAST_SUPPLIER_CYPHER = """
+    MATCH (s:Supplier {id: $id})-[:SUPPLIES]->(p:Part)<-[:REQUIRES]-(o:Order)
+    OPTIONAL MATCH (o)-[:PRODUCES]->(pr:Product)<-[:PRODUCES]-(f:Factory)
+    RETURN collect(DISTINCT o {.id, .status}) AS otherOrders,
+           collect(DISTINCT p {.id, .name})   AS parts,
+           collect(DISTINCT f {.id, .name})   AS factories,
+           collect(DISTINCT [s.id, 'SUPPLIES', p.id]) +
+           collect(DISTINCT [o.id, 'REQUIRES', p.id]) AS rawPaths
+"""
+
+BLAST_PART_CYPHER = """
+    MATCH (p:Part {id: $id})<-[:REQUIRES]-(o:Order)
+    OPTIONAL MATCH (p)<-[:SUPPLIES]-(s:Supplier)
+    OPTIONAL MATCH (o)-[:PRODUCES]->(pr:Product)<-[:PRODUCES]-(f:Factory)
+    RETURN collect(DISTINCT o {.id, .status}) AS otherOrders,
+           collect(DISTINCT p {.id, .name})   AS parts,
+           collect(DISTINCT f {.id, .name})   AS factories,
+           collect(DISTINCT [o.id, 'REQUIRES', p.id]) +
+           collect(DISTINCT [s.id, 'SUPPLIES', p.id]) AS rawPaths
+"""
+
+# Order blast radius as a trailing subquery ($id = $oid)
+_CY_ORDER_BLAST = "\n    CALL {" + BLAST_ORDER_CYPHER + "    }"
+
+SWITCH_SUPPLIER_CYPHER = (
+    "WITH $pid AS partId, $toSid AS toSid"
+    + _CY_ORDER_FACTORY
+    + """
+    CALL {
+      WITH partId
+      OPTIONAL MATCH (:Order {id: $oid})-[:REQUIRES]->(:Part {id: partId})<-[r:SUPPLIES]-(s:Supplier)
+      WITH s, r ORDER BY r.priority
+      RETURN head(collect(s.id)) AS currentSupplierId
+    }
+    WITH partId, toSid, coalesce(orderFactoryId, 'F1') AS fid,
+         coalesce($fromSid, currentSupplierId) AS fromSid"""
+    + _cy_supplier_part("fromSid", "partId", "fromPart")
+    + _cy_supplier_part("toSid", "partId", "toPart")
+    + _cy_lanes("fromSid", "fid", "fromLanes")
+    + _cy_lanes("toSid", "fid", "toLanes")
+    + _cy_inventory("partId", "fid", "inventory")
+    + _cy_risks("fromSid", "fromRisks")
+    + _cy_risks("toSid", "toRisks")
+    + _cy_quality_hold("toSid", "partId", "qcHold")
+    + _CY_ORDER_BLAST
+    + "\n    RETURN *"
+)
+
+CHANGE_LANE_CYPHER = (
+    "WITH $pid AS partId, $sid AS sid"
+    + _CY_ORDER_FACTORY
+    + "\n    WITH partId, sid, coalesce(orderFactoryId, 'F1') AS fid"
+    + _cy_supplier_part("sid", "partId", "supplierPart")
+    + _cy_lanes("sid", "fid", "lanes")
+    + _cy_inventory("partId", "fid", "inventory")
+    + _cy_risks("sid", "risks")
+    + _CY_ORDER_BLAST
+    + "\n    RETURN *"
+)
+
+TRANSFER_FACTORY_CYPHER = (
+    "WITH $toFid AS toFid"
+    + _CY_ORDER_FACTORY
+    + """
+    CALL {
+      OPTIONAL MATCH (:Order {id: $oid})-[:REQUIRES]->(p:Part)<-[r:SUPPLIES]-(s:Supplier)
+      WITH p, s, r ORDER BY r.priority
+      // map projection on r: the null row of an unmatched OPTIONAL MATCH is dropped
+      RETURN head(collect(r {pid: p.id, sid: s.id, lead: r.leadTimeDays,
+                             price: r.lastPrice, qual: r.qualificationLevel})) AS source
+    }
+    WITH toFid, source, coalesce($fromFid, orderFactoryId, 'F1') AS fromFid,
+         coalesce(source.pid, 'P1A') AS pid, coalesce(source.sid, 'S1') AS sid"""
+    + _cy_lanes("sid", "fromFid", "fromLanes")
+    + _cy_lanes("sid", "toFid", "toLanes")
+    + _cy_inventory("pid", "fromFid", "fromInventory")
+    + _cy_inventory("pid", "toFid", "toInventory")
+    + _cy_risks("sid", "risks")
+    + _CY_ORDER_BLAST
+    + "\n    RETURN *"
+)
+
+
+class SwitchSupplierInputs(BaseModel):
+    factoryId: str
+    fromSupplierId: Optional[str]
+    fromPart: Optional[dict]
+    toPart: Optional[dict]
+    fromLanes: list[dict]
+    toLanes: list[dict]
+    inventory: Optional[dict]
+    fromRisks: list[dict]
+    toRisks: list[dict]
+    qcHold: Optional[dict]
+    blastRadius: BlastRadius
 
 
-def _get_inventory(tx, part_id: str, factory_prefix: str) -> dict | None:
-    r = tx.run(
-        """
-        MATCH (inv:InventoryLot)-[:STORES]->(p:Part {id: $pid})
-        WHERE inv.location STARTS WITH $fpfx
-        RETURN sum(inv.onHand) AS onHand,
-               sum(inv.reserved) AS reserved,
-               max(inv.safetyStock) AS safetyStock
-        """,
-        pid=part_id, fpfx=factory_prefix,
-    )
-    rec = r.single()
-    if rec and rec["onHand"] is not None:
-        return {k: _val(rec[k]) for k in rec.keys()}
-    return None
+class ChangeLaneInputs(BaseModel):
+    factoryId: str
+    supplierPart: Optional[dict]
+    lanes: list[dict]
+    inventory: Optional[dict]
+    risks: list[dict]
+    blastRadius: BlastRadius
 
 
-def _get_risk_events(tx, supplier_id: str) -> list[dict]:
-    r = tx.run(
-        """
-        MATCH (re:RiskEvent)-[:AFFECTS]->(s:Supplier {id: $sid})
-        RETURN re.id AS id, re.type AS type, re.severity AS severity
-        """,
-        sid=supplier_id,
-    )
-    return [{k: _val(rec[k]) for k in rec.keys()} for rec in r]
+class TransferFactoryInputs(BaseModel):
+    fromFactoryId: str
+    partId: str
+    supplierId: str
+    source: Optional[dict]  # {pid, sid, lead, price, qual} of the order's preferred source
+    fromLanes: list[dict]
+    toLanes: list[dict]
+    fromInventory: Optional[dict]
+    toInventory: Optional[dict]
+    risks: list[dict]
+    blastRadius: BlastRadius
 
 
-def _get_quality_hold(tx, supplier_id: str, part_id: str) -> dict | None:
-    r = tx.run(
-        """
-        MATCH (qh:QualityHold)
-        WHERE qh.supplierId = $sid AND qh.partId = $pid
-        RETURN qh.holdDays AS holdDays, qh.reason AS reason
-        """,
-        sid=supplier_id, pid=part_id,
+def _inventory(m: dict | None) -> dict | None:
+    """Inventory totals, or None when no lot matched (as sum() gives null)."""
+    return _vals(m) if m and m.get("onHand") is not None else None
+
+
+def _load_switch_supplier(tx, req: SwitchSupplierReq) -> SwitchSupplierInputs:
+    rec = tx.run(SWITCH_SUPPLIER_CYPHER, oid=req.orderId, id=req.orderId, pid=req.partId,
+                 fromSid=req.fromSupplierId or None, toSid=req.toSupplierId).single()
+    return SwitchSupplierInputs(
+        factoryId=rec["fid"],
+        fromSupplierId=rec["fromSid"],
+        fromPart=_vals(rec["fromPart"]),
+        toPart=_vals(rec["toPart"]),
+        fromLanes=[_vals(ln) for ln in rec["fromLanes"]],
+        toLanes=[_vals(ln) for ln in rec["toLanes"]],
+        inventory=_inventory(rec["inventory"]),
+        fromRisks=[_vals(rv) for rv in rec["fromRisks"]],
+        toRisks=[_vals(rv) for rv in rec["toRisks"]],
+        qcHold=_vals(rec["qcHold"]),
+        blastRadius=_blast_from_record(rec),
     )
-    rec = r.single()
-    return {k: _val(rec[k]) for k in rec.keys()} if rec else None
 
 
-def _get_order_factory(tx, order_id: str) -> dict | None:
-    r = tx.run(
-        """
-        MATCH (o:Order {id: $oid})-[:PRODUCES]->(pr:Product)<-[:PRODUCES]-(f:Factory)
-        RETURN f.id AS factoryId, f.name AS factoryName
-        LIMIT 1
-        """,
-        oid=order_id,
+def _load_change_lane(tx, req: ChangeLaneReq) -> ChangeLaneInputs:
+    rec = tx.run(CHANGE_LANE_CYPHER, oid=req.orderId, id=req.orderId, pid=req.partId,
+                 sid=req.supplierId).single()
+    return ChangeLaneInputs(
+        factoryId=rec["fid"],
+        supplierPart=_vals(rec["supplierPart"]),
+        lanes=[_vals(ln) for ln in rec["lanes"]],
+        inventory=_inventory(rec["inventory"]),
+        risks=[_vals(rv) for rv in rec["risks"]],
+        blastRadius=_blast_from_record(rec),
     )
-    rec = r.single()
-    return {k: _val(rec[k]) for k in rec.keys()} if rec else None
 
 
-def _get_current_supplier(tx, order_id: str, part_id: str) -> str | None:
-    r = tx.run(
-        """
-        MATCH (o:Order {id: $oid})-[:REQUIRES]->(p:Part {id: $pid})<-[r:SUPPLIES]-(s:Supplier)
-        RETURN s.id AS sid ORDER BY r.priority LIMIT 1
-        """,
-        oid=order_id, pid=part_id,
+def _load_transfer_factory(tx, req: TransferFactoryReq) -> TransferFactoryInputs:
+    rec = tx.run(TRANSFER_FACTORY_CYPHER, oid=req.orderId, id=req.orderId,
+                 fromFid=req.fromFactoryId or None, toFid=req.toFactoryId).single()
+    return TransferFactoryInputs(
+        fromFactoryId=rec["fromFid"],
+        partId=rec["pid"],
+        supplierId=rec["sid"],
+        source=_vals(rec["source"]),
+        fromLanes=[_vals(ln) for ln in rec["fromLanes"]],
+        toLanes=[_vals(ln) for ln in rec["toLanes"]],
+        fromInventory=_inventory(rec["fromInventory"]),
+        toInventory=_inventory(rec["toInventory"]),
+        risks=[_vals(rv) for rv in rec["risks"]],
+        blastRadius=_blast_from_record(rec),
     )
-    rec = r.single()
-    return str(rec["sid"]) if rec else None
 
 
-def _blast_radius(tx, order_id: str | None, supplier_id: str | None, part_id: str | None) -> BlastRadius:
+def _blast_from_record(rec) -> BlastRadius:
     orders, parts, factories, paths = [], [], [], []
-
-    if order_id:
-        r = tx.run(
-            """
-            MATCH (o:Order {id: $id})-[:REQUIRES]->(p:Part)
-            OPTIONAL MATCH (p)<-[:SUPPLIES]-(s:Supplier)
-            OPTIONAL MATCH (p)<-[:REQUIRES]-(other:Order) WHERE other.id <> $id
-            OPTIONAL MATCH (o)-[:PRODUCES]->(pr:Product)<-[:PRODUCES]-(f:Factory)
-            RETURN collect(DISTINCT other {.id, .status}) AS otherOrders,
-                   collect(DISTINCT p {.id, .name})        AS parts,
-                   collect(DISTINCT f {.id, .name})        AS factories,
-                   collect(DISTINCT [o.id, 'REQUIRES', p.id]) +
-                   collect(DISTINCT [s.id, 'SUPPLIES', p.id]) AS rawPaths
-            """,
-            id=order_id,
-        )
-    elif supplier_id:
-        r = tx.run(
-            """
-            MATCH (s:Supplier {id: $id})-[:SUPPLIES]->(p:Part)<-[:REQUIRES]-(o:Order)
-            OPTIONAL MATCH (o)-[:PRODUCES]->(pr:Product)<-[:PRODUCES]-(f:Factory)
-            RETURN collect(DISTINCT o {.id, .status}) AS otherOrders,
-                   collect(DISTINCT p {.id, .name})   AS parts,
-                   collect(DISTINCT f {.id, .name})   AS factories,
-                   collect(DISTINCT [s.id, 'SUPPLIES', p.id]) +
-                   collect(DISTINCT [o.id, 'REQUIRES', p.id]) AS rawPaths
-            """,
-            id=supplier_id,
-        )
-    elif part_id:
-        r = tx.run(
-            """
-            MATCH (p:Part {id: $id})<-[:REQUIRES]-(o:Order)
-            OPTIONAL MATCH (p)<-[:SUPPLIES]-(s:Supplier)
-            OPTIONAL MATCH (o)-[:PRODUCES]->(pr:Product)<-[:PRODUCES]-(f:Factory)
-            RETURN collect(DISTINCT o {.id, .status}) AS otherOrders,
-                   collect(DISTINCT p {.id, .name})   AS parts,
-                   collect(DISTINCT f {.id, .name})   AS factories,
-                   collect(DISTINCT [o.id, 'REQUIRES', p.id]) +
-                   collect(DISTINCT [s.id, 'SUPPLIES', p.id]) AS rawPaths
-            """,
-            id=part_id,
-        )
-    else:
-        return BlastRadius(impactedOrders=[], impactedParts=[], impactedFactories=[], paths=[])
-
-    rec = r.single()
     if rec:
         for o in rec["otherOrders"]:
             if o and o.get("id"):
@@ -272,10 +449,921 @@ def _blast_radius(tx, order_id: str | None, supplier_id: str | None, part_id: st
         for rp in rec["rawPaths"]:
             if rp and len(rp) == 3 and rp[0] and rp[2]:
                 paths.append(BlastRadiusPath(from_node=str(rp[0]), relation=str(rp[1]), to_node=str(rp[2])))
-
     return BlastRadius(impactedOrders=orders, impactedParts=parts, impactedFactories=factories, paths=paths)
 
 
+def _blast_radius(tx, order_id: str | None, supplier_id: str | None, part_id: str | None) -> BlastRadius:
+    if order_id:
+        r = tx.run(BLAST_ORDER_CYPHER, id=order_id)
+    elif supplier_id:
+        r = tx.run(BLAST_SUPPLIER_CYPHER, id=supplier_id)
+    elif part_id:
+        r = tx.run(BLAST_PART_CYPHER, id=part_id)
+    else:
+        return BlastRadius(impactedOrders=[], impactedParts=[], impactedFactories=[], paths=[])
+    return _blast_from_record(r.single())
+
+
+# ── Batch input loading ──
+#
+# /simulate/batch loads the inputs of many simulations at once: one pass
+# over the distinct orders resolves factories, current suppliers and
+# blast radii, then one UNWIND query per input kind fetches every
+# distinct (supplier, part), (supplier, factory), (part, factory) and
+# supplier key the batch needs.
+
+BATCH_ORDERS_CYPHER = """
+    UNWIND $oids AS oid
+    CALL {
+      WITH oid
+      OPTIONAL MATCH (:Order {id: oid})-[:PRODUCES]->(:Product)<-[:PRODUCES]-(f:Factory)
+      RETURN head(collect(f.id)) AS factoryId
+    }
+    CALL {
+      WITH oid
+      OPTIONAL MATCH (:Order {id: oid})-[:REQUIRES]->(p:Part)<-[r:SUPPLIES]-(s:Supplier)
+      WITH p, s, r ORDER BY r.priority
+      RETURN head(collect(r {pid: p.id, sid: s.id, lead: r.leadTimeDays,
+                             price: r.lastPrice, qual: r.qualificationLevel})) AS source
+    }
+    CALL {
+      WITH oid""" + _cy_order_blast("oid") + """    }
+    RETURN oid, factoryId, source, otherOrders, parts, factories, rawPaths
+"""
+
+BATCH_CURRENT_SUPPLIERS_CYPHER = """
+    UNWIND $pairs AS pair
+    CALL {
+      WITH pair
+      OPTIONAL MATCH (:Order {id: pair[0]})-[:REQUIRES]->(:Part {id: pair[1]})<-[r:SUPPLIES]-(s:Supplier)
+      WITH s, r ORDER BY r.priority
+      RETURN head(collect(s.id)) AS sid
+    }
+    RETURN pair[0] AS oid, pair[1] AS pid, sid
+"""
+
+BATCH_SUPPLIER_PARTS_CYPHER = """
+    UNWIND $pairs AS pair
+    MATCH (s:Supplier {id: pair[0]})-[r:SUPPLIES]->(:Part {id: pair[1]})
+    RETURN pair[0] AS sid, pair[1] AS pid,
+           r {supplierId: s.id, supplierName: s.name, .leadTimeDays, .moq,
+              .capacity, .lastPrice, .qualificationLevel} AS supplierPart
+"""
+
+BATCH_LANES_CYPHER = """
+    UNWIND $pairs AS pair
+    MATCH (tl:TransportLane)
+    WHERE tl.fromNode = pair[0] AND tl.toNode = pair[1]
+    RETURN pair[0] AS sid, pair[1] AS fid, tl {.mode, .timeDays, .cost, .reliability} AS lane
+    ORDER BY sid, fid, tl.timeDays
+"""
+
+BATCH_INVENTORY_CYPHER = """
+    UNWIND $pairs AS pair
+    OPTIONAL MATCH (inv:InventoryLot)-[:STORES]->(:Part {id: pair[0]})
+    WHERE inv.location STARTS WITH pair[1]
+    RETURN pair[0] AS pid, pair[1] AS fid,
+           {onHand: sum(inv.onHand), reserved: sum(inv.reserved),
+            safetyStock: max(inv.safetyStock)} AS inventory
+"""
+
+BATCH_RISKS_CYPHER = """
+    UNWIND $sids AS sid
+    MATCH (re:RiskEvent)-[:AFFECTS]->(:Supplier {id: sid})
+    RETURN sid, re {.id, .type, .severity} AS risk
+"""
+
+BATCH_QUALITY_HOLDS_CYPHER = """
+    UNWIND $pairs AS pair
+    MATCH (qh:QualityHold)
+    WHERE qh.supplierId = pair[0] AND qh.partId = pair[1]
+    RETURN pair[0] AS sid, pair[1] AS pid, qh {.holdDays, .reason} AS hold
+"""
+
+
+def _load_batch(tx, reqs: list[BaseModel]) -> list[BaseModel]:
+    """Input bundles for a mix of switch-supplier / change-lane / transfer-factory requests."""
+    orders = {rec["oid"]: rec for rec in tx.run(
+        BATCH_ORDERS_CYPHER, oids=list(dict.fromkeys(r.orderId for r in reqs)))}
+    unresolved = list(dict.fromkeys(
+        (r.orderId, r.partId) for r in reqs
+        if isinstance(r, SwitchSupplierReq) and not r.fromSupplierId))
+    current = {}
+    if unresolved:
+        current = {(rec["oid"], rec["pid"]): rec["sid"] for rec in tx.run(
+            BATCH_CURRENT_SUPPLIERS_CYPHER, pairs=[list(k) for k in unresolved])}
+
+    # Resolve each request's keys, collecting the distinct lookups
+    sp_keys: dict[tuple, None] = {}
+    lane_keys: dict[tuple, None] = {}
+    inv_keys: dict[tuple, None] = {}
+    risk_keys: dict[str, None] = {}
+    hold_keys: dict[tuple, None] = {}
+    resolved = []
+    for r in reqs:
+        order = orders.get(r.orderId)
+        fid = (order["factoryId"] if order else None) or "F1"
+        if isinstance(r, SwitchSupplierReq):
+            from_sid = r.fromSupplierId or current.get((r.orderId, r.partId))
+            keys = {"fid": fid, "fromSid": from_sid}
+            for sid in filter(None, (from_sid, r.toSupplierId)):
+                sp_keys[(sid, r.partId)] = None
+                lane_keys[(sid, fid)] = None
+                risk_keys[sid] = None
+            hold_keys[(r.toSupplierId, r.partId)] = None
+            inv_keys[(r.partId, fid)] = None
+        elif isinstance(r, ChangeLaneReq):
+            keys = {"fid": fid}
+            sp_keys[(r.supplierId, r.partId)] = None
+            lane_keys[(r.supplierId, fid)] = None
+            inv_keys[(r.partId, fid)] = None
+            risk_keys[r.supplierId] = None
+        else:
+            source = _vals(order["source"]) if order else None
+            keys = {
+                "fromFid": r.fromFactoryId or fid,
+                "source": source,
+                "pid": (source or {}).get("pid") or "P1A",
+                "sid": (source or {}).get("sid") or "S1",
+            }
+            for f in (keys["fromFid"], r.toFactoryId):
+                lane_keys[(keys["sid"], f)] = None
+                inv_keys[(keys["pid"], f)] = None
+            risk_keys[keys["sid"]] = None
+        resolved.append(keys)
+
+    supplier_parts: dict[tuple, dict] = {}
+    for rec in tx.run(BATCH_SUPPLIER_PARTS_CYPHER, pairs=[list(k) for k in sp_keys]):
+        supplier_parts.setdefault((rec["sid"], rec["pid"]), _vals(rec["supplierPart"]))
+    lanes: dict[tuple, list[dict]] = {}
+    for rec in tx.run(BATCH_LANES_CYPHER, pairs=[list(k) for k in lane_keys]):
+        lanes.setdefault((rec["sid"], rec["fid"]), []).append(_vals(rec["lane"]))
+    inventory = {(rec["pid"], rec["fid"]): _inventory(rec["inventory"])
+                 for rec in tx.run(BATCH_INVENTORY_CYPHER, pairs=[list(k) for k in inv_keys])}
+    risks: dict[str, list[dict]] = {}
+    for rec in tx.run(BATCH_RISKS_CYPHER, sids=list(risk_keys)):
+        risks.setdefault(rec["sid"], []).append(_vals(rec["risk"]))
+    holds: dict[tuple, dict] = {}
+    for rec in tx.run(BATCH_QUALITY_HOLDS_CYPHER, pairs=[list(k) for k in hold_keys]):
+        holds.setdefault((rec["sid"], rec["pid"]), _vals(rec["hold"]))
+
+    bundles: list[BaseModel] = []
+    for r, keys in zip(reqs, resolved):
+        blast = _blast_from_record(orders.get(r.orderId))
+        if isinstance(r, SwitchSupplierReq):
+            fid, from_sid = keys["fid"], keys["fromSid"]
+            bundles.append(SwitchSupplierInputs(
+                factoryId=fid,
+                fromSupplierId=from_sid,
+                fromPart=supplier_parts.get((from_sid, r.partId)),
+                toPart=supplier_parts.get((r.toSupplierId, r.partId)),
+                fromLanes=lanes.get((from_sid, fid), []),
+                toLanes=lanes.get((r.toSupplierId, fid), []),
+                inventory=inventory.get((r.partId, fid)),
+                fromRisks=risks.get(from_sid, []),
+                toRisks=risks.get(r.toSupplierId, []),
+                qcHold=holds.get((r.toSupplierId, r.partId)),
+                blastRadius=blast,
+            ))
+        elif isinstance(r, ChangeLaneReq):
+            fid = keys["fid"]
+            bundles.append(ChangeLaneInputs(
+                factoryId=fid,
+                supplierPart=supplier_parts.get((r.supplierId, r.partId)),
+                lanes=lanes.get((r.supplierId, fid), []),
+                inventory=inventory.get((r.partId, fid)),
+                risks=risks.get(r.supplierId, []),
+                blastRadius=blast,
+            ))
+        else:
+            sid, pid, from_fid = keys["sid"], keys["pid"], keys["fromFid"]
+            bundles.append(TransferFactoryInputs(
+                fromFactoryId=from_fid,
+                partId=pid,
+                supplierId=sid,
+                source=keys["source"],
+                fromLanes=lanes.get((sid, from_fid), []),
+                toLanes=lanes.get((sid, r.toFactoryId), []),
+                fromInventory=inventory.get((pid, from_fid)),
+                toInventory=inventory.get((pid, r.toFactoryId)),
+                risks=risks.get(sid, []),
+                blastRadius=blast,
+            ))
+    return bundles
+
+
+# ────────────────────────────────────────────────────────────────────
+# In-memory graph snapshot (TWIN_SNAPSHOT=1)
+# ────────────────────────────────────────────────────────────────────
+#
+# The slowly-changing subgraph the simulations read is held in process:
+# node ids are interned to ints, each relationship kind is a CSR
+# adjacency (row pointers into flat typed arrays), and every section is an
+# immutable object swapped in whole, so readers never see a half-built
+# section. A poller watches the database's last committed transaction id;
+# when it moves (or SNAPSHOT_FINGERPRINT_INTERVAL has passed) it compares
+# per-section fingerprints and rebuilds only the sections that changed.
+# Requests fall back to Neo4j whenever the last successful check is older
+# than SNAPSHOT_MAX_STALENESS.
+
+SNAPSHOT_SECTIONS = ("supplies", "lanes", "inventory", "risks", "holds", "orders")
+
+SNAPSHOT_CYPHER = {
+    "supplies": """
+        MATCH (s:Supplier)-[r:SUPPLIES]->(p:Part)
+        RETURN s.id AS sid, s.name AS supplierName, p.id AS pid,
+               r.leadTimeDays AS leadTimeDays, r.moq AS moq, r.capacity AS capacity,
+               r.lastPrice AS lastPrice, r.qualificationLevel AS qualificationLevel,
+               r.priority AS priority
+    """,
+    "lanes": """
+        MATCH (tl:TransportLane)
+        RETURN tl.fromNode AS sid, tl.toNode AS fid, tl.mode AS mode,
+               tl.timeDays AS timeDays, tl.cost AS cost, tl.reliability AS reliability
+    """,
+    "inventory": """
+        MATCH (inv:InventoryLot)-[:STORES]->(p:Part)
+        RETURN p.id AS pid, inv.location AS location, inv.onHand AS onHand,
+               inv.reserved AS reserved, inv.safetyStock AS safetyStock
+    """,
+    "risks": """
+        MATCH (re:RiskEvent)-[:AFFECTS]->(s:Supplier)
+        RETURN s.id AS sid, re.id AS id, re.type AS type, re.severity AS severity
+    """,
+    "holds": """
+        MATCH (qh:QualityHold)
+        RETURN qh.supplierId AS sid, qh.partId AS pid, qh.holdDays AS holdDays, qh.reason AS reason
+    """,
+    "orders": """
+        MATCH (o:Order)
+        OPTIONAL MATCH (o)-[:REQUIRES]->(p:Part)
+        OPTIONAL MATCH (o)-[:PRODUCES]->(:Product)<-[:PRODUCES]-(f:Factory)
+        RETURN o.id AS oid, o.status AS status,
+               collect(DISTINCT p {.id, .name}) AS parts,
+               collect(DISTINCT f {.id, .name}) AS factories
+    """,
+}
+
+# Per-section change detection: row count plus an order-independent hash
+# over every column the snapshot loads (per-row APOC fingerprints, sorted,
+# then fingerprinted together), so a retargeted edge or a renamed node
+# reloads its section just like a changed number does.
+
+def _cy_digest(match: str, row: str, alias: str) -> str:
+    return f"""
+    CALL {{
+      {match}
+      WITH apoc.hashing.fingerprint({row}) AS h ORDER BY h
+      RETURN [count(h), apoc.hashing.fingerprint(collect(h))] AS {alias}
+    }}"""
+
+
+# Cheap change marker, polled every SNAPSHOT_POLL_INTERVAL: the id of the
+# last transaction committed to the home database. Unchanged means nothing
+# was written, so the fingerprints below (a full scan) can be skipped.
+SNAPSHOT_MARKER_CYPHER = "SHOW HOME DATABASE YIELD lastCommittedTxn"
+
+SNAPSHOT_FINGERPRINT_CYPHER = (
+    _cy_digest("MATCH (s:Supplier)-[r:SUPPLIES]->(p:Part)",
+               "[s.id, s.name, p.id, r.leadTimeDays, r.moq, r.capacity, r.lastPrice,"
+               " r.qualificationLevel, r.priority]", "supplies")
+    + _cy_digest("MATCH (tl:TransportLane)",
+                 "[tl.fromNode, tl.toNode, tl.mode, tl.timeDays, tl.cost, tl.reliability]", "lanes")
+    + _cy_digest("MATCH (inv:InventoryLot)-[:STORES]->(p:Part)",
+                 "[p.id, inv.location, inv.onHand, inv.reserved, inv.safetyStock]", "inventory")
+    + _cy_digest("MATCH (re:RiskEvent)-[:AFFECTS]->(s:Supplier)",
+                 "[s.id, re.id, re.type, re.severity]", "risks")
+    + _cy_digest("MATCH (qh:QualityHold)",
+                 "[qh.supplierId, qh.partId, qh.holdDays, qh.reason]", "holds")
+    + _cy_digest("MATCH (o:Order)", "[o.id, o.status]", "orderRows")
+    + _cy_digest("MATCH (o:Order)-[:REQUIRES]->(p:Part)", "[o.id, p.id, p.name]", "orderParts")
+    + _cy_digest("MATCH (o:Order)-[:PRODUCES]->(:Product)<-[:PRODUCES]-(f:Factory)",
+                 "[o.id, f.id, f.name]", "orderFactories")
+    + """
+    RETURN supplies, lanes, inventory, risks, holds,
+           orderRows + orderParts + orderFactories AS orders
+"""
+)
+
+NAN = float("nan")
+
+
+def _f(v) -> float:
+    """Nullable number -> float with NaN for null."""
+    return NAN if v is None else float(v)
+
+
+class _Interner:
+    """Append-only id <-> int mapping shared by all snapshot sections."""
+
+    def __init__(self) -> None:
+        self.ids: list[str] = []
+        self._index: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def intern(self, key: str) -> int:
+        idx = self._index.get(key)
+        if idx is None:
+            with self._lock:
+                idx = self._index.get(key)
+                if idx is None:
+                    idx = len(self.ids)
+                    self.ids.append(key)
+                    self._index[key] = idx
+        return idx
+
+    def get(self, key: Optional[str]) -> int:
+        """Index of ``key``, or -1 if it was never loaded."""
+        return self._index.get(key, -1) if key is not None else -1
+
+
+def _csr(rows: list[int], n_rows: int) -> tuple[array, list[int]]:
+    """Row pointers for items tagged with ``rows``, and the item order.
+
+    Items keep their relative order within a row (sort them first to
+    order a row).
+    """
+    counts = [0] * (n_rows + 1)
+    for r in rows:
+        counts[r + 1] += 1
+    for i in range(n_rows):
+        counts[i + 1] += counts[i]
+    ptr = array("q", counts)
+    fill = list(counts[:-1])
+    order = [0] * len(rows)
+    for item, r in enumerate(rows):
+        order[fill[r]] = item
+        fill[r] += 1
+    return ptr, order
+
+
+class _Supplies:
+    """SUPPLIES edges, CSR by supplier, plus a by-part index sorted by priority."""
+
+    def __init__(self, records: list, ids: _Interner) -> None:
+        recs = list(records)
+        sup = [ids.intern(r["sid"]) for r in recs]
+        part = [ids.intern(r["pid"]) for r in recs]
+        n = len(ids.ids)
+        self.sup_ptr, order = _csr(sup, n)
+        self.part = array("q", (part[i] for i in order))
+        self.lead = [_val(recs[i]["leadTimeDays"]) for i in order]
+        self.moq = [_val(recs[i]["moq"]) for i in order]
+        self.capacity = [_val(recs[i]["capacity"]) for i in order]
+        self.price = [_val(recs[i]["lastPrice"]) for i in order]
+        self.qual = [recs[i]["qualificationLevel"] for i in order]
+        self.priority = array("d", (_f(recs[i]["priority"]) for i in order))
+        self.supplier = array("q", (sup[i] for i in order))
+        self.supplier_name = {sup[i]: recs[i]["supplierName"] for i in order}
+        # part -> edge positions, best priority first (nulls last, as Cypher ORDER BY)
+        by_priority = sorted(range(len(order)), key=lambda e: _priority_key(self.priority[e]))
+        self.part_ptr, part_order = _csr([self.part[e] for e in by_priority], n)
+        self.part_edges = array("q", (by_priority[k] for k in part_order))
+
+    def edge(self, s: int, p: int) -> int:
+        if 0 <= s < len(self.sup_ptr) - 1:
+            for e in range(self.sup_ptr[s], self.sup_ptr[s + 1]):
+                if self.part[e] == p:
+                    return e
+        return -1
+
+    def part_suppliers(self, p: int) -> range:
+        """Edge positions (via part_edges) of the part's suppliers, best priority first."""
+        if 0 <= p < len(self.part_ptr) - 1:
+            return range(self.part_ptr[p], self.part_ptr[p + 1])
+        return range(0)
+
+    def supplier_parts(self, s: int) -> range:
+        if 0 <= s < len(self.sup_ptr) - 1:
+            return range(self.sup_ptr[s], self.sup_ptr[s + 1])
+        return range(0)
+
+    def as_dict(self, e: int, ids: _Interner) -> dict:
+        s = self.supplier[e]
+        return {
+            "supplierId": ids.ids[s],
+            "supplierName": self.supplier_name.get(s),
+            "leadTimeDays": self.lead[e],
+            "moq": self.moq[e],
+            "capacity": self.capacity[e],
+            "lastPrice": self.price[e],
+            "qualificationLevel": self.qual[e],
+        }
+
+
+class _Lanes:
+    """TransportLanes, CSR by from-node; each row sorted by (to-node, timeDays)."""
+
+    def __init__(self, records: list, ids: _Interner) -> None:
+        recs = [r for r in records if r["sid"] is not None]
+        frm = [ids.intern(r["sid"]) for r in recs]
+        to = [ids.intern(r["fid"]) if r["fid"] is not None else -1 for r in recs]
+        srt = sorted(range(len(recs)), key=lambda i: (frm[i], to[i], _priority_key(_f(recs[i]["timeDays"]))))
+        self.ptr, order = _csr([frm[i] for i in srt], len(ids.ids))
+        order = [srt[i] for i in order]
+        self.to = array("q", (to[i] for i in order))
+        self.mode = [recs[i]["mode"] for i in order]
+        self.time = [_val(recs[i]["timeDays"]) for i in order]
+        self.cost = [_val(recs[i]["cost"]) for i in order]
+        self.reliability = [_val(recs[i]["reliability"]) for i in order]
+
+    def lanes(self, s: int, f: int) -> list[dict]:
+        if not 0 <= s < len(self.ptr) - 1 or f < 0:
+            return []
+        return [
+            {"mode": self.mode[e], "timeDays": self.time[e],
+             "cost": self.cost[e], "reliability": self.reliability[e]}
+            for e in range(self.ptr[s], self.ptr[s + 1]) if self.to[e] == f
+        ]
+
+
+class _Inventory:
+    """InventoryLots, CSR by part."""
+
+    def __init__(self, records: list, ids: _Interner) -> None:
+        part = [ids.intern(r["pid"]) for r in records]
+        self.ptr, order = _csr(part, len(ids.ids))
+        self.location = [records[i]["location"] or "" for i in order]
+        self.on_hand = [_val(records[i]["onHand"]) for i in order]
+        self.reserved = [_val(records[i]["reserved"]) for i in order]
+        self.safety = [_val(records[i]["safetyStock"]) for i in order]
+
+    def totals(self, p: int, location_prefix: str) -> dict:
+        """The Cypher sum()/max() over the part's lots at the prefix (nulls skipped)."""
+        lots = []
+        if 0 <= p < len(self.ptr) - 1:
+            lots = [e for e in range(self.ptr[p], self.ptr[p + 1])
+                    if self.location[e].startswith(location_prefix)]
+        return {
+            "onHand": sum(self.on_hand[e] for e in lots if self.on_hand[e] is not None),
+            "reserved": sum(self.reserved[e] for e in lots if self.reserved[e] is not None),
+            "safetyStock": max((self.safety[e] for e in lots if self.safety[e] is not None), default=None),
+        }
+
+
+class _Risks:
+    """RiskEvents, CSR by affected supplier."""
+
+    def __init__(self, records: list, ids: _Interner) -> None:
+        sup = [ids.intern(r["sid"]) for r in records]
+        self.ptr, order = _csr(sup, len(ids.ids))
+        self.id = [records[i]["id"] for i in order]
+        self.type = [records[i]["type"] for i in order]
+        self.severity = [_val(records[i]["severity"]) for i in order]
+
+    def risks(self, s: int) -> list[dict]:
+        if not 0 <= s < len(self.ptr) - 1:
+            return []
+        return [{"id": self.id[e], "type": self.type[e], "severity": self.severity[e]}
+                for e in range(self.ptr[s], self.ptr[s + 1])]
+
+
+class _Holds:
+    """QualityHolds by (supplier, part); sparse, so a dict."""
+
+    def __init__(self, records: list, ids: _Interner) -> None:
+        self.by_pair: dict[tuple[int, int], dict] = {}
+        for r in records:
+            if r["sid"] is not None and r["pid"] is not None:
+                self.by_pair.setdefault((ids.intern(r["sid"]), ids.intern(r["pid"])),
+                                        {"holdDays": _val(r["holdDays"]), "reason": r["reason"]})
+
+
+class _Orders:
+    """Orders with their REQUIRES parts (CSR both ways) and producing factories."""
+
+    def __init__(self, records: list, ids: _Interner) -> None:
+        self.status: dict[int, Optional[str]] = {}
+        self.names: dict[int, Optional[str]] = {}
+        self.factories: dict[int, list[int]] = {}
+        req_order: list[int] = []
+        req_part: list[int] = []
+        for r in records:
+            o = ids.intern(r["oid"])
+            self.status[o] = r["status"]
+            for p in r["parts"]:
+                if p and p.get("id"):
+                    pi = ids.intern(p["id"])
+                    self.names[pi] = p.get("name")
+                    req_order.append(o)
+                    req_part.append(pi)
+            fs = []
+            for f in r["factories"]:
+                if f and f.get("id"):
+                    fi = ids.intern(f["id"])
+                    self.names[fi] = f.get("name")
+                    fs.append(fi)
+            self.factories[o] = fs
+        n = len(ids.ids)
+        self.req_ptr, order = _csr(req_order, n)
+        self.req_part = array("q", (req_part[i] for i in order))
+        self.by_part_ptr, order = _csr(req_part, n)
+        self.by_part_order = array("q", (req_order[i] for i in order))
+
+    def parts(self, o: int) -> list[int]:
+        if not 0 <= o < len(self.req_ptr) - 1:
+            return []
+        return list(self.req_part[self.req_ptr[o]:self.req_ptr[o + 1]])
+
+    def orders_of(self, p: int) -> list[int]:
+        if not 0 <= p < len(self.by_part_ptr) - 1:
+            return []
+        return list(self.by_part_order[self.by_part_ptr[p]:self.by_part_ptr[p + 1]])
+
+
+SNAPSHOT_BUILDERS = {
+    "supplies": _Supplies,
+    "lanes": _Lanes,
+    "inventory": _Inventory,
+    "risks": _Risks,
+    "holds": _Holds,
+    "orders": _Orders,
+}
+
+
+class GraphSnapshot:
+    """Simulation inputs served from memory; see the section comment above."""
+
+    def __init__(self, driver, poll_interval: float, max_staleness: float,
+                 fingerprint_interval: float) -> None:
+        self.driver = driver
+        self.poll_interval = poll_interval
+        self.fingerprint_interval = fingerprint_interval
+        self.max_staleness = max_staleness
+        self.ids = _Interner()
+        self._sections: dict[str, object] = {}
+        self._fingerprints: dict[str, list] = {}
+        self._marker: Optional[int] = None  # lastCommittedTxn the fingerprints were taken at
+        self._fingerprinted_at = 0.0  # monotonic time of the last full fingerprint
+        self._checked_at = 0.0        # monotonic time of the last successful change check
+        self._loaded_at: dict[str, float] = {}
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._reloads = 0
+        self._errors = 0
+        self._marker_errors = 0
+        self._fingerprint_runs = 0
+        self._skipped = 0
+        self._hits = 0
+        self._fallbacks = 0
+        self._verified = 0
+        self._mismatches = 0
+        self._last_mismatch: Optional[dict] = None
+
+    # ── lifecycle ──
+
+    def start(self) -> None:
+        try:
+            self.reload()
+        except Exception:
+            self._errors += 1  # the poller keeps trying; requests use Neo4j meanwhile
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="graph-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception:
+                self._errors += 1
+
+    # ── loading ──
+
+    def _read_marker(self) -> Optional[int]:
+        """The home database's last committed transaction id, or None when
+        the server does not report it (every poll then fingerprints)."""
+        try:
+            with self.driver.session(database="system") as s:
+                rec = s.execute_read(lambda tx: tx.run(SNAPSHOT_MARKER_CYPHER).single())
+            return int(rec["lastCommittedTxn"]) if rec and rec["lastCommittedTxn"] is not None else None
+        except (ClientError, ValueError):
+            self._marker_errors += 1
+            return None
+
+    def _fingerprint(self) -> dict[str, list]:
+        with self.driver.session() as s:
+            rec = s.execute_read(lambda tx: tx.run(SNAPSHOT_FINGERPRINT_CYPHER).single())
+        self._fingerprint_runs += 1
+        self._fingerprinted_at = time.monotonic()
+        return {name: list(rec[name]) for name in SNAPSHOT_SECTIONS}
+
+    def _load(self, names: list[str], fingerprints: dict[str, list]) -> None:
+        with self.driver.session() as s:
+            rows = s.execute_read(lambda tx: {
+                name: list(tx.run(SNAPSHOT_CYPHER[name])) for name in names})
+        sections = dict(self._sections)
+        now = time.monotonic()
+        for name in names:
+            sections[name] = SNAPSHOT_BUILDERS[name](rows[name], self.ids)
+            self._fingerprints[name] = fingerprints[name]
+            self._loaded_at[name] = now
+        self._sections = sections
+        self._reloads += 1
+
+    def refresh(self) -> list[str]:
+        """Reload the sections whose fingerprint changed; returns their names.
+
+        The fingerprints are only taken when the commit marker moved, or
+        every ``fingerprint_interval`` seconds as a consistency check.
+        """
+        with self._build_lock:
+            # Read the marker first: a commit landing during the fingerprint
+            # then shows up as a new marker on the next poll.
+            marker = self._read_marker()
+            if (marker is not None and marker == self._marker
+                    and len(self._sections) == len(SNAPSHOT_SECTIONS)
+                    and time.monotonic() - self._fingerprinted_at < self.fingerprint_interval):
+                self._skipped += 1
+                self._checked_at = time.monotonic()
+                return []
+            fingerprints = self._fingerprint()
+            changed = [name for name in SNAPSHOT_SECTIONS
+                       if name not in self._sections or fingerprints[name] != self._fingerprints.get(name)]
+            if changed:
+                self._load(changed, fingerprints)
+            self._marker = marker
+            self._checked_at = time.monotonic()
+            return changed
+
+    def reload(self, names: Optional[list[str]] = None) -> list[str]:
+        """Unconditionally reload ``names`` (default: every section)."""
+        names = list(names or SNAPSHOT_SECTIONS)
+        with self._build_lock:
+            marker = self._read_marker()
+            fingerprints = self._fingerprint()
+            self._load(names, fingerprints)
+            if len(names) == len(SNAPSHOT_SECTIONS):
+                self._marker = marker
+            if len(self._sections) == len(SNAPSHOT_SECTIONS):
+                self._checked_at = time.monotonic()
+            return names
+
+    @property
+    def fresh(self) -> bool:
+        return (len(self._sections) == len(SNAPSHOT_SECTIONS)
+                and time.monotonic() - self._checked_at <= self.max_staleness)
+
+    # ── serving ──
+
+    def inputs(self, req: BaseModel) -> Optional[BaseModel]:
+        """The request's input bundle, or None when the snapshot isn't fresh."""
+        if not self.fresh:
+            self._fallbacks += 1
+            return None
+        self._hits += 1
+        sec = self._sections  # one consistent set of sections for the whole request
+        if isinstance(req, SwitchSupplierReq):
+            return self._switch_supplier(sec, req)
+        if isinstance(req, ChangeLaneReq):
+            return self._change_lane(sec, req)
+        return self._transfer_factory(sec, req)
+
+    def blast_radius(self, order_id: Optional[str], supplier_id: Optional[str],
+                     part_id: Optional[str]) -> Optional[BlastRadius]:
+        if not self.fresh:
+            self._fallbacks += 1
+            return None
+        self._hits += 1
+        return self._blast(self._sections, order_id, supplier_id, part_id)
+
+    def verify(self, served: BaseModel, loaded: BaseModel) -> bool:
+        """Compare a snapshot bundle with the Cypher loader's bundle for the same request.
+
+        List order is ignored: neither side orders lane ties or risks. A
+        graph write landing between the two reads also counts as a mismatch.
+        """
+        a, b = _canonical(served.model_dump()), _canonical(loaded.model_dump())
+        diff = sorted(k for k in a.keys() | b.keys() if a.get(k) != b.get(k))
+        self._verified += 1
+        if diff:
+            self._mismatches += 1
+            self._last_mismatch = {"bundle": type(served).__name__, "fields": diff}
+        return not diff
+
+    def _factory(self, sec, oid: str) -> Optional[str]:
+        fs = sec["orders"].factories.get(self.ids.get(oid), [])
+        return self.ids.ids[fs[0]] if fs else None
+
+    def _supplier_part(self, sec, sid: Optional[str], pid: str) -> Optional[dict]:
+        e = sec["supplies"].edge(self.ids.get(sid), self.ids.get(pid))
+        return sec["supplies"].as_dict(e, self.ids) if e >= 0 else None
+
+    def _lanes(self, sec, sid: Optional[str], fid: str) -> list[dict]:
+        return sec["lanes"].lanes(self.ids.get(sid), self.ids.get(fid))
+
+    def _inventory(self, sec, pid: str, fid: str) -> Optional[dict]:
+        return _inventory(sec["inventory"].totals(self.ids.get(pid), fid))
+
+    def _risks(self, sec, sid: Optional[str]) -> list[dict]:
+        return sec["risks"].risks(self.ids.get(sid))
+
+    def _switch_supplier(self, sec, req: SwitchSupplierReq) -> SwitchSupplierInputs:
+        fid = self._factory(sec, req.orderId) or "F1"
+        from_sid = req.fromSupplierId or None
+        if from_sid is None:
+            sup = sec["supplies"]
+            p = self.ids.get(req.partId)
+            if p in sec["orders"].parts(self.ids.get(req.orderId)):
+                for k in sup.part_suppliers(p):
+                    from_sid = self.ids.ids[sup.supplier[sup.part_edges[k]]]
+                    break
+        hold = sec["holds"].by_pair.get((self.ids.get(req.toSupplierId), self.ids.get(req.partId)))
+        return SwitchSupplierInputs(
+            factoryId=fid,
+            fromSupplierId=from_sid,
+            fromPart=self._supplier_part(sec, from_sid, req.partId),
+            toPart=self._supplier_part(sec, req.toSupplierId, req.partId),
+            fromLanes=self._lanes(sec, from_sid, fid),
+            toLanes=self._lanes(sec, req.toSupplierId, fid),
+            inventory=self._inventory(sec, req.partId, fid),
+            fromRisks=self._risks(sec, from_sid),
+            toRisks=self._risks(sec, req.toSupplierId),
+            qcHold=dict(hold) if hold else None,
+            blastRadius=self._blast(sec, req.orderId, None, None),
+        )
+
+    def _change_lane(self, sec, req: ChangeLaneReq) -> ChangeLaneInputs:
+        fid = self._factory(sec, req.orderId) or "F1"
+        return ChangeLaneInputs(
+            factoryId=fid,
+            supplierPart=self._supplier_part(sec, req.supplierId, req.partId),
+            lanes=self._lanes(sec, req.supplierId, fid),
+            inventory=self._inventory(sec, req.partId, fid),
+            risks=self._risks(sec, req.supplierId),
+            blastRadius=self._blast(sec, req.orderId, None, None),
+        )
+
+    def _transfer_factory(self, sec, req: TransferFactoryReq) -> TransferFactoryInputs:
+        from_fid = req.fromFactoryId or self._factory(sec, req.orderId) or "F1"
+        # The order's best-priority SUPPLIES edge over all of its parts
+        # (part rows are priority-sorted, nulls last, so only heads compete)
+        sup = sec["supplies"]
+        best = -1
+        for p in sec["orders"].parts(self.ids.get(req.orderId)):
+            heads = sup.part_suppliers(p)
+            if heads:
+                e = sup.part_edges[heads[0]]
+                if best < 0 or _priority_key(sup.priority[e]) < _priority_key(sup.priority[best]):
+                    best = e
+        source = None
+        if best >= 0:
+            source = {"pid": self.ids.ids[sup.part[best]], "sid": self.ids.ids[sup.supplier[best]],
+                      "lead": sup.lead[best], "price": sup.price[best],
+                      "qual": sup.qual[best]}
+        pid = (source or {}).get("pid") or "P1A"
+        sid = (source or {}).get("sid") or "S1"
+        return TransferFactoryInputs(
+            fromFactoryId=from_fid,
+            partId=pid,
+            supplierId=sid,
+            source=source,
+            fromLanes=self._lanes(sec, sid, from_fid),
+            toLanes=self._lanes(sec, sid, req.toFactoryId),
+            fromInventory=self._inventory(sec, pid, from_fid),
+            toInventory=self._inventory(sec, pid, req.toFactoryId),
+            risks=self._risks(sec, sid),
+            blastRadius=self._blast(sec, req.orderId, None, None),
+        )
+
+    def _blast(self, sec, order_id: Optional[str], supplier_id: Optional[str],
+               part_id: Optional[str]) -> BlastRadius:
+        """In-memory equivalent of the BLAST_*_CYPHER queries."""
+        ids, orders, sup = self.ids.ids, sec["orders"], sec["supplies"]
+        hit_orders: dict[int, None] = {}
+        hit_parts: dict[int, None] = {}
+        hit_factories: dict[int, None] = {}
+        paths: dict[tuple, None] = {}
+
+        def suppliers_of(p: int) -> list[int]:
+            return [sup.supplier[sup.part_edges[k]] for k in sup.part_suppliers(p)]
+
+        if order_id:
+            o = self.ids.get(order_id)
+            parts = orders.parts(o)
+            if parts:
+                hit_factories.update(dict.fromkeys(orders.factories.get(o, [])))
+            for p in parts:
+                hit_parts[p] = None
+                paths[(o, "REQUIRES", p)] = None
+                for other in orders.orders_of(p):
+                    if other != o:
+                        hit_orders[other] = None
+            for p in parts:
+                for s in suppliers_of(p):
+                    paths[(s, "SUPPLIES", p)] = None
+        elif supplier_id:
+            s = self.ids.get(supplier_id)
+            for k in sup.supplier_parts(s):
+                p = sup.part[k]
+                for o in orders.orders_of(p):
+                    hit_orders[o] = None
+                    hit_parts[p] = None
+                    hit_factories.update(dict.fromkeys(orders.factories.get(o, [])))
+                    paths[(s, "SUPPLIES", p)] = None
+            for k in sup.supplier_parts(s):
+                p = sup.part[k]
+                for o in orders.orders_of(p):
+                    paths[(o, "REQUIRES", p)] = None
+        elif part_id:
+            p = self.ids.get(part_id)
+            for o in orders.orders_of(p):
+                hit_orders[o] = None
+                hit_parts[p] = None
+                hit_factories.update(dict.fromkeys(orders.factories.get(o, [])))
+                paths[(o, "REQUIRES", p)] = None
+            if hit_orders:
+                for s in suppliers_of(p):
+                    paths[(s, "SUPPLIES", p)] = None
+
+        def name(i: int) -> str:
+            return orders.names.get(i) or ids[i]
+
+        return BlastRadius(
+            impactedOrders=[BlastRadiusItem(id=ids[o], name=ids[o], type="Order") for o in hit_orders],
+            impactedParts=[BlastRadiusItem(id=ids[p], name=name(p), type="Part") for p in hit_parts],
+            impactedFactories=[BlastRadiusItem(id=ids[f], name=name(f), type="Factory") for f in hit_factories],
+            paths=[BlastRadiusPath(from_node=ids[a], relation=rel, to_node=ids[b]) for a, rel, b in paths],
+        )
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        sec = self._sections
+        return {
+            "fresh": self.fresh,
+            "checkedAgeS": round(now - self._checked_at, 1) if self._checked_at else None,
+            "maxStalenessS": self.max_staleness,
+            "pollIntervalS": self.poll_interval,
+            "fingerprintIntervalS": self.fingerprint_interval,
+            "commitMarker": self._marker,
+            "ids": len(self.ids.ids),
+            "sections": {
+                name: {
+                    "ageS": round(now - self._loaded_at[name], 1),
+                    "rows": self._fingerprints[name][0] if self._fingerprints.get(name) else 0,
+                }
+                for name in SNAPSHOT_SECTIONS if name in sec
+            },
+            "reloads": self._reloads,
+            "fingerprints": self._fingerprint_runs,
+            "unchangedChecks": self._skipped,
+            "errors": self._errors,
+            "markerErrors": self._marker_errors,
+            "hits": self._hits,
+            "fallbacks": self._fallbacks,
+            "verified": self._verified,
+            "mismatches": self._mismatches,
+            "lastMismatch": self._last_mismatch,
+        }
+
+
+def _canonical(v):
+    """``v`` with every list sorted, for order-insensitive comparison."""
+    if isinstance(v, dict):
+        return {k: _canonical(x) for k, x in v.items()}
+    if isinstance(v, list):
+        return sorted((_canonical(x) for x in v), key=repr)
+    return v
+
+
+def _priority_key(priority: float) -> tuple[bool, float]:
+    """Cypher ORDER BY on a nullable number: nulls (NaN here) sort last."""
+    return (math.isnan(priority), 0.0 if math.isnan(priority) else priority)
+
+
+_snapshot = GraphSnapshot(_driver, SNAPSHOT_POLL_INTERVAL, SNAPSHOT_MAX_STALENESS,
+                          SNAPSHOT_FINGERPRINT_INTERVAL)
+
+
+@app.on_event("startup")
+def _start_snapshot() -> None:
+    if TWIN_SNAPSHOT:
+        _snapshot.start()
+
+
+@app.on_event("shutdown")
+def _stop_snapshot() -> None:
+    _snapshot.stop()
+
+
+def _inputs(loader, req: BaseModel) -> BaseModel:
+    """Simulation input bundle from the snapshot when fresh, else from Neo4j."""
+    inputs = _snapshot.inputs(req) if TWIN_SNAPSHOT else None
+    if inputs is None:
+        with _driver.session() as s:
+            inputs = s.execute_read(loader, req)
+    elif random.random() < SNAPSHOT_VERIFY_SAMPLE:
+        with _driver.session() as s:
+            _snapshot.verify(inputs, s.execute_read(loader, req))
+    return inputs
+
+
 # ────────────────────────────────────────────────────────────────────
 # Rules engine
 # ────────────────────────────────────────────────────────────────────
@@ -313,29 +1401,284 @@ def _default_lane(mode: str) -> dict:
     return {"mode": "Ocean", "timeDays": 14, "cost": 0.60, "reliability": 0.88}
 
 
+# ── Monte Carlo mode ──
+#
+# Each scenario is described by the same inputs as its point estimate and
+# sampled ``trials`` times, all scenarios at once as (scenarios, trials)
+# arrays. Demand draws are shared across scenarios (common random numbers)
+# so their comparison isn't swamped by sampling noise.
+
+LEAD_TIME_CV = 0.20        # production lead time spread
+CONSUMPTION_CV = 0.30      # daily consumption spread around DEFAULT_DAILY_CONSUMPTION
+PRICE_CV = 0.05            # unit price spread
+LANE_DELAY_FACTOR = 0.5    # mean delay of an unreliable shipment, as a share of transit time
+RISK_DELAY_DAYS = 2.0      # mean disruption delay per point of risk severity
+LATE_SHIPPING_UPLIFT = 0.25  # extra shipping cost when a shipment runs late
+
+
+def _mc_inputs(lead: float, transit: float, fixed: float, reliability: float, severity: float,
+               price: float, shipping: float, net_units: float, overhead: float = 0.0) -> dict:
+    """Sampling inputs for one scenario (fixed = QC hold / ramp-up days)."""
+    return {"lead": lead, "transit": transit, "fixed": fixed, "reliability": reliability,
+            "severity": severity, "price": price, "shipping": shipping,
+            "net": net_units, "overhead": overhead}
+
+
+def _monte_carlo(inputs: list[dict], trials: int, seed: Optional[int]) -> list[ScenarioDistribution]:
+    rng = np.random.default_rng(seed)
+    k = len(inputs)
+
+    def col(key: str) -> np.ndarray:
+        return np.array([float(sc[key] or 0) for sc in inputs])[:, None]
+
+    lead, transit, fixed = col("lead"), col("transit"), col("fixed")
+    reliability, severity = col("reliability"), col("severity")
+    price, shipping, net, overhead = col("price"), col("shipping"), col("net"), col("overhead")
+
+    # Lead time: gamma around the quoted lead time
+    shape = 1.0 / LEAD_TIME_CV ** 2
+    lead_t = rng.gamma(shape, np.maximum(lead, 1e-9) / shape, size=(k, trials))
+    # Transit: on time with the lane's reliability, otherwise an exponential delay
+    late = rng.random((k, trials)) >= reliability
+    transit_t = transit + late * rng.exponential(1.0, (k, trials)) * (LANE_DELAY_FACTOR * transit)
+    # Risk events: disruption probability as in _line_stop_risk, exponential delay
+    hit = rng.random((k, trials)) < np.minimum(severity / 10.0, 0.5)
+    disruption = hit * rng.exponential(1.0, (k, trials)) * (RISK_DELAY_DAYS * severity)
+    eta = lead_t + transit_t + fixed + disruption
+
+    # Line stop when inventory runs out before the shipment lands
+    c_shape = 1.0 / CONSUMPTION_CV ** 2
+    consumption = rng.gamma(c_shape, DEFAULT_DAILY_CONSUMPTION / c_shape, size=trials)
+    stop = net / consumption < eta
+
+    p_shape = 1.0 / PRICE_CV ** 2
+    cost = (price * rng.gamma(p_shape, 1.0 / p_shape, size=(k, trials))
+            + shipping * (1.0 + LATE_SHIPPING_UPLIFT * late) + overhead)
+
+    eta_q = np.percentile(eta, [50, 90, 99], axis=1)
+    cost_q = np.percentile(cost, [50, 90, 99], axis=1)
+    stop_p = stop.mean(axis=1)
+    cost_mean = cost.mean(axis=1)
+    return [
+        ScenarioDistribution(
+            trials=trials,
+            eta_p50_days=round(float(eta_q[0, i]), 1),
+            eta_p90_days=round(float(eta_q[1, i]), 1),
+            eta_p99_days=round(float(eta_q[2, i]), 1),
+            line_stop_probability=round(float(stop_p[i]), 4),
+            cost_p50=round(float(cost_q[0, i]), 2),
+            cost_p90=round(float(cost_q[1, i]), 2),
+            cost_p99=round(float(cost_q[2, i]), 2),
+            cost_mean=round(float(cost_mean[i]), 2),
+        )
+        for i in range(k)
+    ]
+
+
+def _check_mode(req: SimulationModeMixin) -> None:
+    if req.mode not in ("deterministic", "montecarlo"):
+        raise HTTPException(400, f"Unknown mode {req.mode!r} (deterministic | montecarlo)")
+    if req.trials is not None and not 1 <= req.trials <= MC_MAX_TRIALS:
+        raise HTTPException(400, f"trials must be 1-{MC_MAX_TRIALS}")
+
+
+def _apply_monte_carlo(req, scenarios: list[Scenario], inputs: list[dict], quality_weight: float) -> str:
+    """Attach sampled distributions; returns the recommendation scored on them.
+
+    Delivery-first ranks on P90 ETA (vs scenario A) and line-stop
+    probability, cost-first on median landed cost; the weights match the
+    deterministic scoring.
+    """
+    dists = _monte_carlo(inputs, req.trials or MC_TRIALS, req.seed)
+    for sc, dist in zip(scenarios, dists):
+        sc.distribution = dist
+    base = dists[0]
+    if req.objective == "cost-first":
+        def score(sc: Scenario) -> float:
+            d = sc.distribution
+            delta = (d.cost_p50 - base.cost_p50) / base.cost_p50 * 100 if base.cost_p50 else 0
+            return delta + d.line_stop_probability * 20
+    else:
+        def score(sc: Scenario) -> float:
+            d = sc.distribution
+            return (d.eta_p90_days - base.eta_p90_days + d.line_stop_probability * 20
+                    + sc.quality_risk * quality_weight)
+    return min(scenarios, key=score).label
+
+
+# ────────────────────────────────────────────────────────────────────
+# Process pool
+# ────────────────────────────────────────────────────────────────────
+#
+# Monte Carlo evaluations run in worker processes so sampling never holds
+# the API process's GIL; deterministic scoring is cheap and stays inline.
+# Workers are spawned rather than forked, so they don't inherit the Neo4j
+# driver or the snapshot poller. A job ships only the request and its
+# input bundle (a few KB pickled) and gets the SimulationResult back.
+# Handlers await jobs on the event loop rather than parking a threadpool
+# thread per job, so the sync endpoints keep their threads during a burst.
+
+SIM_DISCONNECT_POLL = 0.25  # s between client-disconnect checks while a job runs
+
+def _evaluate_job(kind: str, req: BaseModel, inputs: BaseModel) -> tuple[int, SimulationResult | str]:
+    """Evaluate one simulation, inline or in a worker: (200, result) or (status, detail)."""
+    try:
+        return 200, BATCH_KINDS[kind][1](req, inputs)
+    except HTTPException as exc:
+        return exc.status_code, str(exc.detail)
+    except Exception as exc:
+        # One bad item must not end a batch stream
+        return 500, f"Simulation failed: {type(exc).__name__}: {exc}"
+
+
+class SimPool:
+    """ProcessPoolExecutor for simulation jobs, with counters for /workers.
+
+    Futures from ``submit`` can be cancelled until a worker picks them up;
+    a pool broken by a dead worker is replaced on the next submit.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.submitted = self.completed = self.failed = self.cancelled = self.restarts = 0
+        self.in_flight = 0
+
+    def start(self) -> None:
+        if self.workers <= 0:
+            return
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        # Spawn every worker now so the first sweep doesn't pay for imports
+        for _ in range(self.workers):
+            self._pool.submit(os.getpid)
+
+    @property
+    def enabled(self) -> bool:
+        return self._pool is not None
+
+    def stop(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def submit(self, kind: str, req: BaseModel, inputs: BaseModel) -> Future:
+        if self._pool is None:
+            fut: Future = Future()
+            fut.set_result(_evaluate_job(kind, req, inputs))
+            return fut
+        with self._lock:
+            try:
+                fut = self._pool.submit(_evaluate_job, kind, req, inputs)
+            except BrokenProcessPool:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self.start()
+                self.restarts += 1
+                fut = self._pool.submit(_evaluate_job, kind, req, inputs)
+            self.submitted += 1
+            self.in_flight += 1
+        fut.add_done_callback(self._done)
+        return fut
+
+    def _done(self, fut: Future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if fut.cancelled():
+                self.cancelled += 1
+            elif fut.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    @staticmethod
+    def outcome(fut: Future) -> tuple[int, SimulationResult | str]:
+        try:
+            return fut.result()
+        except CancelledError:
+            return 499, "Cancelled"
+        except BrokenProcessPool:
+            return 503, "Simulation worker died; retry"
+        except Exception as exc:
+            return 500, f"Simulation failed: {type(exc).__name__}: {exc}"
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers if self._pool is not None else 0,
+            "inFlight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "restarts": self.restarts,
+        }
+
+
+_sim_pool = SimPool(SIM_WORKERS)
+
+
+@app.on_event("startup")
+def _start_sim_pool() -> None:
+    _sim_pool.start()
+
+
+@app.on_event("shutdown")
+def _stop_sim_pool() -> None:
+    _sim_pool.stop()
+
+
+async def _await_job(fut: Future, request: Optional[Request] = None) -> tuple[int, SimulationResult | str]:
+    """Wait for a pool job; cancel it if the task is cancelled or ``request``'s client leaves.
+
+    Cancelling only stops a job that no worker has picked up yet; a
+    running one finishes and its result is dropped.
+    """
+    job = asyncio.wrap_future(fut)
+    job.add_done_callback(lambda j: j.cancelled() or j.exception())  # outcome() reports failures
+    try:
+        while not job.done():
+            await asyncio.wait({job}, timeout=SIM_DISCONNECT_POLL if request is not None else None)
+            if request is not None and not job.done() and await request.is_disconnected():
+                fut.cancel()
+                return 499, "Client disconnected"
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    return _sim_pool.outcome(fut)
+
+
+async def _evaluate(kind: str, req: BaseModel, inputs: BaseModel, request: Request) -> SimulationResult:
+    if req.mode != "montecarlo":
+        return BATCH_KINDS[kind][1](req, inputs)
+    if not _sim_pool.enabled:
+        return await run_in_threadpool(BATCH_KINDS[kind][1], req, inputs)
+    status, payload = await _await_job(_sim_pool.submit(kind, req, inputs), request)
+    if status != 200:
+        raise HTTPException(status, payload)
+    return payload
+
+
 # ────────────────────────────────────────────────────────────────────
 # POST /simulate/switch-supplier
 # ────────────────────────────────────────────────────────────────────
 
-@app.post("/simulate/switch-supplier", response_model=SimulationResult)
-def switch_supplier(req: SwitchSupplierReq) -> SimulationResult:
-    with _driver.session() as s:
-        factory = s.execute_read(_get_order_factory, req.orderId)
-        fid = factory["factoryId"] if factory else "F1"
-
-        from_sid = req.fromSupplierId or s.execute_read(_get_current_supplier, req.orderId, req.partId)
-        if not from_sid:
-            raise HTTPException(404, f"No current supplier found for {req.partId} on {req.orderId}")
-
-        from_data = s.execute_read(_get_supplier_part, from_sid, req.partId)
-        to_data = s.execute_read(_get_supplier_part, req.toSupplierId, req.partId)
-        from_lanes = s.execute_read(_get_lanes, from_sid, fid)
-        to_lanes = s.execute_read(_get_lanes, req.toSupplierId, fid)
-        inv = s.execute_read(_get_inventory, req.partId, fid)
-        from_risks = s.execute_read(_get_risk_events, from_sid)
-        to_risks = s.execute_read(_get_risk_events, req.toSupplierId)
-        qc_hold = s.execute_read(_get_quality_hold, req.toSupplierId, req.partId)
-        blast = s.execute_read(_blast_radius, req.orderId, None, None)
+@app.post("/simulate/switch-supplier", response_model=SimulationResult, response_model_exclude_none=True)
+async def switch_supplier(req: SwitchSupplierReq, request: Request) -> SimulationResult:
+    _check_mode(req)
+    inputs = await run_in_threadpool(_inputs, _load_switch_supplier, req)
+    return await _evaluate("switch-supplier", req, inputs, request)
+
+
+def _simulate_switch_supplier(req: SwitchSupplierReq, inputs: SwitchSupplierInputs) -> SimulationResult:
+    from_sid = inputs.fromSupplierId
+    if not from_sid:
+        raise HTTPException(404, f"No current supplier found for {req.partId} on {req.orderId}")
+
+    from_data, to_data = inputs.fromPart, inputs.toPart
+    from_lanes, to_lanes = inputs.fromLanes, inputs.toLanes
+    inv = inputs.inventory
+    from_risks, to_risks = inputs.fromRisks, inputs.toRisks
+    qc_hold = inputs.qcHold
+    blast = inputs.blastRadius
 
     # Inventory coverage
     avail = ((inv["onHand"] or 0) - (inv["reserved"] or 0)) if inv else 0
@@ -435,6 +1778,15 @@ def switch_supplier(req: SwitchSupplierReq) -> SimulationResult:
     if req.objective == "cost-first":
         scored = [(sc, sc.cost_delta_pct + sc.line_stop_risk * 20) for sc in scenarios]
     recommended = min(scored, key=lambda x: x[1])[0].label
+    if req.mode == "montecarlo":
+        recommended = _apply_monte_carlo(req, scenarios, [
+            _mc_inputs(from_lead, from_ocean["timeDays"], 0, from_ocean["reliability"], from_risk_sev,
+                       from_price, from_ocean["cost"], net),
+            _mc_inputs(to_lead, to_ocean["timeDays"], qc_days, to_ocean["reliability"], to_risk_sev,
+                       to_price, to_ocean["cost"], net),
+            _mc_inputs(to_lead, to_air["timeDays"], qc_days, to_air["reliability"], to_risk_sev,
+                       to_price, to_air["cost"], net),
+        ], quality_weight=10)
 
     assumptions = [
         f"Inventory: {avail} on-hand, {safety} safety stock, ~{cov_days:.0f}d coverage",
@@ -455,16 +1807,16 @@ def switch_supplier(req: SwitchSupplierReq) -> SimulationResult:
 # POST /simulate/change-lane
 # ────────────────────────────────────────────────────────────────────
 
-@app.post("/simulate/change-lane", response_model=SimulationResult)
-def change_lane(req: ChangeLaneReq) -> SimulationResult:
-    with _driver.session() as s:
-        factory = s.execute_read(_get_order_factory, req.orderId)
-        fid = factory["factoryId"] if factory else "F1"
-        sp_data = s.execute_read(_get_supplier_part, req.supplierId, req.partId)
-        lanes = s.execute_read(_get_lanes, req.supplierId, fid)
-        inv = s.execute_read(_get_inventory, req.partId, fid)
-        risks = s.execute_read(_get_risk_events, req.supplierId)
-        blast = s.execute_read(_blast_radius, req.orderId, None, None)
+@app.post("/simulate/change-lane", response_model=SimulationResult, response_model_exclude_none=True)
+async def change_lane(req: ChangeLaneReq, request: Request) -> SimulationResult:
+    _check_mode(req)
+    inputs = await run_in_threadpool(_inputs, _load_change_lane, req)
+    return await _evaluate("change-lane", req, inputs, request)
+
+
+def _simulate_change_lane(req: ChangeLaneReq, inputs: ChangeLaneInputs) -> SimulationResult:
+    sp_data, lanes, inv = inputs.supplierPart, inputs.lanes, inputs.inventory
+    risks, blast = inputs.risks, inputs.blastRadius
 
     lead = (sp_data or {}).get("leadTimeDays", 14)
     price = (sp_data or {}).get("lastPrice", 10.0)
@@ -518,6 +1870,14 @@ def change_lane(req: ChangeLaneReq) -> SimulationResult:
     if req.objective == "cost-first":
         scored = [(sc, sc.cost_delta_pct + sc.line_stop_risk * 20) for sc in scenarios]
     recommended = min(scored, key=lambda x: x[1])[0].label
+    if req.mode == "montecarlo":
+        net = max(avail - safety, 0)
+        recommended = _apply_monte_carlo(req, scenarios, [
+            _mc_inputs(lead, ocean["timeDays"], 0, ocean["reliability"], risk_sev, price, ocean["cost"], net),
+            _mc_inputs(lead, air["timeDays"], 0, air["reliability"], risk_sev, price, air["cost"], net),
+            _mc_inputs(lead, c_eta - lead, 0, (ocean["reliability"] + air["reliability"]) / 2, risk_sev,
+                       price, ocean["cost"] * 0.5 + air["cost"] * 0.5, net),
+        ], quality_weight=0)
 
     return SimulationResult(
         scenarios=scenarios, recommended=recommended, blastRadius=blast,
@@ -529,34 +1889,25 @@ def change_lane(req: ChangeLaneReq) -> SimulationResult:
 # POST /simulate/transfer-factory
 # ────────────────────────────────────────────────────────────────────
 
-@app.post("/simulate/transfer-factory", response_model=SimulationResult)
-def transfer_factory(req: TransferFactoryReq) -> SimulationResult:
-    with _driver.session() as s:
-        # Current factory
-        cur_factory = s.execute_read(_get_order_factory, req.orderId)
-        from_fid = req.fromFactoryId or (cur_factory["factoryId"] if cur_factory else "F1")
-
-        # Parts required by order
-        r = s.execute_read(
-            lambda tx: tx.run(
-                "MATCH (o:Order {id:$oid})-[:REQUIRES]->(p:Part)<-[r:SUPPLIES]-(s:Supplier) "
-                "RETURN p.id AS pid, s.id AS sid, r.leadTimeDays AS lead, r.lastPrice AS price, "
-                "r.qualificationLevel AS qual ORDER BY r.priority LIMIT 1",
-                oid=req.orderId,
-            ).single(),
-        )
-        pid = r["pid"] if r else "P1A"
-        sid = r["sid"] if r else "S1"
-        lead = _val(r["lead"]) if r else 14
-        price = _val(r["price"]) if r else 10.0
-        qual = r["qual"] if r else "Full"
-
-        from_lanes = s.execute_read(_get_lanes, sid, from_fid)
-        to_lanes = s.execute_read(_get_lanes, sid, req.toFactoryId)
-        from_inv = s.execute_read(_get_inventory, pid, from_fid)
-        to_inv = s.execute_read(_get_inventory, pid, req.toFactoryId)
-        risks = s.execute_read(_get_risk_events, sid)
-        blast = s.execute_read(_blast_radius, req.orderId, None, None)
+@app.post("/simulate/transfer-factory", response_model=SimulationResult, response_model_exclude_none=True)
+async def transfer_factory(req: TransferFactoryReq, request: Request) -> SimulationResult:
+    _check_mode(req)
+    inputs = await run_in_threadpool(_inputs, _load_transfer_factory, req)
+    return await _evaluate("transfer-factory", req, inputs, request)
+
+
+def _simulate_transfer_factory(req: TransferFactoryReq, inputs: TransferFactoryInputs) -> SimulationResult:
+    from_fid = inputs.fromFactoryId
+    r = inputs.source
+    if r and r.get("pid") is None:
+        r = None  # a map of nulls is an order without a sourced part
+    lead = r["lead"] if r else 14
+    price = r["price"] if r else 10.0
+    qual = r["qual"] if r else "Full"
+
+    from_lanes, to_lanes = inputs.fromLanes, inputs.toLanes
+    from_inv, to_inv = inputs.fromInventory, inputs.toInventory
+    risks, blast = inputs.risks, inputs.blastRadius
 
     risk_sev = max((rv.get("severity", 0) for rv in risks), default=0)
     q_risk = QUAL_RISK_MAP.get(qual, 0.05)
@@ -616,6 +1967,16 @@ def transfer_factory(req: TransferFactoryReq) -> SimulationResult:
     if req.objective == "cost-first":
         scored = [(sc, sc.cost_delta_pct + sc.line_stop_risk * 20) for sc in scenarios]
     recommended = min(scored, key=lambda x: x[1])[0].label
+    if req.mode == "montecarlo":
+        f_net, t_net = max(f_avail - f_safety, 0), max(t_avail - t_safety, 0)
+        recommended = _apply_monte_carlo(req, scenarios, [
+            _mc_inputs(lead, f_ocean["timeDays"], 0, f_ocean["reliability"], risk_sev,
+                       price, f_ocean["cost"], f_net),
+            _mc_inputs(lead, t_ocean["timeDays"], ramp_up_days, t_ocean["reliability"], risk_sev,
+                       price, t_ocean["cost"], t_net, overhead=1.0),
+            _mc_inputs(lead, t_air["timeDays"], ramp_up_days, t_air["reliability"], risk_sev,
+                       price, t_air["cost"], t_net, overhead=1.0),
+        ], quality_weight=0)
 
     return SimulationResult(
         scenarios=scenarios, recommended=recommended, blastRadius=blast,
@@ -623,6 +1984,82 @@ def transfer_factory(req: TransferFactoryReq) -> SimulationResult:
     )
 
 
+# ────────────────────────────────────────────────────────────────────
+# POST /simulate/batch
+# ────────────────────────────────────────────────────────────────────
+
+# kind -> (request model, evaluator)
+BATCH_KINDS = {
+    "switch-supplier": (SwitchSupplierReq, _simulate_switch_supplier),
+    "change-lane": (ChangeLaneReq, _simulate_change_lane),
+    "transfer-factory": (TransferFactoryReq, _simulate_transfer_factory),
+}
+
+
+@app.post("/simulate/batch")
+def simulate_batch(req: SimulateBatchReq) -> StreamingResponse:
+    """Run many simulations against shared graph reads.
+
+    Streams one SimulateBatchResult per NDJSON line, in request order; an
+    item that can't be simulated carries ``status``/``error`` instead of
+    ``result``.
+    """
+    if len(req.items) > SIM_BATCH_MAX:
+        raise HTTPException(400, f"Batch too large: {len(req.items)} items (max {SIM_BATCH_MAX})")
+    reqs = []
+    for i, item in enumerate(req.items):
+        if item.kind not in BATCH_KINDS:
+            raise HTTPException(400, f"items[{i}]: unknown kind {item.kind!r}")
+        try:
+            reqs.append(BATCH_KINDS[item.kind][0](**item.request))
+        except ValidationError as exc:
+            raise HTTPException(422, f"items[{i}]: {exc}")
+        try:
+            _check_mode(reqs[-1])
+        except HTTPException as exc:
+            raise HTTPException(exc.status_code, f"items[{i}]: {exc.detail}")
+    return StreamingResponse(_batch_lines(req.items, reqs), media_type="application/x-ndjson")
+
+
+def _batch_inputs(chunk: list[BaseModel]) -> list[BaseModel]:
+    if TWIN_SNAPSHOT and _snapshot.fresh:
+        bundles = [_snapshot.inputs(r) for r in chunk]
+        if None not in bundles:
+            return bundles
+    with _driver.session() as s:
+        return s.execute_read(_load_batch, chunk)
+
+
+async def _batch_lines(items: list[SimulateBatchItem], reqs: list[BaseModel]):
+    # Monte Carlo items of a chunk all go to the process pool up front, and
+    # the rest are scored in one threadpool call while the workers sample.
+    # A client disconnect cancels the stream, and with it the queued jobs.
+    jobs: dict[int, Future] = {}
+    try:
+        for start in range(0, len(reqs), SIM_BATCH_CHUNK):
+            chunk = reqs[start:start + SIM_BATCH_CHUNK]
+            bundles = await run_in_threadpool(_batch_inputs, chunk)
+            inline = []
+            for i, (r, inputs) in enumerate(zip(chunk, bundles), start=start):
+                if r.mode == "montecarlo" and _sim_pool.enabled:
+                    jobs[i] = _sim_pool.submit(items[i].kind, r, inputs)
+                else:
+                    inline.append((i, r, inputs))
+            done = await run_in_threadpool(
+                lambda: {i: _evaluate_job(items[i].kind, r, inputs) for i, r, inputs in inline})
+            for i in range(start, start + len(chunk)):
+                kind = items[i].kind
+                status, payload = await _await_job(jobs.pop(i)) if i in jobs else done[i]
+                if status == 200:
+                    line = SimulateBatchResult(index=i, kind=kind, result=payload)
+                else:
+                    line = SimulateBatchResult(index=i, kind=kind, status=status, error=payload)
+                yield line.model_dump_json(by_alias=True, exclude_none=True) + "\n"
+    finally:
+        for job in jobs.values():
+            job.cancel()
+
+
 # ────────────────────────────────────────────────────────────────────
 # GET /blast-radius
 # ────────────────────────────────────────────────────────────────────
@@ -635,5 +2072,42 @@ def blast_radius(
 ) -> BlastRadius:
     if not any([orderId, supplierId, partId]):
         raise HTTPException(400, "Provide at least one of orderId, supplierId, partId")
+    blast = _snapshot.blast_radius(orderId, supplierId, partId) if TWIN_SNAPSHOT else None
+    if blast is not None:
+        return blast
     with _driver.session() as s:
         return s.execute_read(_blast_radius, orderId, supplierId, partId)
+
+
+# ────────────────────────────────────────────────────────────────────
+# GET /snapshot, POST /snapshot/reload
+# ────────────────────────────────────────────────────────────────────
+
+@app.get("/snapshot")
+def snapshot_stats() -> dict:
+    return {"enabled": TWIN_SNAPSHOT, **_snapshot.stats()}
+
+
+@app.post("/snapshot/reload")
+def snapshot_reload(sections: Optional[str] = None) -> dict:
+    """Reload the snapshot now: every section, or a comma-separated subset.
+
+    Also the hook for change feeds that know which part of the graph moved.
+    """
+    if not TWIN_SNAPSHOT:
+        raise HTTPException(409, "Snapshot disabled (set TWIN_SNAPSHOT=1)")
+    names = [n.strip() for n in sections.split(",")] if sections else None
+    unknown = [n for n in names or [] if n not in SNAPSHOT_SECTIONS]
+    if unknown:
+        raise HTTPException(400, f"Unknown section(s): {', '.join(unknown)}")
+    reloaded = _snapshot.reload(names)
+    return {"reloaded": reloaded, **_snapshot.stats()}
+
+
+# ────────────────────────────────────────────────────────────────────
+# GET /workers
+# ────────────────────────────────────────────────────────────────────
+
+@app.get("/workers")
+def workers_stats() -> dict:
+    return _sim_pool.stats()